@@ -0,0 +1,356 @@
+"""
+Materialized rollups of trades and a router that answers matching queries
+from them.
+
+Most questions are GROUP BY rollups of trades by px_type, ccy_pair,
+counterparty region or month. install() creates one summary table per
+dimension holding count/sum/min/max of notl and rate per group, kept up to
+date by triggers on trades and counterparties. route() recognizes generated
+SQL that can be answered from a summary and rewrites it, so those queries
+read a handful of rows instead of scanning the fact table.
+
+Usage:
+    python aggregates.py install      # create tables + triggers and fill them
+    python aggregates.py rebuild      # recompute from trades
+    python aggregates.py drop
+"""
+import argparse
+import sqlite3
+
+from sql_shape import Agg, Column, Dim, parse_aggregate, quote_identifier, quote_literal
+
+# notl_usd: USD notional (fx_rates.py)
+MEASURES = ("notl", "rate", "notl_usd")
+
+# name -> summary table, key column and how the key is computed from a trade
+# row (joined to counterparties for region)
+SUMMARIES = {
+    "px_type": {"table": "agg_trades_by_px_type", "key": "px_type", "join": False,
+                "expr": "{row}.px_type"},
+    "ccy_pair": {"table": "agg_trades_by_ccy_pair", "key": "ccy_pair", "join": False,
+                 "expr": "{row}.ccy_pair"},
+    "month": {"table": "agg_trades_by_month", "key": "month", "join": False,
+              "expr": "substr({row}.near_dt, 1, 7)"},
+    "region": {"table": "agg_trades_by_region", "key": "region", "join": True,
+               "expr": "(SELECT region FROM counterparties WHERE cp_id = {row}.cp_id)"},
+}
+
+# Which summary answers a grouping/filter expression, and the expression over
+# the summary's key column that reproduces it
+_DIM_ROUTES = {
+    Dim("col", Column("trades", "px_type")): ("px_type", "px_type"),
+    Dim("col", Column("trades", "ccy_pair")): ("ccy_pair", "ccy_pair"),
+    Dim("col", Column("counterparties", "region")): ("region", "region"),
+    Dim("month", Column("trades", "near_dt")): ("month", "month"),
+    Dim("year", Column("trades", "near_dt")): ("month", "substr(month, 1, 4)"),
+}
+
+
+def _measure_columns() -> list:
+    columns = ["trade_count"]
+    for m in MEASURES:
+        columns += [f"{m}_count", f"{m}_sum", f"{m}_min", f"{m}_max"]
+    return columns
+
+
+def _group_select(summary: dict) -> str:
+    """SELECT computing a summary's rows from the base tables"""
+    measures = ["count(*)"]
+    for m in MEASURES:
+        measures += [f"count(t.{m})", f"total(t.{m})", f"min(t.{m})", f"max(t.{m})"]
+    if summary["join"]:
+        key = "c.region"
+        source = "trades t JOIN counterparties c ON c.cp_id = t.cp_id"
+    else:
+        key = summary["expr"].format(row="t")
+        source = "trades t"
+    return f"SELECT {key}, {', '.join(measures)} FROM {source} GROUP BY {key}"
+
+
+def _exists_clause(summary: dict, row: str) -> str:
+    # Inner-join semantics: trades without a counterparty are not in the region rollup
+    if summary["join"]:
+        return f" AND EXISTS (SELECT 1 FROM counterparties WHERE cp_id = {row}.cp_id)"
+    return ""
+
+
+def _add_row_sql(summary: dict) -> str:
+    """Trigger statements folding NEW into its group"""
+    table, key = summary["table"], summary["key"]
+    value = summary["expr"].format(row="NEW")
+    sets = ["trade_count = trade_count + 1"]
+    inserts = ["1"]
+    for m in MEASURES:
+        sets += [
+            f"{m}_count = {m}_count + (NEW.{m} IS NOT NULL)",
+            f"{m}_sum = {m}_sum + IFNULL(NEW.{m}, 0)",
+            f"{m}_min = CASE WHEN NEW.{m} IS NOT NULL AND ({m}_min IS NULL OR NEW.{m} < {m}_min) THEN NEW.{m} ELSE {m}_min END",
+            f"{m}_max = CASE WHEN NEW.{m} IS NOT NULL AND ({m}_max IS NULL OR NEW.{m} > {m}_max) THEN NEW.{m} ELSE {m}_max END",
+        ]
+        inserts += [f"NEW.{m} IS NOT NULL", f"IFNULL(NEW.{m}, 0)", f"NEW.{m}", f"NEW.{m}"]
+    exists = _exists_clause(summary, "NEW")
+    return f"""
+        UPDATE {table} SET {', '.join(sets)}
+        WHERE {key} IS {value}{exists};
+        INSERT INTO {table} ({key}, {', '.join(_measure_columns())})
+        SELECT {value}, {', '.join(inserts)}
+        WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {key} IS {value}){exists};"""
+
+
+def _remove_row_sql(summary: dict) -> str:
+    """
+    Trigger statements taking OLD out of its group. Counts and sums are
+    decremented; min/max are only recomputed (from the group's rows) when
+    the removed value was one of the extremes.
+    """
+    table, key = summary["table"], summary["key"]
+    value = summary["expr"].format(row="OLD")
+    sets = ["trade_count = trade_count - 1"]
+    for m in MEASURES:
+        sets += [f"{m}_count = {m}_count - (OLD.{m} IS NOT NULL)", f"{m}_sum = {m}_sum - IFNULL(OLD.{m}, 0)"]
+    if summary["join"]:
+        group_rows = ("FROM trades t JOIN counterparties c ON c.cp_id = t.cp_id "
+                      f"WHERE c.region IS {table}.{key}")
+    else:
+        group_rows = f"FROM trades t WHERE {summary['expr'].format(row='t')} IS {table}.{key}"
+    statements = [
+        f"UPDATE {table} SET {', '.join(sets)} WHERE {key} IS {value}{_exists_clause(summary, 'OLD')};",
+        f"DELETE FROM {table} WHERE {key} IS {value} AND trade_count <= 0;",
+    ]
+    for m in MEASURES:
+        statements.append(
+            f"UPDATE {table} SET {m}_min = (SELECT min(t.{m}) {group_rows}), "
+            f"{m}_max = (SELECT max(t.{m}) {group_rows}) "
+            f"WHERE {key} IS {value} AND (OLD.{m} = {m}_min OR OLD.{m} = {m}_max);"
+        )
+    return "\n        " + "\n        ".join(statements)
+
+
+def _rebuild_statements(summary: dict) -> list:
+    return [
+        f"DELETE FROM {summary['table']}",
+        f"INSERT INTO {summary['table']} ({summary['key']}, {', '.join(_measure_columns())}) {_group_select(summary)}",
+    ]
+
+
+def trigger_names() -> list:
+    """Names of the maintenance triggers install() creates"""
+    return [f"trg_{summary['table']}_{suffix}" for summary in SUMMARIES.values()
+            for suffix in ("ins", "del", "upd", "cp_ins", "cp_del", "cp_upd")]
+
+
+def drop(conn):
+    """Remove summary tables and their triggers"""
+    for name in trigger_names():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for summary in SUMMARIES.values():
+        conn.execute(f"DROP TABLE IF EXISTS {summary['table']}")
+
+
+def install(conn):
+    """
+    Create the summary tables and maintenance triggers, then fill them.
+    Writers that use INSERT OR REPLACE on trades must enable
+    PRAGMA recursive_triggers so replaced rows are taken out of their group.
+    """
+    import fx_rates
+
+    # Older databases get the notl_usd measure column first
+    fx_rates.install(conn)
+    drop(conn)
+    definitions = []
+    for column in _measure_columns():
+        if column.endswith("_count"):
+            definitions.append(f"{column} INTEGER NOT NULL DEFAULT 0")
+        elif column.endswith("_sum"):
+            definitions.append(f"{column} REAL NOT NULL DEFAULT 0")
+        else:
+            definitions.append(f"{column} REAL")
+    columns = ", ".join(definitions)
+    for summary in SUMMARIES.values():
+        table, key = summary["table"], summary["key"]
+        conn.execute(f"CREATE TABLE {table} ({key} TEXT, {columns})")
+        conn.execute(f"CREATE INDEX idx_{table}_key ON {table} ({key})")
+        conn.execute(f"""
+            CREATE TRIGGER trg_{table}_ins AFTER INSERT ON trades
+            BEGIN{_add_row_sql(summary)}
+            END""")
+        conn.execute(f"""
+            CREATE TRIGGER trg_{table}_del AFTER DELETE ON trades
+            BEGIN{_remove_row_sql(summary)}
+            END""")
+        conn.execute(f"""
+            CREATE TRIGGER trg_{table}_upd AFTER UPDATE OF cp_id, px_type, notl, ccy_pair, near_dt, rate, notl_usd ON trades
+            BEGIN{_remove_row_sql(summary)}{_add_row_sql(summary)}
+            END""")
+        if summary["join"]:
+            # Counterparty changes re-map whole groups; the table is tiny so rebuild it
+            body = ";\n                ".join(_rebuild_statements(summary))
+            for suffix, event in (("cp_ins", "INSERT"), ("cp_del", "DELETE"), ("cp_upd", "UPDATE OF cp_id, region")):
+                conn.execute(f"""
+                    CREATE TRIGGER trg_{table}_{suffix} AFTER {event} ON counterparties
+                    BEGIN
+                        {body};
+                    END""")
+    rebuild(conn)
+
+
+def rebuild_statements() -> list:
+    """Statements recomputing every summary table from the base tables"""
+    return [statement for summary in SUMMARIES.values() for statement in _rebuild_statements(summary)]
+
+
+def rebuild(conn):
+    """Recompute every summary table from the base tables"""
+    for statement in rebuild_statements():
+        conn.execute(statement)
+
+
+def without_triggers(conn, statements: list) -> list:
+    """
+    Writer statements running statements (a bulk change to trades) with the
+    rollup triggers dropped, then restoring them and recomputing the
+    summaries instead of maintaining them row by row
+    """
+    rollup_triggers = set(trigger_names())
+    triggers = [(name, sql) for name, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")
+                if name in rollup_triggers]
+    result = [(f"DROP TRIGGER {name}", None) for name, _ in triggers]
+    result += statements
+    result += [(sql, None) for _, sql in triggers]
+    if installed(conn):
+        result += [(sql, None) for sql in rebuild_statements()]
+    return result
+
+
+def installed(conn) -> bool:
+    """True when every summary table exists with the current measures"""
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if not all(summary["table"] in names for summary in SUMMARIES.values()):
+        return False
+    # Summaries from before a measure was added are rebuilt by install()
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({SUMMARIES['px_type']['table']})")}
+    return set(_measure_columns()) <= columns
+
+
+def trade_totals(conn, where: str = None) -> tuple:
+    """
+    (row count, notl total, notl_usd total) of trades, cheap consistency
+    check for replicas of the table. Read from the rollups when installed,
+    else (or for the trades t matching where) from trades.
+    """
+    import fx_rates
+
+    if where is None and installed(conn):
+        row = conn.execute("SELECT SUM(trade_count), TOTAL(notl_sum), TOTAL(notl_usd_sum) "
+                           f"FROM {SUMMARIES['px_type']['table']}").fetchone()
+    else:
+        usd = "TOTAL(notl_usd)" if fx_rates.installed(conn) else "0.0"
+        sql = f"SELECT count(*), TOTAL(notl), {usd} FROM trades t" + (f" WHERE {where}" if where else "")
+        row = conn.execute(sql).fetchone()
+    return row[0] or 0, row[1] or 0.0, row[2] or 0.0
+
+
+def _combine(agg: Agg) -> str:
+    """Expression over summary rows equivalent to the aggregate over trades"""
+    if agg.column is None:
+        return "IFNULL(SUM(trade_count), 0)"
+    m = agg.column.name
+    if agg.func == "SUM":
+        return f"CASE WHEN SUM({m}_count) > 0 THEN SUM({m}_sum) END"
+    if agg.func == "TOTAL":
+        return f"TOTAL({m}_sum)"
+    if agg.func == "AVG":
+        return f"SUM({m}_sum) / NULLIF(SUM({m}_count), 0)"
+    if agg.func == "COUNT":
+        return f"IFNULL(SUM({m}_count), 0)"
+    return f"{agg.func}({m}_{agg.func.lower()})"
+
+
+def route(sql: str):
+    """
+    Rewrite a generated query to read from a summary table. Returns the new
+    SQL, or None when the query cannot be answered from the rollups.
+    """
+    query = parse_aggregate(sql)
+    if query is None:
+        return None
+
+    dims = set(query.group_by) | {pred.target for pred in query.predicates}
+    if any(dim not in _DIM_ROUTES for dim in dims):
+        return None
+    names = {_DIM_ROUTES[dim][0] for dim in dims}
+    if len(names) > 1:
+        return None
+    name = names.pop() if names else ("region" if query.join else "px_type")
+    summary = SUMMARIES[name]
+    if summary["join"] != query.join:
+        return None
+
+    def rewrite(expr) -> str:
+        if isinstance(expr, Dim):
+            return _DIM_ROUTES[expr][1]
+        if expr.distinct or (expr.column is not None and
+                             (expr.column.table != "trades" or expr.column.name not in MEASURES)):
+            raise LookupError(expr)
+        return _combine(expr)
+
+    try:
+        select = ", ".join(f"{rewrite(item.expr)} AS {quote_identifier(item.name)}" for item in query.items)
+        order = [quote_identifier(query.items[key.item].name) if key.item is not None else rewrite(key.expr)
+                 for key in query.order_by]
+    except LookupError:
+        return None
+
+    sql = f"SELECT {select} FROM {summary['table']}"
+    if query.predicates:
+        conditions = []
+        for pred in query.predicates:
+            target = rewrite(pred.target)
+            if pred.op in ("IN", "NOT IN"):
+                values = ", ".join(quote_literal(v) for v in pred.values)
+                conditions.append(f"{target} {pred.op} ({values})")
+            else:
+                conditions.append(f"{target} {pred.op} {quote_literal(pred.values[0])}")
+        sql += " WHERE " + " AND ".join(conditions)
+    if query.group_by:
+        sql += " GROUP BY " + ", ".join(rewrite(dim) for dim in query.group_by)
+    if order:
+        sql += " ORDER BY " + ", ".join(f"{o} DESC" if key.desc else o for o, key in zip(order, query.order_by))
+    if query.limit is not None:
+        sql += f" LIMIT {query.limit}"
+        if query.offset is not None:
+            sql += f" OFFSET {query.offset}"
+    return sql
+
+
+def execute_from_summary(query: str, conn):
+    """engine executor hook: answer the query from a rollup if possible"""
+    rewritten = route(query)
+    if rewritten is None or not installed(conn):
+        return None
+    import pandas as pd
+
+    return pd.read_sql_query(rewritten, conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage materialized trade rollups")
+    parser.add_argument("command", choices=["install", "rebuild", "drop"])
+    parser.add_argument("--db", default="fx_trades.db")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    with conn:
+        if args.command == "install":
+            install(conn)
+        elif args.command == "rebuild":
+            rebuild(conn)
+        else:
+            drop(conn)
+    conn.close()
+    print(f"✅ Summary tables: {args.command} done ({args.db})")
+
+
+if __name__ == "__main__":
+    main()
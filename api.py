@@ -0,0 +1,189 @@
+"""
+HTTP JSON API for the NL -> SQL -> results pipeline.
+
+Exposes the same engine the Streamlit apps use (NL -> SQL cache, result
+cache and pooled read-only connections are shared by every request served
+by a worker process).
+
+Run with several worker processes:
+    python api.py --workers 4 --port 8000
+or
+    uvicorn api:app --workers 4
+
+Endpoints:
+    POST /generate_sql   {"question": "..."}
+    POST /execute_sql    {"sql": "...", "page": 1, "page_size": 500, "format": "json" | "arrow", "max_rows": ...}
+    POST /ask            {"question": "...", "page": 1, "page_size": 500, "format": "json" | "arrow", "max_rows": ...}
+    GET  /health
+    GET  /metrics        per-stage latency, Prometheus text format (FX_TRACING=1)
+    GET  /traces         recent spans, OpenTelemetry-style JSON (FX_TRACING=1)
+
+Results are materialized up to max_rows rows (default engine.MAX_RESULT_ROWS,
+raised to reach the requested page, never above MAX_API_ROWS); "truncated"
+tells that more rows exist, which a larger max_rows or a later page fetches.
+"""
+import argparse
+import json
+import os
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, Response
+from pydantic import BaseModel, Field
+
+import canonical
+import engine
+import tracing
+
+MAX_PAGE_SIZE = 10_000
+# Most rows one request can materialize, whatever its max_rows and page
+MAX_API_ROWS = int(os.environ.get("FX_API_MAX_ROWS", "1000000"))
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+app = FastAPI(title="FX Analytics Hub API")
+
+
+class QuestionRequest(BaseModel):
+    question: str
+
+
+class PageOptions(BaseModel):
+    page: int = Field(1, ge=1)
+    page_size: int = Field(500, ge=1, le=MAX_PAGE_SIZE)
+    format: str = Field("json", pattern="^(json|arrow)$")
+    # Rows to materialize; raised to cover the requested page, up to MAX_API_ROWS
+    max_rows: Optional[int] = Field(None, ge=1)
+
+    def row_cap(self) -> int:
+        return min(max(self.max_rows or engine.MAX_RESULT_ROWS, self.page * self.page_size), MAX_API_ROWS)
+
+
+class ExecuteRequest(PageOptions):
+    sql: str
+
+
+class AskRequest(PageOptions):
+    question: str
+
+
+def paginate(df, options: PageOptions):
+    """Slice one page out of a result set"""
+    start = (options.page - 1) * options.page_size
+    return df.iloc[start:start + options.page_size]
+
+
+@tracing.traced("export.arrow")
+def to_arrow(df, headers: dict) -> Response:
+    """Serialize a DataFrame as an Arrow IPC stream"""
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(content=sink.getvalue().to_pybytes(), media_type=ARROW_MEDIA_TYPE, headers=headers)
+
+
+def results_payload(df, options: PageOptions, extra: dict):
+    """Render a page of results as JSON, or as Arrow with paging info in headers"""
+    page = paginate(df, options)
+    if options.format == "arrow":
+        headers = {
+            "X-Total-Rows": str(len(df)),
+            "X-Page": str(options.page),
+            "X-Page-Size": str(options.page_size),
+            "X-Truncated": "1" if df.attrs.get("truncated") else "0",
+            "X-Max-Rows": str(options.row_cap()),
+        }
+        return to_arrow(page, headers)
+
+    with tracing.span("export.json", rows=len(page)):
+        rows = json.loads(page.to_json(orient="records", date_format="iso"))
+    return {
+        **extra,
+        "columns": list(df.columns),
+        "rows": rows,
+        "total_rows": len(df),
+        # total_rows stops at max_rows (or the engine's size cap) when this is set
+        "truncated": bool(df.attrs.get("truncated")),
+        "max_rows": options.row_cap(),
+        "page": options.page,
+        "page_size": options.page_size,
+    }
+
+
+async def run_query(sql: str, max_rows: int = engine.MAX_RESULT_ROWS):
+    """Sanitize and execute SQL off the event loop, materializing at most max_rows rows"""
+    try:
+        sql = engine.sanitize_sql(sql)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    df, error = await run_in_threadpool(engine.execute_sql, sql, max_rows=max_rows)
+    if error:
+        raise HTTPException(status_code=422, detail=f"SQL Error: {error}")
+    return df
+
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok",
+        "sql_cache": engine.sql_cache.stats(),
+        "result_cache": engine.result_cache.stats(),
+        "canonical_sql": canonical.stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(tracing.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/traces")
+async def traces(clear: bool = False):
+    return tracing.otel_json(clear=clear)
+
+
+@app.post("/generate_sql")
+async def generate_sql(request: QuestionRequest):
+    if not request.question.strip():
+        raise HTTPException(status_code=400, detail="Please enter a question.")
+    return await run_in_threadpool(engine.generate_sql, request.question)
+
+
+@app.post("/execute_sql")
+async def execute_sql(request: ExecuteRequest):
+    df = await run_query(request.sql, request.row_cap())
+    return results_payload(df, request, {"sql": request.sql})
+
+
+@app.post("/ask")
+async def ask(request: AskRequest):
+    if not request.question.strip():
+        raise HTTPException(status_code=400, detail="Please enter a question.")
+
+    result = await run_in_threadpool(engine.generate_sql, request.question)
+    if result.get("clarification") or not result.get("sql"):
+        # Nothing to execute, hand the clarification back to the caller
+        return result
+
+    df = await run_query(result["sql"], request.row_cap())
+    return results_payload(df, request, result)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the FX NL -> SQL API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    uvicorn.run("api:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Batch runner for lists of natural-language questions.
+
+Reads one question per line (blank lines and lines starting with '#' are
+skipped), deduplicates them, translates them with generate_sql under a
+bounded concurrency, executes the SQL on parallel read-only connections and
+writes every result set to the output directory in a columnar format,
+alongside a manifest.jsonl describing each question. Report files are not
+row-capped unless --max-rows is given; a result cut by that cap or by the
+engine's memory cap is flagged "truncated" in the manifest.
+
+Usage:
+    python batch.py questions.txt --out reports/2025-09-01 --concurrency 8 --sql-workers 4
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import engine
+from stats import format_latencies
+
+
+def read_questions(path: str) -> list:
+    """Read questions from a text file, one per line"""
+    with open(path, encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def dedupe(questions: list) -> list:
+    """Drop repeated questions (case and whitespace insensitive), keeping order"""
+    seen = set()
+    unique = []
+    for question in questions:
+        key = engine.normalize_question(question)
+        if key not in seen:
+            seen.add(key)
+            unique.append(question)
+    return unique
+
+
+def write_result(df, out_dir: str, name: str, fmt: str) -> str:
+    """Write one result set and return its file name"""
+    file_name = f"{name}.{fmt}"
+    path = os.path.join(out_dir, file_name)
+    if fmt == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.reset_index(drop=True).to_feather(path)
+    return file_name
+
+
+def translate(index: int, question: str) -> dict:
+    started = time.perf_counter()
+    try:
+        result = engine.generate_sql(question)
+    except Exception as e:
+        result = {"sql": "", "clarification": "", "explanation": f"LLM request failed: {e}"}
+    return {
+        "index": index,
+        "question": question,
+        "sql": result.get("sql", ""),
+        "clarification": result.get("clarification", ""),
+        "explanation": result.get("explanation", ""),
+        "llm_seconds": time.perf_counter() - started,
+    }
+
+
+def execute(entry: dict, out_dir: str, fmt: str, max_rows: int = None) -> dict:
+    started = time.perf_counter()
+    df, error = engine.execute_sql(entry["sql"], max_rows=max_rows)
+    entry["sql_seconds"] = time.perf_counter() - started
+    if error:
+        entry["status"] = "sql_error"
+        entry["error"] = error
+        return entry
+
+    entry["rows"] = len(df)
+    entry["truncated"] = bool(df.attrs.get("truncated"))
+    if entry["truncated"]:
+        entry["truncated_by"] = df.attrs.get("truncated_by")
+    entry["file"] = write_result(df, out_dir, f"q{entry['index']:04d}", fmt)
+    entry["status"] = "ok"
+    return entry
+
+
+def run_batch(questions: list, out_dir: str, concurrency: int = 8, sql_workers: int = 4, fmt: str = "parquet",
+              max_rows: int = None) -> list:
+    """
+    Translate and execute every question. LLM calls run on a pool of
+    `concurrency` threads; each translated query is handed straight to a
+    separate pool of `sql_workers` threads so execution overlaps translation.
+    Results keep every row unless max_rows is given.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    engine.pool.size = max(engine.pool.size, sql_workers)
+
+    entries = []
+    with ThreadPoolExecutor(max_workers=concurrency) as llm_pool, \
+            ThreadPoolExecutor(max_workers=sql_workers) as sql_pool:
+        translations = [llm_pool.submit(translate, i, q) for i, q in enumerate(questions, 1)]
+        executions = []
+        for future in as_completed(translations):
+            entry = future.result()
+            if entry["clarification"] or not entry["sql"]:
+                entry["status"] = "clarification" if entry["clarification"] else "no_sql"
+                entries.append(entry)
+            else:
+                executions.append(sql_pool.submit(execute, entry, out_dir, fmt, max_rows))
+        entries.extend(f.result() for f in executions)
+
+    entries.sort(key=lambda e: e["index"])
+    with open(os.path.join(out_dir, "manifest.jsonl"), "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+    return entries
+
+
+def report(entries: list, read_count: int, elapsed: float) -> str:
+    """Throughput and latency summary for a finished batch"""
+    by_status = {}
+    for entry in entries:
+        by_status[entry["status"]] = by_status.get(entry["status"], 0) + 1
+
+    lines = [
+        f"Questions read: {read_count}, unique: {len(entries)}",
+        "Status: " + ", ".join(f"{k}={v}" for k, v in sorted(by_status.items())),
+        f"Wall time: {elapsed:.2f}s, throughput: {len(entries) / elapsed if elapsed else 0:.2f} questions/s",
+        format_latencies("LLM", [e["llm_seconds"] for e in entries]),
+        format_latencies("SQL", [e["sql_seconds"] for e in entries if "sql_seconds" in e]),
+        format_latencies("End-to-end", [e["llm_seconds"] + e.get("sql_seconds", 0) for e in entries]),
+        f"Rows written: {sum(e.get('rows', 0) for e in entries)}",
+    ]
+    truncated = [e["index"] for e in entries if e.get("truncated")]
+    if truncated:
+        lines.append(f"Truncated results: {len(truncated)} (questions {', '.join(map(str, truncated))})")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a file of FX questions through NL -> SQL in batch")
+    parser.add_argument("questions", help="Text file with one question per line")
+    parser.add_argument("--out", required=True, help="Directory for result files and manifest.jsonl")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent LLM requests")
+    parser.add_argument("--sql-workers", type=int, default=4, help="Parallel read-only SQL connections")
+    parser.add_argument("--format", choices=["parquet", "feather"], default="parquet")
+    parser.add_argument("--max-rows", type=int, default=None, help="Cap rows per result (default: no cap)")
+    parser.add_argument("--db", default=None, help="Database path (defaults to engine.DB_PATH)")
+    args = parser.parse_args()
+
+    if args.db:
+        engine.set_database(args.db, args.sql_workers)
+
+    questions = read_questions(args.questions)
+    unique = dedupe(questions)
+
+    started = time.perf_counter()
+    entries = run_batch(unique, args.out, args.concurrency, args.sql_workers, args.format, args.max_rows)
+    print(report(entries, len(questions), time.perf_counter() - started))
+
+
+if __name__ == "__main__":
+    main()
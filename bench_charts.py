@@ -0,0 +1,143 @@
+"""
+Chart rendering benchmark and figure payload profiler.
+
+Times charts.build_figure and the JSON serialization Streamlit performs
+for st.plotly_chart, for every chart type across result sizes and column
+mixes, and reports the payload bytes sent to the browser. Configurations
+over the latency or size budget are flagged and make the run exit 1.
+
+    python bench_charts.py --sizes 100,1k,10k,100k --out charts.json
+    python bench_charts.py --max-build-ms 300 --max-serialize-ms 300 --max-mb 2
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+
+from bench_sql import parse_scale
+from charts import CHART_TYPES, build_figure
+
+# Chart controls per column mix, mirroring what the UI selectors offer:
+# x is categorical for bar/line/box/pie and numeric for scatter
+COLUMN_MIXES = {
+    "category": {"x": "ccy_pair", "x_numeric": "rate", "y": "notl"},
+    "category_color": {"x": "ccy_pair", "x_numeric": "rate", "y": "notl", "color": "px_type"},
+    "high_cardinality": {"x": "cp_name", "x_numeric": "rate", "y": "notl"},
+    "dates": {"x": "near_dt", "x_numeric": "rate", "y": "notl"},
+    "scatter_sized": {"x": "ccy_pair", "x_numeric": "rate", "y": "notl", "size": "trade_id"},
+}
+
+
+def make_frame(rows: int, seed: int = 0):
+    """A query-result-shaped DataFrame of synthetic trades"""
+    import pandas as pd
+
+    from db_setup import generate_trades
+
+    columns = ["trade_id", "cp_id", "px_type", "notl", "ccy_pair", "near_dt", "far_dt", "rate"]
+    batch = next(generate_trades(rows, 1000, seed=seed, batch_size=rows))
+    df = pd.DataFrame(batch, columns=columns)
+    df["cp_name"] = "Counterparty " + df["cp_id"].astype(str)
+    return df
+
+
+def controls(chart_type: str, mix: dict) -> dict:
+    x = mix["x_numeric"] if chart_type == "Scatter Plot" else mix["x"]
+    return {
+        "x_column": x,
+        "y_column": mix["y"],
+        "color_column": mix.get("color"),
+        "size_column": mix.get("size") if chart_type == "Scatter Plot" else None,
+    }
+
+
+def serialize(fig) -> str:
+    """The figure JSON st.plotly_chart ships to the browser"""
+    import plotly.io as pio
+
+    return pio.to_json(fig, validate=False)
+
+
+def profile(df, chart_type: str, mix_name: str, runs: int) -> dict:
+    args = controls(chart_type, COLUMN_MIXES[mix_name])
+    build, dump = [], []
+    payload = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        fig = build_figure(df, chart_type, theme="hub", **args)
+        build.append(time.perf_counter() - started)
+        if fig is None:
+            return {"skipped": True}
+        started = time.perf_counter()
+        payload = serialize(fig)
+        dump.append(time.perf_counter() - started)
+
+    traces = json.loads(payload)["data"]
+    return {
+        "build_ms": statistics.median(build) * 1000,
+        "serialize_ms": statistics.median(dump) * 1000,
+        "payload_bytes": len(payload.encode("utf-8")),
+        "traces": len(traces),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chart construction and payload size")
+    parser.add_argument("--sizes", default="100,1k,10k,100k", help="comma separated result row counts")
+    parser.add_argument("--charts", default=",".join(CHART_TYPES))
+    parser.add_argument("--mixes", default=",".join(COLUMN_MIXES))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--max-build-ms", type=float, default=500.0)
+    parser.add_argument("--max-serialize-ms", type=float, default=500.0)
+    parser.add_argument("--max-mb", type=float, default=5.0, help="payload budget per figure")
+    parser.add_argument("--out", help="write results as JSON")
+    args = parser.parse_args()
+
+    chart_types = args.charts.split(",")
+    mixes = args.mixes.split(",")
+
+    # Pay the plotly import before anything is timed
+    build_figure(make_frame(10), "Bar Chart", "ccy_pair", "notl")
+
+    results, flagged = [], []
+    print(f"{'rows':>8} {'chart':<13} {'mix':<17} {'build ms':>9} {'json ms':>9} {'payload':>10} {'traces':>6}")
+    for rows in (parse_scale(s) for s in args.sizes.split(",")):
+        df = make_frame(rows)
+        for chart_type in chart_types:
+            for mix_name in mixes:
+                result = profile(df, chart_type, mix_name, args.runs)
+                result.update(rows=rows, chart=chart_type, mix=mix_name)
+                results.append(result)
+                if result.get("skipped"):
+                    continue
+
+                over = []
+                if result["build_ms"] > args.max_build_ms:
+                    over.append("build")
+                if result["serialize_ms"] > args.max_serialize_ms:
+                    over.append("serialize")
+                if result["payload_bytes"] > args.max_mb * 2**20:
+                    over.append("payload")
+                result["over_budget"] = over
+                if over:
+                    flagged.append(result)
+
+                print(f"{rows:>8} {chart_type:<13} {mix_name:<17} {result['build_ms']:>9.1f} "
+                      f"{result['serialize_ms']:>9.1f} {result['payload_bytes'] / 1024:>8.0f}KB "
+                      f"{result['traces']:>6}{'  OVER ' + ','.join(over) if over else ''}", flush=True)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"timestamp": time.time(), "budgets": {
+                "build_ms": args.max_build_ms, "serialize_ms": args.max_serialize_ms, "payload_mb": args.max_mb,
+            }, "results": results}, f, indent=1)
+
+    if flagged:
+        print(f"\n{len(flagged)} chart configurations over budget")
+        sys.exit(1)
+    print("\nAll chart configurations within budget.")
+
+
+if __name__ == "__main__":
+    main()
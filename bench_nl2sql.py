@@ -0,0 +1,237 @@
+"""
+NL -> SQL benchmark against the versioned gold question set.
+
+Each gold question goes through engine.generate_sql (caches cleared, fast
+path off unless --fastpath) and the generated SQL is executed and compared
+with the result of the gold SQL. Reports tokens in/out, latency
+distribution, parse-failure rate, clarification rate and execution
+accuracy.
+
+LLM backends:
+    live    the configured endpoint (add --record FILE to save responses)
+    replay  responses recorded earlier with --record, keyed by prompt hash
+    mock    answers with the gold SQL after --mock-latency seconds; measures
+            the pipeline around the model and checks the harness itself
+
+    python bench_nl2sql.py --backend replay --recordings recordings.json --out report.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import engine
+from stats import format_latencies, summarize_latencies
+
+GOLD_PATH = "nl2sql_gold.json"
+PARSE_ERROR_PREFIX = "Parsing error"
+FLOAT_DIGITS = 4
+
+
+def load_gold(path: str = GOLD_PATH) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def prompt_hash(messages: list) -> str:
+    return hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _normalize_value(value):
+    if value is None or value != value:
+        return None
+    if isinstance(value, (int, float)):
+        return round(float(value), FLOAT_DIGITS)
+    return str(value)
+
+
+def canonical_rows(df, ordered: bool) -> list:
+    """
+    Rows as comparable tuples. Column names and column order are ignored
+    (each row's values are sorted); row order only counts when ordered.
+    """
+    rows = [
+        tuple(sorted((_normalize_value(v) for v in row), key=lambda v: (v is None, str(type(v)), str(v))))
+        for row in df.itertuples(index=False, name=None)
+    ]
+    return rows if ordered else sorted(rows, key=repr)
+
+
+def recording_backend(recordings: dict, record: bool):
+    """Live backend that also stores every response in recordings"""
+    def backend(messages):
+        status_code, body, text = engine.http_completion(messages)
+        if record and status_code == 200:
+            recordings[prompt_hash(messages)] = body
+        return status_code, body, text
+    return backend
+
+
+def replay_backend(recordings: dict):
+    def backend(messages):
+        body = recordings.get(prompt_hash(messages))
+        if body is None:
+            return 404, None, "No recorded response for this prompt"
+        return 200, body, json.dumps(body)
+    return backend
+
+
+def mock_backend(gold: dict, latency: float):
+    """Answers every gold question with its gold SQL (or a clarification)"""
+    by_prompt = {}
+    for entry in gold["questions"]:
+        by_prompt[engine.create_prompt(entry["question"])] = entry
+
+    def backend(messages):
+        prompt = messages[-1]["content"]
+        entry = by_prompt.get(prompt)
+        time.sleep(latency)
+        if entry is None:
+            return 404, None, "Question is not in the gold set"
+        if entry.get("expect_clarification"):
+            answer = {"sql": "", "clarification": "Please be more specific.", "explanation": "Ambiguous question."}
+        else:
+            answer = {"sql": entry["expected_sql"], "clarification": "", "explanation": "Gold SQL."}
+        content = json.dumps(answer)
+        body = {
+            "choices": [{"message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4},
+        }
+        return 200, body, content
+    return backend
+
+
+def run_question(entry: dict) -> dict:
+    """Translate, execute and score one gold question"""
+    engine.sql_cache.clear()
+    outcome = {"id": entry["id"], "question": entry["question"]}
+
+    started = time.perf_counter()
+    result = engine.generate_sql(entry["question"])
+    outcome["seconds"] = time.perf_counter() - started
+
+    metrics = result.get("metrics") or {}
+    outcome["source"] = result.get("source")
+    outcome["prompt_tokens"] = metrics.get("prompt_tokens")
+    outcome["completion_tokens"] = metrics.get("completion_tokens")
+    outcome["sql"] = result.get("sql", "")
+
+    if str(result.get("explanation", "")).startswith(PARSE_ERROR_PREFIX):
+        outcome["status"] = "parse_failure"
+    elif result.get("clarification"):
+        outcome["status"] = "correct" if entry.get("expect_clarification") else "clarification"
+        outcome["clarification"] = result["clarification"]
+    elif entry.get("expect_clarification"):
+        outcome["status"] = "missed_clarification"
+    elif not outcome["sql"]:
+        outcome["status"] = "no_sql"
+    else:
+        df, error = engine.execute_sql(outcome["sql"])
+        expected, expected_error = engine.execute_sql(entry["expected_sql"])
+        if expected_error:
+            raise ValueError(f"gold SQL for {entry['id']} failed: {expected_error}")
+        if error:
+            outcome["status"] = "sql_error"
+            outcome["error"] = error
+        else:
+            ordered = entry.get("ordered", False)
+            matches = canonical_rows(df, ordered) == canonical_rows(expected, ordered)
+            outcome["status"] = "correct" if matches else "wrong_result"
+    return outcome
+
+
+def summarize(outcomes: list) -> dict:
+    total = len(outcomes)
+    counts = {}
+    for outcome in outcomes:
+        counts[outcome["status"]] = counts.get(outcome["status"], 0) + 1
+
+    def rate(*statuses):
+        return sum(counts.get(s, 0) for s in statuses) / total if total else 0.0
+
+    prompt_tokens = [o["prompt_tokens"] for o in outcomes if o.get("prompt_tokens") is not None]
+    completion_tokens = [o["completion_tokens"] for o in outcomes if o.get("completion_tokens") is not None]
+    return {
+        "questions": total,
+        "statuses": counts,
+        "accuracy": rate("correct"),
+        "parse_failure_rate": rate("parse_failure"),
+        "clarification_rate": sum(1 for o in outcomes if o.get("clarification")) / total if total else 0.0,
+        "sql_error_rate": rate("sql_error"),
+        "latency": summarize_latencies([o["seconds"] for o in outcomes]),
+        "prompt_tokens": sum(prompt_tokens),
+        "completion_tokens": sum(completion_tokens),
+        "mean_prompt_tokens": sum(prompt_tokens) / len(prompt_tokens) if prompt_tokens else None,
+        "mean_completion_tokens": sum(completion_tokens) / len(completion_tokens) if completion_tokens else None,
+    }
+
+
+def report(summary: dict, outcomes: list, meta: dict):
+    print(f"Gold set v{meta['gold_version']} · {summary['questions']} questions · backend={meta['backend']} "
+          f"· model={meta['model']} · prompt={meta['prompt_sha'][:12]}")
+    print(f"  accuracy           {summary['accuracy']:.1%}")
+    print(f"  parse failures     {summary['parse_failure_rate']:.1%}")
+    print(f"  clarifications     {summary['clarification_rate']:.1%}")
+    print(f"  sql errors         {summary['sql_error_rate']:.1%}")
+    print(f"  tokens in/out      {summary['prompt_tokens']} / {summary['completion_tokens']}")
+    print("  " + format_latencies("latency", [o["seconds"] for o in outcomes]))
+    failures = [o for o in outcomes if o["status"] != "correct"]
+    if failures:
+        print("\nNot correct:")
+        for outcome in failures:
+            print(f"  {outcome['status']:<20} {outcome['id']:<20} {outcome.get('sql') or outcome.get('clarification', '')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark NL -> SQL speed and accuracy on the gold set")
+    parser.add_argument("--gold", default=GOLD_PATH)
+    parser.add_argument("--db", default=None, help="database the gold SQL was written for (default: from the gold file)")
+    parser.add_argument("--backend", choices=["live", "replay", "mock"], default="mock")
+    parser.add_argument("--recordings", default="nl2sql_recordings.json", help="recorded responses for replay/record")
+    parser.add_argument("--record", action="store_true", help="save live responses to --recordings")
+    parser.add_argument("--mock-latency", type=float, default=0.0, help="seconds the mock model takes per call")
+    parser.add_argument("--fastpath", action="store_true", help="let the rule-based fast path answer first")
+    parser.add_argument("--tag", action="append", help="only run questions with this tag (repeatable)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--out", help="write the summary and per-question outcomes as JSON")
+    args = parser.parse_args()
+
+    gold = load_gold(args.gold)
+    engine.set_database(args.db or gold.get("database", engine.DB_PATH))
+    engine.FASTPATH_ENABLED = args.fastpath
+
+    recordings = {}
+    if os.path.exists(args.recordings):
+        with open(args.recordings, encoding="utf-8") as f:
+            recordings = json.load(f)
+    if args.backend == "live":
+        engine.llm_backend = recording_backend(recordings, args.record)
+    elif args.backend == "replay":
+        engine.llm_backend = replay_backend(recordings)
+    else:
+        engine.llm_backend = mock_backend(gold, args.mock_latency)
+
+    questions = [q for q in gold["questions"] if not args.tag or set(args.tag) & set(q.get("tags", []))]
+    outcomes = [run_question(entry) for _ in range(args.repeat) for entry in questions]
+    summary = summarize(outcomes)
+    meta = {
+        "gold_version": gold["version"],
+        "backend": args.backend,
+        "model": engine.LLM_MODEL,
+        "prompt_sha": hashlib.sha256(engine.create_prompt("").encode("utf-8")).hexdigest(),
+        "fastpath": args.fastpath,
+        "timestamp": time.time(),
+    }
+    report(summary, outcomes, meta)
+
+    if args.record:
+        with open(args.recordings, "w", encoding="utf-8") as f:
+            json.dump(recordings, f, indent=1)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "summary": summary, "outcomes": outcomes}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Scaled SQL execution benchmark with regression thresholds.
+
+Builds synthetic databases at several sizes (db_setup.build_database),
+runs a catalog of representative generated queries through
+engine.execute_sql under different configurations and records timings
+and peak Python memory (tracemalloc, which sees pandas/numpy buffers).
+
+    python bench_sql.py --scales 10k,100k,1m --configs baseline,indexes,rollups --out run.json
+    python bench_sql.py --scales 1m --baseline run.json --max-regression 0.25
+    python bench_sql.py --scales 1m --budgets budgets.json
+
+Exits with status 1 when a run regresses past --max-regression against
+--baseline, exceeds a budget, or a query fails.
+
+Budgets file: {"1000000": {"baseline/rollup_px_type": 250, "*/lookup": 5}} (ms)
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import time
+import tracemalloc
+
+import db_setup
+import engine
+import sharding
+
+QUERIES = {
+    "rollup_px_type": "SELECT px_type, SUM(notl) AS total_notional FROM trades GROUP BY px_type",
+    "usd_by_px_type": "SELECT px_type, SUM(notl_usd) AS total_usd_notional FROM trades GROUP BY px_type",
+    "usd_udf_by_pair": "SELECT ccy_pair, SUM(to_usd(notl, ccy_pair, near_day)) AS total_usd_notional "
+                       "FROM trades WHERE near_dt >= '2025-08-01' GROUP BY ccy_pair",
+    "rollup_pair_rate": "SELECT ccy_pair, AVG(rate) AS avg_rate FROM trades GROUP BY ccy_pair",
+    "rollup_monthly": "SELECT strftime('%Y-%m', near_dt) AS month, SUM(notl) AS total_notional "
+                      "FROM trades GROUP BY month ORDER BY month",
+    "join_region": "SELECT c.region, COUNT(*) AS trade_count, SUM(t.notl) AS total_notional "
+                   "FROM trades t JOIN counterparties c ON t.cp_id = c.cp_id GROUP BY c.region",
+    "join_top_cp": "SELECT c.cp_name, SUM(t.notl) AS total FROM trades t JOIN counterparties c "
+                   "ON t.cp_id = c.cp_id GROUP BY c.cp_name ORDER BY total DESC LIMIT 10",
+    "date_filter_rows": "SELECT * FROM trades WHERE near_dt BETWEEN '2025-08-01' AND '2025-08-07'",
+    "date_filter_count": "SELECT COUNT(*) AS swaps FROM trades WHERE near_dt >= '2025-01-01' AND px_type = 'swap'",
+    "dim_weekly_range": "SELECT d.week, COUNT(*) AS trade_count, SUM(t.notl) AS total_notional "
+                        "FROM trades t JOIN dim_date d ON d.day = t.near_day "
+                        "WHERE d.date BETWEEN '2025-08-01' AND '2025-08-31' GROUP BY d.week",
+    "dim_quarterly": "SELECT d.quarter, SUM(t.notl) AS total_notional FROM trades t "
+                     "JOIN dim_date d ON d.day = t.near_day GROUP BY d.quarter ORDER BY d.quarter",
+    "top_n_trades": "SELECT * FROM trades ORDER BY notl DESC LIMIT 10",
+    "top_pairs": "SELECT ccy_pair, SUM(notl) AS total_notional FROM trades GROUP BY ccy_pair "
+                 "ORDER BY total_notional DESC LIMIT 5",
+    "large_swaps": "SELECT * FROM trades WHERE px_type = 'swap' AND notl > 60000000",
+    "lookup": "SELECT * FROM trades WHERE trade_id = 4242",
+}
+
+BENCH_INDEXES = {
+    "idx_bench_px_type": "trades (px_type)",
+    "idx_bench_ccy_pair": "trades (ccy_pair)",
+    "idx_bench_near_dt": "trades (near_dt)",
+    "idx_bench_cp_id": "trades (cp_id)",
+    "idx_bench_notl": "trades (notl)",
+}
+
+TUNED_PRAGMAS = {"cache_size": -262144, "mmap_size": 1 << 30, "temp_store": "MEMORY"}
+
+# executors: alternative engines tried before SQLite; cache: keep the result
+# cache warm between runs; pool: reuse connections between runs; sharded:
+# run against a per-month shard split of the database
+CONFIGS = {
+    "baseline": {},
+    "indexes": {"indexes": True},
+    "pragmas": {"pragmas": TUNED_PRAGMAS},
+    "no_pool": {"pool": False},
+    "cached": {"cache": True},
+    "rollups": {"executors": ["summary"]},
+    "columnar": {"executors": ["columnar"]},
+    "tuned": {"indexes": True, "pragmas": TUNED_PRAGMAS, "executors": ["summary", "columnar"]},
+    "sharded": {"sharded": True, "executors": ["sharded"]},
+    "parallel": {"executors": ["parallel"]},
+}
+
+EXECUTORS = {
+    "summary": engine._summary_executor,
+    "columnar": engine._columnar_executor,
+    "sharded": engine._sharded_executor,
+    "parallel": engine._parallel_executor,
+}
+
+
+def parse_scale(text: str) -> int:
+    text = text.strip().lower().replace("_", "")
+    for suffix, factor in (("k", 1_000), ("m", 1_000_000)):
+        if text.endswith(suffix):
+            return int(float(text[:-1]) * factor)
+    return int(text)
+
+
+def ensure_database(workdir: str, trades: int, seed: int) -> str:
+    """Build (or reuse) the synthetic database for one scale"""
+    os.makedirs(workdir, exist_ok=True)
+    path = os.path.join(workdir, f"trades_{trades}_s{seed}.db")
+    if os.path.exists(path):
+        conn = sqlite3.connect(path)
+        try:
+            if conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0] == trades:
+                return path
+        except sqlite3.Error:
+            pass
+        finally:
+            conn.close()
+        db_setup.remove_database(path)
+
+    started = time.perf_counter()
+    db_setup.build_database(path, trades, seed=seed)
+    print(f"built {path} in {time.perf_counter() - started:.1f}s", flush=True)
+    return path
+
+
+def ensure_shards(path: str) -> str:
+    """Shard catalog for a benchmark database, re-split when it is stale"""
+    out_dir = path[:-len(".db")] + "_shards"
+    catalog = os.path.join(out_dir, "catalog.db")
+    if os.path.exists(catalog):
+        conn = sqlite3.connect(catalog)
+        try:
+            sharded = conn.execute(f"SELECT SUM(rows) FROM {sharding.CATALOG_TABLE}").fetchone()[0]
+        finally:
+            conn.close()
+        source = sqlite3.connect(path)
+        try:
+            if sharded == source.execute("SELECT COUNT(*) FROM trades").fetchone()[0]:
+                return catalog
+        finally:
+            source.close()
+    shutil.rmtree(out_dir, ignore_errors=True)
+    started = time.perf_counter()
+    sharding.split(path, out_dir)
+    print(f"  sharded into {out_dir} in {time.perf_counter() - started:.1f}s", flush=True)
+    return catalog
+
+
+def set_indexes(path: str, enabled: bool):
+    conn = sqlite3.connect(path)
+    for name, target in BENCH_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}" if enabled else f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+    conn.close()
+
+
+def run_query(sql: str, config: dict, runs: int, memory: bool) -> dict:
+    timings = []
+    rows = None
+    for _ in range(runs):
+        if not config.get("cache"):
+            engine.result_cache.clear()
+        if not config.get("pool", True):
+            engine.pool.close()
+        started = time.perf_counter()
+        df, error = engine.execute_sql(sql)
+        timings.append(time.perf_counter() - started)
+        if error:
+            return {"error": error}
+        rows = len(df)
+        del df
+
+    result = {
+        "rows": rows,
+        "first_ms": timings[0] * 1000,
+        "median_ms": statistics.median(timings) * 1000,
+        "min_ms": min(timings) * 1000,
+    }
+    if memory:
+        if not config.get("cache"):
+            engine.result_cache.clear()
+        tracemalloc.start()
+        df, _ = engine.execute_sql(sql)
+        result["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+        del df
+    return result
+
+
+def run_config(path: str, name: str, config: dict, queries: dict, runs: int, memory: bool) -> list:
+    if config.get("indexes"):
+        started = time.perf_counter()
+        set_indexes(path, True)
+        print(f"  indexes built in {time.perf_counter() - started:.1f}s", flush=True)
+
+    saved_executors = list(engine.executors)
+    saved_path = engine.DB_PATH
+    engine.executors[:] = [EXECUTORS[e] for e in config.get("executors", [])]
+    engine.set_database(ensure_shards(path) if config.get("sharded") else path, pragmas=config.get("pragmas"))
+    try:
+        results = []
+        for query_name, sql in queries.items():
+            result = run_query(sql, config, runs, memory)
+            result.update(config=name, query=query_name)
+            results.append(result)
+            if "error" in result:
+                print(f"  {name:<10} {query_name:<18} ERROR {result['error']}", flush=True)
+            else:
+                print(f"  {name:<10} {query_name:<18} {result['rows']:>9} rows  first={result['first_ms']:9.1f}ms  "
+                      f"median={result['median_ms']:9.1f}ms  peak={result.get('peak_mb', 0):8.1f}MB", flush=True)
+        return results
+    finally:
+        engine.executors[:] = saved_executors
+        engine.set_database(saved_path)
+        if config.get("indexes"):
+            set_indexes(path, False)
+
+
+def check(results: list, baseline: list, max_regression: float, min_ms: float, budgets: dict) -> list:
+    """Violations of the baseline regression threshold and absolute budgets"""
+    violations = [f"{r['scale']} {r['config']}/{r['query']}: {r['error']}" for r in results if "error" in r]
+
+    previous = {(r["scale"], r["config"], r["query"]): r for r in baseline or [] if "median_ms" in r}
+    for r in results:
+        if "median_ms" not in r:
+            continue
+        base = previous.get((r["scale"], r["config"], r["query"]))
+        if base is not None:
+            limit = max(base["median_ms"] * (1 + max_regression), base["median_ms"] + min_ms)
+            if r["median_ms"] > limit:
+                violations.append(f"{r['scale']} {r['config']}/{r['query']}: {r['median_ms']:.1f}ms "
+                                  f"vs baseline {base['median_ms']:.1f}ms (limit {limit:.1f}ms)")
+
+        scale_budgets = (budgets or {}).get(str(r["scale"]), {})
+        budget = scale_budgets.get(f"{r['config']}/{r['query']}", scale_budgets.get(f"*/{r['query']}"))
+        if budget is not None and r["median_ms"] > budget:
+            violations.append(f"{r['scale']} {r['config']}/{r['query']}: {r['median_ms']:.1f}ms over budget {budget}ms")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark generated SQL at several database scales")
+    parser.add_argument("--scales", default="10k,100k,1m", help="comma separated trade counts, e.g. 10k,1m,50m")
+    parser.add_argument("--configs", default=",".join(CONFIGS), help=f"subset of {','.join(CONFIGS)}")
+    parser.add_argument("--queries", default=None, help="comma separated subset of the query catalog")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--workdir", default="bench_dbs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results as JSON (usable as a later --baseline)")
+    parser.add_argument("--baseline", help="results JSON from an earlier run")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--min-ms", type=float, default=5.0, help="ignore regressions smaller than this")
+    parser.add_argument("--budgets", help="JSON file of absolute per-scale budgets in ms")
+    args = parser.parse_args()
+
+    queries = QUERIES if not args.queries else {q: QUERIES[q] for q in args.queries.split(",")}
+    configs = {c: CONFIGS[c] for c in args.configs.split(",")}
+
+    # Pay the pandas import before anything is timed
+    engine.execute_sql("SELECT 1")
+
+    results = []
+    for scale in (parse_scale(s) for s in args.scales.split(",")):
+        path = ensure_database(args.workdir, scale, args.seed)
+        print(f"\n== {scale:,} trades ({os.path.getsize(path) / 2**20:.0f} MB) ==", flush=True)
+        for name, config in configs.items():
+            for result in run_config(path, name, config, queries, args.runs, not args.no_memory):
+                result["scale"] = scale
+                results.append(result)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"timestamp": time.time(), "runs": args.runs, "results": results}, f, indent=1)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    budgets = None
+    if args.budgets:
+        with open(args.budgets, encoding="utf-8") as f:
+            budgets = json.load(f)
+
+    violations = check(results, baseline, args.max_regression, args.min_ms, budgets)
+    if violations:
+        print("\nThreshold violations:")
+        for violation in violations:
+            print(f"  {violation}")
+        sys.exit(1)
+    print("\nAll runs within thresholds.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Bulk import of historical trades from CSV and Parquet files.
+
+    python bulk_import.py --db fx_trades.db history/2019.csv history/2020.parquet --workers 8
+
+Files are cut into chunks (byte ranges of a CSV, row groups of a Parquet
+file) that worker processes parse and validate with vectorized pandas
+conversions: integer ids, positive notionals and rates, known px_type
+values, XXX/YYY pairs, ISO dates and far_dt not before near_dt. Each
+chunk is converted to USD at the database's fixings (fx_rates.py) and
+written to its own staging file with no indexes, and the chunk files are
+appended, in input order, to one staging table.
+
+The staging table is then merged by the writer process (writer.py) in one
+transaction. The writer drops the secondary indexes of trades and the
+rollup triggers, runs INSERT OR REPLACE on trade_id in staging order (so
+the last version of a trade wins), recreates the indexes and recomputes
+the rollups. Other triggers on trades stay in place and see replaced
+rows as deletes because the writer enables recursive_triggers.
+Readers keep querying the previous snapshot; other writes wait for the
+merge.
+
+CSV chunks are split at line boundaries, so fields must not contain
+newlines.
+"""
+import argparse
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import aggregates
+import fx_rates
+import writer
+from db_setup import PX_TYPES
+from ingest import TRADE_COLUMNS
+
+WORKERS = int(os.environ.get("FX_IMPORT_WORKERS", str(os.cpu_count() or 1)))
+CHUNK_BYTES = int(float(os.environ.get("FX_IMPORT_CHUNK_MB", "64")) * 2**20)
+
+STAGING_TABLE = "trades_staging"
+_STAGING_SCHEMA = f"""
+CREATE TABLE {STAGING_TABLE} (
+    trade_id INTEGER, cp_id INTEGER, px_type TEXT, notl REAL, ccy_pair TEXT,
+    near_dt TEXT, far_dt TEXT, rate REAL, notl_usd REAL
+)"""
+_STAGING_COLUMNS = TRADE_COLUMNS + (fx_rates.USD_COLUMN,)
+
+
+def chunks(path: str, chunk_bytes: int = CHUNK_BYTES) -> list:
+    """Import tasks for one file: (path, kind, part) with a byte range or a row group"""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        return [(path, "parquet", group) for group in range(pq.ParquetFile(path).num_row_groups)]
+    with open(path, "rb") as f:
+        header = f.readline()
+    size = os.path.getsize(path)
+    start = len(header)
+    return [(path, "csv", (offset, min(offset + chunk_bytes, size))) for offset in range(start, size, chunk_bytes)]
+
+
+def _read_csv_range(path: str, start: int, end: int):
+    """Lines starting in [start, end), as a DataFrame of strings"""
+    import pandas as pd
+
+    with open(path, "rb") as f:
+        header = f.readline().decode("utf-8").strip()
+        f.seek(start - 1)
+        if f.read(1) != b"\n":
+            # Mid-line: that line belongs to the previous range
+            f.readline()
+        data = f.read(end - f.tell()) if f.tell() < end else b""
+        if data and not data.endswith(b"\n"):
+            # The range ends mid-line: finish the line it started
+            data += f.readline()
+    columns = [c.strip() for c in header.split(",")]
+    return pd.read_csv(io.BytesIO(data), names=columns, header=None, dtype=str, keep_default_na=False)
+
+
+def convert(frame):
+    """
+    Vectorized conversion and validation of raw trade columns. Returns
+    (trades, rejected): a frame of the table's columns and the number of
+    rows dropped.
+    """
+    import numpy as np
+    import pandas as pd
+
+    def column(name):
+        return frame[name] if name in frame.columns else pd.Series([None] * len(frame), index=frame.index)
+
+    def dates(values):
+        text = values.astype("string").str.strip().replace("", pd.NA)
+        parsed = pd.to_datetime(text, format="ISO8601", errors="coerce")
+        return parsed, text.notna()
+
+    trade_id = pd.to_numeric(column("trade_id"), errors="coerce")
+    cp_id = pd.to_numeric(column("cp_id"), errors="coerce")
+    notl = pd.to_numeric(column("notl"), errors="coerce")
+    rate = pd.to_numeric(column("rate"), errors="coerce")
+    px_type = column("px_type").astype("string").str.strip().str.lower()
+    ccy_pair = column("ccy_pair").astype("string").str.strip().str.upper()
+    near, _ = dates(column("near_dt"))
+    far, far_given = dates(column("far_dt"))
+
+    valid = (
+        trade_id.notna() & (trade_id == trade_id.round())
+        & cp_id.notna() & (cp_id == cp_id.round())
+        & (notl > 0) & (rate > 0)
+        & px_type.isin(PX_TYPES).fillna(False)
+        & ccy_pair.str.fullmatch(r"[A-Z]{3}/[A-Z]{3}").fillna(False)
+        & near.notna()
+        & (~far_given | (far.notna() & (far >= near)))
+    ).fillna(False).to_numpy(dtype=bool)
+
+    def iso(values):
+        days = values[valid].to_numpy(dtype="datetime64[D]")
+        text = days.astype(str).astype(object)
+        text[np.isnat(days)] = None
+        return text
+
+    trades = pd.DataFrame({
+        "trade_id": trade_id[valid].astype("int64").to_numpy(),
+        "cp_id": cp_id[valid].astype("int64").to_numpy(),
+        "px_type": px_type[valid].to_numpy(dtype=object),
+        "notl": notl[valid].astype("float64").to_numpy(),
+        "ccy_pair": ccy_pair[valid].to_numpy(dtype=object),
+        "near_dt": iso(near),
+        "far_dt": iso(far),
+        "rate": rate[valid].astype("float64").to_numpy(),
+    })
+    return trades, int(len(frame) - valid.sum())
+
+
+def stage_chunk(args):
+    """Pool task: parse, validate, price and stage one chunk; returns (stage file, rows, rejected)"""
+    index, (path, kind, part), stage_dir, db = args
+    if kind == "parquet":
+        import pyarrow.parquet as pq
+
+        frame = pq.ParquetFile(path).read_row_group(part).to_pandas()
+    else:
+        frame = _read_csv_range(path, *part)
+    trades, rejected = convert(frame)
+    converter = fx_rates.get_rates(db).get()
+    # NaN (no fixing) is stored as NULL
+    trades[fx_rates.USD_COLUMN] = converter.convert(trades["notl"], trades["ccy_pair"],
+                                                    fx_rates.day_numbers(trades["near_dt"]))
+
+    stage = os.path.join(stage_dir, f"chunk_{index:06d}.db")
+    conn = sqlite3.connect(stage)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute(_STAGING_SCHEMA)
+    columns = [trades[c].tolist() for c in _STAGING_COLUMNS]
+    conn.executemany(f"INSERT INTO {STAGING_TABLE} VALUES ({', '.join('?' * len(_STAGING_COLUMNS))})", zip(*columns))
+    conn.commit()
+    conn.close()
+    return stage, len(trades), rejected
+
+
+def stage_files(paths: list, stage_dir: str, db: str, workers: int = WORKERS, on_chunk=None):
+    """
+    Stage every file into stage_dir/staging.db, priced at db's fixings;
+    returns (staging file, rows, rejected). Chunks are parsed in parallel
+    and appended in order.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    tasks = [(i, chunk, stage_dir, db) for i, chunk in enumerate(c for path in paths for c in chunks(path))]
+    staging = os.path.join(stage_dir, "staging.db")
+    conn = sqlite3.connect(staging, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute(_STAGING_SCHEMA)
+    rows = rejected = 0
+
+    def append(result):
+        nonlocal rows, rejected
+        stage, count, dropped = result
+        conn.execute("ATTACH DATABASE ? AS chunk", (stage,))
+        conn.execute(f"INSERT INTO {STAGING_TABLE} SELECT * FROM chunk.{STAGING_TABLE}")
+        conn.execute("DETACH DATABASE chunk")
+        os.remove(stage)
+        rows += count
+        rejected += dropped
+        if on_chunk is not None:
+            on_chunk(rows, rejected)
+
+    try:
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                for result in pool.map(stage_chunk, tasks):
+                    append(result)
+        else:
+            for task in tasks:
+                append(stage_chunk(task))
+    finally:
+        conn.close()
+    return staging, rows, rejected
+
+
+def merge_statements(conn) -> list:
+    """
+    Writer statements merging the attached staging table into trades,
+    with indexes and rollup triggers deferred to the end
+    """
+    # Explicit indexes only; the rowid (trade_id) is kept as the merge key
+    indexes = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'trades' AND sql IS NOT NULL"
+    ).fetchall()
+
+    columns = ", ".join(_STAGING_COLUMNS)
+    merge = [(f"DROP INDEX {name}", None) for name, _ in indexes]
+    merge.append((f"INSERT OR REPLACE INTO trades ({columns}) "
+                  f"SELECT {columns} FROM staging.{STAGING_TABLE} ORDER BY rowid", None))
+    merge += [(sql, None) for _, sql in indexes]
+    return fx_rates.schema_statements(conn) + aggregates.without_triggers(conn, merge)
+
+
+def import_files(db: str, paths: list, workers: int = WORKERS, on_chunk=None) -> dict:
+    """Stage and merge files into db through the writer; returns counts and timings"""
+    started = time.perf_counter()
+    stage_dir = tempfile.mkdtemp(prefix="fx-import-", dir=os.path.dirname(os.path.abspath(db)))
+    try:
+        staging, rows, rejected = stage_files(paths, stage_dir, db, workers, on_chunk)
+        staged = time.perf_counter()
+
+        conn = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+        try:
+            statements = merge_statements(conn)
+        finally:
+            conn.close()
+        client = writer.connect(db)
+        try:
+            client.transaction(statements, attach={"staging": staging})
+        finally:
+            client.close()
+        merged = time.perf_counter()
+    finally:
+        shutil.rmtree(stage_dir, ignore_errors=True)
+    return {
+        "rows": rows,
+        "rejected": rejected,
+        "stage_s": staged - started,
+        "merge_s": merged - staged,
+        "total_s": merged - started,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import trades from CSV/Parquet files")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--db", default=os.environ.get("FX_DB_PATH", "fx_trades.db"))
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+
+    def progress(rows, rejected):
+        elapsed = time.perf_counter() - started
+        print(f"  staged {rows:,} rows ({rejected:,} rejected), {rows / elapsed:,.0f} rows/s", flush=True)
+
+    result = import_files(args.db, args.files, args.workers, progress)
+    print(f"✅ Imported {result['rows']:,} trades ({result['rejected']:,} rejected) in {result['total_s']:.1f}s: "
+          f"staging {result['rows'] / result['stage_s']:,.0f} rows/s, "
+          f"merge {result['rows'] / result['merge_s']:,.0f} rows/s, "
+          f"overall {result['rows'] / result['total_s']:,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
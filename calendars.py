@@ -0,0 +1,364 @@
+"""
+Integer day columns, a date dimension and FX settlement calendars.
+
+near_dt and far_dt are ISO text, so bucketing trades by month or week
+means strftime/substr on every row. install() adds:
+
+  - near_day / far_day on trades: days since 1970-01-01 (the numbering
+    columnar.py uses), generated by SQLite from the text dates and
+    indexed, so date ranges become index range scans;
+  - dim_date: one row per day from DIM_START to DIM_END keyed by that
+    day number, with its date, year, quarter, month, ISO week, weekday,
+    weekend and USD business-day flags;
+  - fx_holidays: (ccy, day, name) settlement holidays per currency.
+
+Time buckets are then a join on an integer key:
+
+    SELECT d.month, SUM(t.notl) FROM trades t JOIN dim_date d ON d.day = t.near_day GROUP BY d.month
+
+Holidays are generated from rules for the major currencies (USD, EUR
+TARGET, GBP, JPY, CHF, CAD, AUD); other currencies only skip weekends
+unless a holiday file is loaded:
+
+    python calendars.py install --db fx_trades.db
+    python calendars.py load --db fx_trades.db holidays.csv    # ccy,date,name
+"""
+import argparse
+import csv
+import datetime
+import os
+import sqlite3
+
+DIM_START = os.environ.get("FX_DIM_DATE_START", "1990-01-01")
+DIM_END = os.environ.get("FX_DIM_DATE_END", "2060-12-31")
+
+# Day number of an ISO date text, NULL when SQLite cannot read it as a date
+DAY_EXPR = "CAST(julianday(date({column})) - 2440587.5 AS INTEGER)"
+DAY_COLUMNS = {"near_day": "near_dt", "far_day": "far_dt"}
+TABLES = ("dim_date", "fx_holidays")
+
+_EPOCH = datetime.date(1970, 1, 1)
+_WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+DIM_DATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dim_date (
+    day INTEGER PRIMARY KEY,    -- days since 1970-01-01, joins trades.near_day / far_day
+    date TEXT NOT NULL,         -- 'YYYY-MM-DD'
+    year INTEGER NOT NULL,
+    quarter TEXT NOT NULL,      -- 'YYYY-Qn'
+    month TEXT NOT NULL,        -- 'YYYY-MM'
+    week TEXT NOT NULL,         -- ISO week 'YYYY-Www'
+    weekday INTEGER NOT NULL,   -- 0 = Monday .. 6 = Sunday
+    weekday_name TEXT NOT NULL,
+    is_weekend INTEGER NOT NULL,
+    is_business_day INTEGER NOT NULL,   -- USD settlement calendar
+    is_month_end INTEGER NOT NULL       -- last USD business day of the month
+)"""
+
+HOLIDAYS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fx_holidays (
+    ccy TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    name TEXT,
+    PRIMARY KEY (ccy, day)
+) WITHOUT ROWID"""
+
+
+def day_number(value) -> int:
+    """Day number of a date or an ISO 'YYYY-MM-DD' string"""
+    if isinstance(value, str):
+        value = datetime.date.fromisoformat(value)
+    return (value - _EPOCH).days
+
+
+def from_day(day: int) -> datetime.date:
+    return _EPOCH + datetime.timedelta(days=day)
+
+
+# -- holiday rules ---------------------------------------------------------
+def _easter(year: int) -> datetime.date:
+    """Western Easter Sunday (anonymous Gregorian algorithm)"""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+def _fixed(month: int, day: int):
+    return lambda year: datetime.date(year, month, day)
+
+
+def _nth_weekday(month: int, weekday: int, n: int):
+    """n-th given weekday of the month, counting from the end when n < 0"""
+    def rule(year):
+        if n > 0:
+            first = datetime.date(year, month, 1)
+            return first + datetime.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+        last = datetime.date(year + month // 12, month % 12 + 1, 1) - datetime.timedelta(days=1)
+        return last - datetime.timedelta(days=(last.weekday() - weekday) % 7 + 7 * (-n - 1))
+    return rule
+
+
+def _weekday_before(month: int, day: int, weekday: int):
+    """Last given weekday strictly before month/day (e.g. Victoria Day)"""
+    def rule(year):
+        date = datetime.date(year, month, day) - datetime.timedelta(days=1)
+        return date - datetime.timedelta(days=(date.weekday() - weekday) % 7)
+    return rule
+
+
+def _easter_offset(days: int):
+    return lambda year: _easter(year) + datetime.timedelta(days=days)
+
+
+def _equinox(base: float, month: int):
+    """Japanese equinox day, valid 1980-2099"""
+    return lambda year: datetime.date(year, month, int(base + 0.242194 * (year - 1980) - (year - 1980) // 4))
+
+
+MON, THU = 0, 3
+
+# ccy -> (name, rule, observance, first year, last year). Observance moves a
+# holiday falling on a weekend: "us" Saturday to Friday and Sunday to
+# Monday, "next" to the next weekday that is not a holiday, "sunday" only
+# Sundays to the next non-holiday (Japan's substitute holiday).
+HOLIDAY_RULES = {
+    "USD": [
+        ("New Year's Day", _fixed(1, 1), "us", None, None),
+        ("Martin Luther King Jr. Day", _nth_weekday(1, MON, 3), None, 1986, None),
+        ("Presidents' Day", _nth_weekday(2, MON, 3), None, None, None),
+        ("Memorial Day", _nth_weekday(5, MON, -1), None, None, None),
+        ("Juneteenth", _fixed(6, 19), "us", 2022, None),
+        ("Independence Day", _fixed(7, 4), "us", None, None),
+        ("Labor Day", _nth_weekday(9, MON, 1), None, None, None),
+        ("Columbus Day", _nth_weekday(10, MON, 2), None, None, None),
+        ("Veterans Day", _fixed(11, 11), "us", None, None),
+        ("Thanksgiving", _nth_weekday(11, THU, 4), None, None, None),
+        ("Christmas Day", _fixed(12, 25), "us", None, None),
+    ],
+    # TARGET2 closing days
+    "EUR": [
+        ("New Year's Day", _fixed(1, 1), None, None, None),
+        ("Good Friday", _easter_offset(-2), None, 2000, None),
+        ("Easter Monday", _easter_offset(1), None, 2000, None),
+        ("Labour Day", _fixed(5, 1), None, 2000, None),
+        ("Christmas Day", _fixed(12, 25), None, None, None),
+        ("Boxing Day", _fixed(12, 26), None, 2000, None),
+    ],
+    "GBP": [
+        ("New Year's Day", _fixed(1, 1), "next", None, None),
+        ("Good Friday", _easter_offset(-2), None, None, None),
+        ("Easter Monday", _easter_offset(1), None, None, None),
+        ("Early May Bank Holiday", _nth_weekday(5, MON, 1), None, None, None),
+        ("Spring Bank Holiday", _nth_weekday(5, MON, -1), None, None, None),
+        ("Summer Bank Holiday", _nth_weekday(8, MON, -1), None, None, None),
+        ("Christmas Day", _fixed(12, 25), "next", None, None),
+        ("Boxing Day", _fixed(12, 26), "next", None, None),
+    ],
+    "JPY": [
+        ("Bank Holiday", _fixed(1, 2), None, None, None),
+        ("Bank Holiday", _fixed(1, 3), None, None, None),
+        ("New Year's Day", _fixed(1, 1), "sunday", None, None),
+        ("Coming of Age Day", _nth_weekday(1, MON, 2), None, 2000, None),
+        ("National Foundation Day", _fixed(2, 11), "sunday", None, None),
+        ("Emperor's Birthday", _fixed(2, 23), "sunday", 2020, None),
+        ("Vernal Equinox Day", _equinox(20.8431, 3), "sunday", None, None),
+        ("Showa Day", _fixed(4, 29), "sunday", None, None),
+        ("Constitution Memorial Day", _fixed(5, 3), "sunday", None, None),
+        ("Greenery Day", _fixed(5, 4), "sunday", None, None),
+        ("Children's Day", _fixed(5, 5), "sunday", None, None),
+        ("Marine Day", _nth_weekday(7, MON, 3), None, 2003, None),
+        ("Mountain Day", _fixed(8, 11), "sunday", 2016, None),
+        ("Respect for the Aged Day", _nth_weekday(9, MON, 3), None, 2003, None),
+        ("Autumnal Equinox Day", _equinox(23.2488, 9), "sunday", None, None),
+        ("Sports Day", _nth_weekday(10, MON, 2), None, 2000, None),
+        ("Culture Day", _fixed(11, 3), "sunday", None, None),
+        ("Labour Thanksgiving Day", _fixed(11, 23), "sunday", None, None),
+        ("Emperor's Birthday", _fixed(12, 23), "sunday", 1989, 2018),
+        ("Bank Holiday", _fixed(12, 31), None, None, None),
+    ],
+    "CHF": [
+        ("New Year's Day", _fixed(1, 1), None, None, None),
+        ("Berchtoldstag", _fixed(1, 2), None, None, None),
+        ("Good Friday", _easter_offset(-2), None, None, None),
+        ("Easter Monday", _easter_offset(1), None, None, None),
+        ("Labour Day", _fixed(5, 1), None, None, None),
+        ("Ascension Day", _easter_offset(39), None, None, None),
+        ("Whit Monday", _easter_offset(50), None, None, None),
+        ("National Day", _fixed(8, 1), None, None, None),
+        ("Christmas Day", _fixed(12, 25), None, None, None),
+        ("St. Stephen's Day", _fixed(12, 26), None, None, None),
+    ],
+    "CAD": [
+        ("New Year's Day", _fixed(1, 1), "next", None, None),
+        ("Family Day", _nth_weekday(2, MON, 3), None, 2008, None),
+        ("Good Friday", _easter_offset(-2), None, None, None),
+        ("Victoria Day", _weekday_before(5, 25, MON), None, None, None),
+        ("Canada Day", _fixed(7, 1), "next", None, None),
+        ("Civic Holiday", _nth_weekday(8, MON, 1), None, None, None),
+        ("Labour Day", _nth_weekday(9, MON, 1), None, None, None),
+        ("Thanksgiving", _nth_weekday(10, MON, 2), None, None, None),
+        ("Remembrance Day", _fixed(11, 11), "next", None, None),
+        ("Christmas Day", _fixed(12, 25), "next", None, None),
+        ("Boxing Day", _fixed(12, 26), "next", None, None),
+    ],
+    # Sydney
+    "AUD": [
+        ("New Year's Day", _fixed(1, 1), "next", None, None),
+        ("Australia Day", _fixed(1, 26), "next", None, None),
+        ("Good Friday", _easter_offset(-2), None, None, None),
+        ("Easter Monday", _easter_offset(1), None, None, None),
+        ("Anzac Day", _fixed(4, 25), None, None, None),
+        ("King's Birthday", _nth_weekday(6, MON, 2), None, None, None),
+        ("Bank Holiday", _nth_weekday(8, MON, 1), None, None, None),
+        ("Labour Day", _nth_weekday(10, MON, 1), None, None, None),
+        ("Christmas Day", _fixed(12, 25), "next", None, None),
+        ("Boxing Day", _fixed(12, 26), "next", None, None),
+    ],
+}
+
+
+def holidays(ccy: str, first_year: int, last_year: int) -> list:
+    """Sorted (date, name) holidays of a currency's rule-based calendar"""
+    result = {}
+    for year in range(first_year, last_year + 1):
+        actual = [(rule(year), name, observance) for name, rule, observance, since, until in HOLIDAY_RULES.get(ccy, ())
+                  if (since is None or year >= since) and (until is None or year <= until)]
+        taken = {date for date, _, _ in actual}
+        for date, name, observance in sorted(actual, key=lambda h: h[0]):
+            if observance == "us" and date.weekday() >= 5:
+                date += datetime.timedelta(days=-1 if date.weekday() == 5 else 1)
+                name += " (observed)"
+            elif (observance == "next" and date.weekday() >= 5) or (observance == "sunday" and date.weekday() == 6):
+                date += datetime.timedelta(days=1)
+                while date.weekday() >= 5 or date in taken:
+                    date += datetime.timedelta(days=1)
+                name += " (observed)"
+                taken.add(date)
+            result.setdefault(date, name)
+    return sorted(result.items())
+
+
+def _date_rows(start: datetime.date, end: datetime.date, usd_holidays: set) -> list:
+    rows = []
+    day = start
+    while day <= end:
+        iso_year, iso_week, _ = day.isocalendar()
+        weekend = day.weekday() >= 5
+        rows.append([day_number(day), day.isoformat(), day.year, f"{day.year}-Q{(day.month - 1) // 3 + 1}",
+                     day.strftime("%Y-%m"), f"{iso_year}-W{iso_week:02d}", day.weekday(), _WEEKDAYS[day.weekday()],
+                     int(weekend), int(not weekend and day not in usd_holidays), 0])
+        day += datetime.timedelta(days=1)
+    # Month end: the last business day of each month
+    last_of_month = {}
+    for row in rows:
+        if row[9]:
+            last_of_month[row[4]] = row
+    for row in last_of_month.values():
+        row[10] = 1
+    return rows
+
+
+# -- installation ------------------------------------------------------------
+def _trades_columns(conn) -> set:
+    # table_xinfo lists generated columns too
+    return {row[1] for row in conn.execute("PRAGMA table_xinfo(trades)")}
+
+
+def day_columns_ddl(stored: bool = True) -> list:
+    """Column definitions of the generated day columns, for CREATE TABLE"""
+    kind = "STORED" if stored else "VIRTUAL"
+    return [f"{name} INTEGER GENERATED ALWAYS AS ({DAY_EXPR.format(column=source)}) {kind}"
+            for name, source in DAY_COLUMNS.items()]
+
+
+def add_day_columns(conn):
+    """Add near_day/far_day to an existing trades table and index them"""
+    existing = _trades_columns(conn)
+    for name, ddl in zip(DAY_COLUMNS, day_columns_ddl(stored=False)):
+        if name not in existing:
+            # ALTER TABLE can only add VIRTUAL generated columns; the index stores the values
+            conn.execute(f"ALTER TABLE trades ADD COLUMN {ddl}")
+    for name in DAY_COLUMNS:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_trades_{name} ON trades ({name})")
+
+
+def install(conn, start: str = DIM_START, end: str = DIM_END):
+    """Day columns on trades, dim_date and the rule-based holidays (idempotent)"""
+    start, end = datetime.date.fromisoformat(start), datetime.date.fromisoformat(end)
+    add_day_columns(conn)
+    conn.execute(DIM_DATE_SCHEMA)
+    # Lets a date or month filter on dim_date drive the join through idx_trades_near_day
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_dim_date_date ON dim_date (date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_dim_date_month ON dim_date (month)")
+    conn.execute(HOLIDAYS_SCHEMA)
+    for ccy in HOLIDAY_RULES:
+        conn.executemany("INSERT OR IGNORE INTO fx_holidays (ccy, day, name) VALUES (?, ?, ?)",
+                         [(ccy, day_number(date), name) for date, name in holidays(ccy, start.year, end.year)])
+    refresh_dim_date(conn, start, end)
+    conn.commit()
+
+
+def refresh_dim_date(conn, start: datetime.date = None, end: datetime.date = None):
+    """Rewrite dim_date over [start, end] (default: its current range) from fx_holidays"""
+    if start is None or end is None:
+        low, high = conn.execute("SELECT MIN(day), MAX(day) FROM dim_date").fetchone()
+        if low is None:
+            return
+        start, end = from_day(low), from_day(high)
+    usd = {from_day(row[0]) for row in conn.execute("SELECT day FROM fx_holidays WHERE ccy = 'USD'")}
+    conn.execute("DELETE FROM dim_date")
+    conn.executemany("INSERT INTO dim_date VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", _date_rows(start, end, usd))
+
+
+def load_holidays(conn, path: str) -> int:
+    """
+    Add or replace holidays from a CSV with ccy, date and name columns
+    (e.g. an official calendar for a currency the rules do not cover);
+    returns the number of rows read
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = [(row["ccy"].strip().upper(), day_number(row["date"].strip()), (row.get("name") or "").strip() or None)
+                for row in csv.DictReader(f)]
+    conn.executemany("INSERT OR REPLACE INTO fx_holidays (ccy, day, name) VALUES (?, ?, ?)", rows)
+    refresh_dim_date(conn)
+    conn.commit()
+    return len(rows)
+
+
+def installed(conn) -> bool:
+    """True when trades has the day columns and dim_date exists"""
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return "dim_date" in names and "fx_holidays" in names and set(DAY_COLUMNS) <= _trades_columns(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage day columns, dim_date and FX holiday calendars")
+    parser.add_argument("command", choices=["install", "load"])
+    parser.add_argument("files", nargs="*", help="holiday CSVs (ccy,date,name) for load")
+    parser.add_argument("--db", default=os.environ.get("FX_DB_PATH", "fx_trades.db"))
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    try:
+        if args.command == "install":
+            install(conn)
+            days = conn.execute("SELECT COUNT(*) FROM dim_date").fetchone()[0]
+            count = conn.execute("SELECT COUNT(*) FROM fx_holidays").fetchone()[0]
+            print(f"✅ dim_date has {days:,} days, fx_holidays {count:,} holidays")
+        else:
+            if not installed(conn):
+                install(conn)
+            for path in args.files:
+                print(f"✅ Loaded {load_holidays(conn, path):,} holidays from {path}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Canonical form of generated SQL for statement and result reuse.
+
+The LLM writes the same query shape with different literals, casing and
+whitespace ("... WHERE notl > 5000000" vs "... where NOTL>10000000").
+canonicalize() tokenizes the SQL, normalizes keyword case, identifier case
+and spacing, and lifts literals into bound parameters, so every query of
+one shape runs the same statement text: SQLite's per-connection statement
+cache (cached_statements) then skips re-preparing it, and the result cache
+can key on (fingerprint, params).
+
+Literals are only lifted where a bound parameter means the same thing:
+WHERE, HAVING, JOIN ... ON, LIMIT and OFFSET. SELECT lists are kept
+verbatim because SQLite names unaliased result columns after their source
+text, and GROUP BY / ORDER BY keep their literals because "ORDER BY 2"
+is a column ordinal while "ORDER BY ?" is a constant.
+"""
+import hashlib
+from collections import namedtuple
+from functools import lru_cache
+
+from sql_shape import number, quote_identifier, quote_literal, tokenize
+
+# text: normalized SQL with ? placeholders; params: values in placeholder
+# order; fingerprint: stable id of the shape (same for any params)
+Canonical = namedtuple("Canonical", "text params fingerprint")
+
+KEYWORDS = {
+    "ALL", "AND", "AS", "ASC", "BETWEEN", "BY", "CASE", "CAST", "COLLATE", "CROSS", "CURRENT_DATE",
+    "CURRENT_TIME", "CURRENT_TIMESTAMP", "DESC", "DISTINCT", "ELSE", "END", "ESCAPE", "EXCEPT", "EXISTS",
+    "FALSE", "FROM", "FULL", "GLOB", "GROUP", "HAVING", "IN", "INNER", "INTERSECT", "IS", "ISNULL", "JOIN",
+    "LEFT", "LIKE", "LIMIT", "MATCH", "NATURAL", "NOT", "NOTNULL", "NULL", "NULLS", "OFFSET", "ON", "OR",
+    "ORDER", "OUTER", "OVER", "PARTITION", "RECURSIVE", "REGEXP", "RIGHT", "SELECT", "THEN", "TRUE",
+    "UNION", "USING", "VALUES", "WHEN", "WHERE", "WINDOW", "WITH", "FIRST", "LAST",
+}
+
+# Clause keyword -> clause name tracked per parenthesis depth
+_CLAUSES = {
+    "SELECT": "select", "FROM": "from", "JOIN": "from", "WHERE": "where", "GROUP": "group",
+    "HAVING": "having", "ORDER": "order", "LIMIT": "limit", "OFFSET": "offset", "ON": "on",
+    "WINDOW": "window", "UNION": "compound", "INTERSECT": "compound", "EXCEPT": "compound",
+    "WITH": "with", "VALUES": "values",
+}
+_LIFTED_CLAUSES = {"where", "having", "on", "limit", "offset"}
+
+_NO_SPACE_BEFORE = {")", ",", ".", ";"}
+_NO_SPACE_AFTER = {"(", "."}
+
+
+def _render(token) -> str:
+    if token.kind == "ident":
+        upper = token.value.upper()
+        return upper if upper in KEYWORDS else token.value.lower()
+    if token.kind == "quoted":
+        return quote_identifier(token.value)
+    if token.kind == "str":
+        return quote_literal(token.value)
+    return token.value
+
+
+def _tight(previous, token, text: str) -> bool:
+    """True when no space belongs between the previous token and this one"""
+    if token.kind == "op" and text in _NO_SPACE_BEFORE:
+        return True
+    if previous.kind == "op" and previous.value in _NO_SPACE_AFTER:
+        return True
+    # Function call: name(
+    return text == "(" and previous.kind == "ident" and previous.value.upper() not in KEYWORDS
+
+
+@lru_cache(maxsize=1024)
+def canonicalize(sql: str):
+    """
+    Canonical form of one SQL statement, or None when it cannot be
+    tokenized or already uses parameters (it then runs as written).
+    """
+    try:
+        tokens = tokenize(sql)
+    except ValueError:
+        return None
+    if not tokens or any(t.kind == "param" for t in tokens):
+        return None
+
+    pieces = []
+    params = []
+    clauses = [None]
+    previous = None
+    for token in tokens:
+        keyword = token.kind == "ident" and token.value.upper() in _CLAUSES
+        # Everything nested in a select list (subqueries, windows) is verbatim too
+        in_select_list = "select" in clauses[:-1] or (clauses[-1] == "select" and not keyword)
+        if keyword:
+            clauses[-1] = _CLAUSES[token.value.upper()]
+        clause = clauses[-1]
+
+        if in_select_list and previous is not None and previous[1]:
+            # Continue the verbatim select list, original spacing included
+            pieces.append(sql[previous[0].end:token.end])
+        else:
+            if in_select_list:
+                text = sql[token.start:token.end]
+            elif token.kind in ("num", "str") and clause in _LIFTED_CLAUSES:
+                params.append(number(token.value) if token.kind == "num" else token.value)
+                text = "?"
+            else:
+                text = _render(token)
+            if pieces and not _tight(previous[0], token, text):
+                pieces.append(" ")
+            pieces.append(text)
+
+        if token.kind == "op" and token.value == "(":
+            clauses.append(clause)
+        elif token.kind == "op" and token.value == ")" and len(clauses) > 1:
+            clauses.pop()
+        previous = (token, in_select_list)
+
+    text = "".join(pieces).rstrip(";").rstrip()
+    fingerprint = hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+    return Canonical(text, tuple(params), fingerprint)
+
+
+def stats() -> dict:
+    info = canonicalize.cache_info()
+    return {"size": info.currsize, "maxsize": info.maxsize, "hits": info.hits, "misses": info.misses}
@@ -0,0 +1,162 @@
+"""
+Plotly figure construction shared by the Streamlit apps and bench_charts.py.
+
+build_figure is a pure function of the DataFrame and the chart controls,
+so it can be timed and profiled without a Streamlit session.
+"""
+from tracing import traced
+
+CHART_TYPES = ["Bar Chart", "Line Chart", "Scatter Plot", "Pie Chart", "Box Plot", "Heatmap", "Histogram"]
+
+HUB_COLORWAY = ["#64ffda", "#1de9b6", "#00bcd4", "#26c6da", "#4dd0e1", "#80deea", "#b2ebf2", "#e0f7fa"]
+
+
+def apply_theme(fig, theme: str = "plain"):
+    """Final layout for the figure: "hub" is main2's dark palette, "plain" main3's"""
+    if theme == "hub":
+        # Customize the figure with dark theme
+        fig.update_layout(
+            height=500,
+            showlegend=True,
+            font=dict(size=12, color="#e0e6ed"),
+            title_font_size=16,
+            margin=dict(l=40, r=40, t=60, b=40),
+            paper_bgcolor="rgba(26, 26, 46, 0.8)",
+            plot_bgcolor="rgba(15, 15, 35, 0.8)",
+            colorway=HUB_COLORWAY
+        )
+
+        # Update axes colors
+        fig.update_xaxes(gridcolor="rgba(255, 255, 255, 0.1)", color="#e0e6ed")
+        fig.update_yaxes(gridcolor="rgba(255, 255, 255, 0.1)", color="#e0e6ed")
+    else:
+        fig.update_layout(
+            height=500,
+            showlegend=True,
+            font=dict(size=12),
+            title_font_size=16,
+            margin=dict(l=40, r=40, t=60, b=40)
+        )
+    return fig
+
+
+@traced("chart.build")
+def build_figure(df, chart_type: str, x_column=None, y_column=None, color_column=None, size_column=None,
+                 theme: str = "plain"):
+    """
+    Build the Plotly figure for the selected chart controls.
+    Returns None when the selection cannot be charted.
+    """
+    import plotly.express as px
+
+    fig = None
+
+    if chart_type == "Bar Chart" and x_column and y_column:
+        # Aggregate data if needed
+        if df[x_column].dtype == 'object':
+            agg_df = df.groupby(x_column)[y_column].sum().reset_index()
+            fig = px.bar(
+                agg_df,
+                x=x_column,
+                y=y_column,
+                title=f"{y_column} by {x_column}",
+                color=x_column if not color_column else color_column,
+                template="plotly_dark"
+            )
+        else:
+            fig = px.bar(
+                df,
+                x=x_column,
+                y=y_column,
+                color=color_column,
+                title=f"{y_column} by {x_column}",
+                template="plotly_dark"
+            )
+
+    elif chart_type == "Line Chart" and y_column:
+        if x_column:
+            fig = px.line(
+                df,
+                x=x_column,
+                y=y_column,
+                color=color_column,
+                title=f"{y_column} over {x_column}",
+                markers=True,
+                template="plotly_dark"
+            )
+        else:
+            fig = px.line(
+                df.reset_index(),
+                x='index',
+                y=y_column,
+                title=f"{y_column} Trend",
+                markers=True,
+                template="plotly_dark"
+            )
+
+    elif chart_type == "Scatter Plot" and x_column and y_column:
+        fig = px.scatter(
+            df,
+            x=x_column,
+            y=y_column,
+            color=color_column,
+            size=size_column,
+            title=f"{y_column} vs {x_column}",
+            template="plotly_dark"
+        )
+
+    elif chart_type == "Pie Chart" and x_column:
+        # Create pie chart from value counts
+        value_counts = df[x_column].value_counts()
+        fig = px.pie(
+            values=value_counts.values,
+            names=value_counts.index,
+            title=f"Distribution of {x_column}",
+            template="plotly_dark"
+        )
+
+    elif chart_type == "Box Plot" and y_column:
+        if x_column:
+            fig = px.box(
+                df,
+                x=x_column,
+                y=y_column,
+                color=color_column,
+                title=f"{y_column} Distribution by {x_column}",
+                template="plotly_dark"
+            )
+        else:
+            fig = px.box(
+                df,
+                y=y_column,
+                title=f"{y_column} Distribution",
+                template="plotly_dark"
+            )
+
+    elif chart_type == "Histogram" and y_column:
+        fig = px.histogram(
+            df,
+            x=y_column,
+            color=color_column,
+            title=f"Distribution of {y_column}",
+            nbins=30,
+            template="plotly_dark"
+        )
+
+    elif chart_type == "Heatmap":
+        numeric_cols = df.select_dtypes(include="number").columns.tolist()
+        if len(numeric_cols) >= 2:
+            # Create correlation heatmap
+            corr_matrix = df[numeric_cols].corr()
+            fig = px.imshow(
+                corr_matrix,
+                text_auto=True,
+                aspect="auto",
+                title="Correlation Heatmap",
+                template="plotly_dark",
+                color_continuous_scale="RdBu_r"
+            )
+
+    if fig is None:
+        return None
+    return apply_theme(fig, theme)
@@ -0,0 +1,432 @@
+"""
+In-memory columnar replica of trades joined to counterparties, with a small
+vectorized filter/group-by engine.
+
+For the dominant query shapes (filters on px_type/ccy_pair/dates, GROUP BY
+one or two dimensions, SUM/AVG/COUNT/MIN/MAX of notional or rate) SQLite's
+row-at-a-time execution is the bottleneck at tens of millions of rows. The
+replica keeps every column as a NumPy array: strings are dictionary-encoded,
+dates are epoch-day integers, read from the near_day/far_day columns when
+the database has them (calendars.py). execute_columnar() answers any query
+that sql_shape.parse_aggregate() recognizes and the engine supports, and
+returns None otherwise so SQLite runs it as usual.
+
+The replica is refreshed incrementally from trade_ids above the highest one
+loaded. A cheap consistency check (row count and notional total, read from
+the rollup tables when they are installed) triggers a full reload after
+deletes or updates.
+
+Enable it for the app with FX_COLUMNAR=1.
+"""
+import threading
+
+import numpy as np
+
+import aggregates
+from sql_shape import Agg, Dim, parse_aggregate
+
+# Columns held by the replica and how they are encoded
+STRING_COLUMNS = ("px_type", "ccy_pair", "cp_name", "region")
+DATE_COLUMNS = ("near_dt", "far_dt")
+# notl_usd only when the database has it (fx_rates.py)
+FLOAT_COLUMNS = ("notl", "rate", "notl_usd")
+INT_COLUMNS = ("trade_id", "cp_id")
+NUMERIC_MEASURES = FLOAT_COLUMNS
+
+# Generated day numbers of the date columns (calendars.py), loaded instead of
+# parsing the text when the database has them
+DAY_COLUMNS = ("near_day", "far_day")
+
+_LOAD_SQL = """
+    SELECT t.trade_id, t.cp_id, t.px_type, t.ccy_pair, {dates}, {floats},
+           c.cp_name, c.region, c.cp_id IS NOT NULL AS has_cp
+    FROM trades t LEFT JOIN counterparties c ON c.cp_id = t.cp_id
+    WHERE t.trade_id > ?
+    ORDER BY t.trade_id
+"""
+# odd_dates: text that is not a plain 'YYYY-MM-DD' date
+_DAY_SELECT = ("t.near_day, t.far_day, "
+               "t.near_dt IS NOT date(t.near_dt) OR t.far_dt IS NOT date(t.far_dt) AS odd_dates")
+_TEXT_SELECT = "t.near_dt, t.far_dt"
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+class _Unsupported(Exception):
+    """The query parses but uses something the vectorized engine does not do"""
+
+
+class ColumnarReplica:
+    """NumPy copy of trades ⨝ counterparties, appended to as trade_ids grow"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.columns = {}
+        self.dictionaries = {}
+        self.has_cp = np.zeros(0, dtype=bool)
+        self.valid_dates = True
+        self.day_columns = False
+        self.float_columns = FLOAT_COLUMNS
+        self.max_trade_id = None
+        self.cp_fingerprint = None
+        self.notl_total = 0.0
+        self.usd_total = 0.0
+        self.version = None
+
+    def __len__(self):
+        return len(self.has_cp)
+
+    # -- loading -------------------------------------------------------
+    def refresh(self, conn, version=None):
+        """
+        Bring the replica up to date with the database. When the caller
+        passes the database's data version, nothing is read unless it moved.
+        """
+        with self._lock:
+            if version is not None and version == self.version:
+                return
+            self.version = version
+            fingerprint = conn.execute(
+                "SELECT group_concat(cp_id || ':' || IFNULL(cp_name, '') || ':' || IFNULL(region, ''), '|') "
+                "FROM (SELECT * FROM counterparties ORDER BY cp_id)"
+            ).fetchone()[0]
+            present = {row[1] for row in conn.execute("PRAGMA table_xinfo(trades)")}
+            day_columns = set(DAY_COLUMNS) <= present
+            float_columns = tuple(name for name in FLOAT_COLUMNS if name in present)
+            if (fingerprint != self.cp_fingerprint or day_columns != self.day_columns
+                    or float_columns != self.float_columns):
+                self._reset()
+                self.cp_fingerprint = fingerprint
+                self.day_columns = day_columns
+                self.float_columns = float_columns
+
+            max_trade_id = conn.execute("SELECT max(trade_id) FROM trades").fetchone()[0]
+            if max_trade_id is not None and (self.max_trade_id is None or max_trade_id > self.max_trade_id):
+                self._append(conn)
+
+            count, notl_total, usd_total = aggregates.trade_totals(conn)
+            if count != len(self) or not np.allclose([notl_total, usd_total], [self.notl_total, self.usd_total],
+                                                     rtol=1e-9, atol=1e-6):
+                # Rows were deleted, updated in place or repriced, start over
+                self._reset()
+                self.cp_fingerprint = fingerprint
+                self._append(conn)
+
+    def _reset(self):
+        self.columns = {}
+        self.dictionaries = {}
+        self.has_cp = np.zeros(0, dtype=bool)
+        self.valid_dates = True
+        self.max_trade_id = None
+        self.notl_total = 0.0
+        self.usd_total = 0.0
+
+    def _append(self, conn):
+        import pandas as pd
+
+        since = self.max_trade_id if self.max_trade_id is not None else -(2 ** 63)
+        sql = _LOAD_SQL.format(dates=_DAY_SELECT if self.day_columns else _TEXT_SELECT,
+                               floats=", ".join(f"t.{name}" for name in self.float_columns))
+        df = pd.read_sql_query(sql, conn, params=(since,))
+        if df.empty:
+            return
+
+        new = {}
+        for name in STRING_COLUMNS:
+            new[name] = self._encode_strings(name, df[name])
+        if self.day_columns:
+            # Non-ISO dates: text comparison semantics would differ, so
+            # date predicates and buckets fall back to SQLite
+            if df["odd_dates"].any():
+                self.valid_dates = False
+            for name, day_name in zip(DATE_COLUMNS, DAY_COLUMNS):
+                days = pd.to_numeric(df[day_name], errors="coerce")
+                new[name] = new[day_name] = (days.fillna(0).to_numpy(dtype="int64"), days.notna().values)
+        else:
+            for name in DATE_COLUMNS:
+                raw = df[name]
+                parsed = pd.to_datetime(raw, format="%Y-%m-%d", errors="coerce")
+                if (parsed.isna() & raw.notna()).any():
+                    self.valid_dates = False
+                days = (parsed.values.astype("datetime64[D]") - _EPOCH).astype("int64")
+                new[name] = (days, parsed.notna().values)
+        for name in self.float_columns:
+            values = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+            new[name] = (values, ~np.isnan(values))
+        for name in INT_COLUMNS:
+            values = pd.to_numeric(df[name], errors="coerce")
+            new[name] = (values.fillna(0).to_numpy(dtype="int64"), values.notna().values)
+
+        for name, (values, valid) in new.items():
+            if name in self.columns:
+                old_values, old_valid = self.columns[name]
+                values = np.concatenate([old_values, values])
+                valid = np.concatenate([old_valid, valid])
+            self.columns[name] = (values, valid)
+        self.has_cp = np.concatenate([self.has_cp, df["has_cp"].to_numpy(dtype=bool)])
+        self.max_trade_id = int(df["trade_id"].max())
+        self.notl_total += float(np.nansum(new["notl"][0]))
+        if "notl_usd" in new:
+            self.usd_total += float(np.nansum(new["notl_usd"][0]))
+
+    def _encode_strings(self, name: str, series):
+        """Dictionary-encode a batch, extending the column's dictionary"""
+        import pandas as pd
+
+        dictionary = self.dictionaries.setdefault(name, {})
+        local_codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        mapping = np.array([dictionary.setdefault(u, len(dictionary)) for u in uniques] + [-1], dtype="int32")
+        codes = mapping[local_codes]
+        return codes, codes >= 0
+
+    def snapshot(self):
+        """Consistent view of the arrays for one query"""
+        with self._lock:
+            return dict(self.columns), {k: list(v) for k, v in self.dictionaries.items()}, self.has_cp, self.valid_dates
+
+
+def _days(literal) -> int:
+    """Epoch day of an ISO 'YYYY-MM-DD' literal; other forms are not comparable"""
+    if not isinstance(literal, str) or len(literal) != 10:
+        raise _Unsupported("date literal")
+    try:
+        return int((np.datetime64(literal, "D") - _EPOCH).astype("int64"))
+    except ValueError:
+        raise _Unsupported("date literal")
+
+
+def _bucket_literal(kind: str, literal) -> int:
+    """Month/year bucket literal ('YYYY-MM' / 'YYYY') as a bucket number"""
+    if not isinstance(literal, str):
+        raise _Unsupported("bucket literal")
+    try:
+        if kind == "month" and len(literal) == 7:
+            return int((np.datetime64(literal, "M") - np.datetime64("1970-01", "M")).astype("int64"))
+        if kind == "year" and len(literal) == 4:
+            return int(literal)
+    except ValueError:
+        pass
+    raise _Unsupported("bucket literal")
+
+
+class _Evaluator:
+    """Vectorized evaluation of one parsed query against a replica snapshot"""
+
+    def __init__(self, replica: ColumnarReplica, query):
+        self.columns, self.dictionaries, self.has_cp, self.valid_dates = replica.snapshot()
+        self.query = query
+        self.n = len(self.has_cp)
+
+    def dim_values(self, dim: Dim):
+        """(integer keys, valid mask, decoder) for a grouping expression"""
+        name = dim.column.name
+        if name not in self.columns:
+            raise _Unsupported(f"column {name}")
+        values, valid = self.columns[name]
+        if dim.kind == "col":
+            if name in DATE_COLUMNS:
+                if not self.valid_dates:
+                    raise _Unsupported("dates")
+                return values, valid, lambda v: str(_EPOCH + np.timedelta64(int(v), "D"))
+            if name in STRING_COLUMNS:
+                dictionary = self.dictionaries[name]
+                return values, valid, lambda v: dictionary[int(v)]
+            if name in FLOAT_COLUMNS:
+                return values, valid, float
+            return values, valid, int
+
+        if name not in DATE_COLUMNS or not self.valid_dates:
+            raise _Unsupported("date bucket")
+        months = (_EPOCH + values.astype("timedelta64[D]")).astype("datetime64[M]").astype("int64")
+        if dim.kind == "month":
+            return months, valid, lambda v: str(np.datetime64(int(v), "M"))
+        return months // 12 + 1970, valid, lambda v: f"{int(v):04d}"
+
+    def predicate_mask(self, pred):
+        dim = pred.target
+        values, valid = self.dim_values(dim)[:2]
+        name = dim.column.name
+
+        if dim.kind == "col" and name in STRING_COLUMNS:
+            dictionary = self.dictionaries[name]
+            if any(not isinstance(v, str) for v in pred.values):
+                raise _Unsupported("non-text literal on text column")
+            if pred.op in ("=", "IN", "!=", "NOT IN"):
+                wanted = [dictionary.index(v) for v in pred.values if v in dictionary]
+                hit = np.isin(values, wanted)
+                return valid & (hit if pred.op in ("=", "IN") else ~hit)
+            # Range comparison on text: evaluate once per dictionary entry
+            entries = np.array(dictionary, dtype=object)
+            per_entry = _compare(entries, pred.op, pred.values[0]).astype(bool)
+            return valid & per_entry[np.where(valid, values, 0)] if len(entries) else np.zeros(self.n, bool)
+
+        if dim.kind == "col" and name in DATE_COLUMNS:
+            literals = [_days(v) for v in pred.values]
+        elif dim.kind != "col":
+            literals = [_bucket_literal(dim.kind, v) for v in pred.values]
+        else:
+            if any(isinstance(v, str) for v in pred.values):
+                raise _Unsupported("text literal on numeric column")
+            literals = list(pred.values)
+
+        if pred.op in ("IN", "NOT IN"):
+            hit = np.isin(values, literals)
+            return valid & (hit if pred.op == "IN" else ~hit)
+        return valid & _compare(values, pred.op, literals[0])
+
+    def run(self):
+        import pandas as pd
+
+        query = self.query
+        for column in {c for c in _referenced_columns(query)}:
+            if column.table == "counterparties" and not query.join:
+                raise _Unsupported("counterparty column without join")
+
+        mask = np.ones(self.n, dtype=bool)
+        if query.join:
+            mask &= self.has_cp
+        for pred in query.predicates:
+            mask &= self.predicate_mask(pred)
+        rows = np.nonzero(mask)[0]
+
+        # Group ids: dense per-dimension codes (0 is NULL) combined into one key
+        labels = []
+        if query.group_by:
+            codes, sizes = [], []
+            for dim in query.group_by:
+                values, valid, decode = self.dim_values(dim)
+                v, ok = values[rows], valid[rows]
+                uniques, inverse = np.unique(v[ok], return_inverse=True)
+                code = np.zeros(len(rows), dtype=np.int64)
+                code[ok] = inverse.reshape(-1) + 1
+                codes.append(code)
+                sizes.append(len(uniques) + 1)
+                labels.append([None] + [decode(u) for u in uniques])
+            try:
+                combined = np.ravel_multi_index(codes, sizes) if len(codes) > 1 else codes[0]
+            except ValueError:
+                raise _Unsupported("too many groups")
+            group_keys, group = np.unique(combined, return_inverse=True)
+            group = group.reshape(-1)
+            group_codes = np.unravel_index(group_keys, sizes) if len(codes) > 1 else (group_keys,)
+            n_groups = len(group_keys)
+        else:
+            group = np.zeros(len(rows), dtype=np.int64)
+            group_codes = ()
+            n_groups = 1
+
+        def dimension(dim: Dim) -> list:
+            position = query.group_by.index(dim)
+            return [labels[position][c] for c in group_codes[position]]
+
+        def aggregate(agg: Agg):
+            if agg.distinct:
+                raise _Unsupported("DISTINCT aggregate")
+            if agg.column is None:
+                return np.bincount(group, minlength=n_groups).astype("int64")
+            name = agg.column.name
+            if name not in self.columns:
+                raise _Unsupported(f"column {name}")
+            values, valid = self.columns[name]
+            present = valid[rows]
+            counts = np.bincount(group, weights=present, minlength=n_groups).astype("int64")
+            if agg.func == "COUNT":
+                return counts
+            if name not in NUMERIC_MEASURES:
+                raise _Unsupported(f"{agg.func}({name})")
+            v = np.where(present, values[rows], 0.0)
+            if agg.func == "TOTAL":
+                return np.bincount(group, weights=v, minlength=n_groups).astype("float64")
+            if agg.func in ("SUM", "AVG"):
+                sums = np.bincount(group, weights=v, minlength=n_groups)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    out = sums if agg.func == "SUM" else sums / counts
+                return np.where(counts > 0, out, np.nan)
+            fill = np.inf if agg.func == "MIN" else -np.inf
+            out = np.full(n_groups, fill)
+            (np.minimum if agg.func == "MIN" else np.maximum).at(out, group[present], values[rows][present])
+            return np.where(counts > 0, out, np.nan)
+
+        data = {}
+        for index, item in enumerate(query.items):
+            data[index] = aggregate(item.expr) if isinstance(item.expr, Agg) else dimension(item.expr)
+
+        # ORDER BY keys not in the select list become hidden columns
+        hidden = {}
+        for key in query.order_by:
+            if key.item is None:
+                hidden[key] = aggregate(key.expr) if isinstance(key.expr, Agg) else dimension(key.expr)
+
+        order = np.arange(n_groups)
+        sort_keys = [(data[key.item] if key.item is not None else hidden[key], key.desc) for key in query.order_by]
+        if not sort_keys and query.group_by:
+            # SQLite emits groups in key order when it sorts to group
+            sort_keys = [(data[i], False) for i, item in enumerate(query.items) if isinstance(item.expr, Dim)]
+        if sort_keys and n_groups:
+            lex = []
+            for values, desc in reversed(sort_keys):
+                codes, _ = pd.factorize(pd.Series(values), sort=True, use_na_sentinel=True)
+                lex.append(-codes if desc else codes)
+            order = np.lexsort(lex)
+
+        if query.offset:
+            order = order[query.offset:]
+        if query.limit is not None and query.limit >= 0:
+            order = order[:query.limit]
+
+        frame = {}
+        for index, item in enumerate(query.items):
+            column = data[index]
+            frame[item.name] = [column[i] for i in order] if isinstance(column, list) else column[order]
+        return pd.DataFrame(frame, columns=[item.name for item in query.items])
+
+
+def _compare(values, op: str, literal):
+    if op == "=":
+        return values == literal
+    if op == "!=":
+        return values != literal
+    if op == "<":
+        return values < literal
+    if op == "<=":
+        return values <= literal
+    if op == ">":
+        return values > literal
+    return values >= literal
+
+
+def _referenced_columns(query):
+    for item in query.items:
+        if item.expr.column is not None:
+            yield item.expr.column
+    for pred in query.predicates:
+        yield pred.target.column
+    for dim in query.group_by:
+        yield dim.column
+
+
+_replicas = {}
+_replicas_lock = threading.Lock()
+
+
+def get_replica(path: str) -> ColumnarReplica:
+    """Process-wide replica for a database file"""
+    with _replicas_lock:
+        if path not in _replicas:
+            _replicas[path] = ColumnarReplica()
+        return _replicas[path]
+
+
+def execute_columnar(query: str, conn):
+    """engine executor hook: answer the query from the replica if supported"""
+    import engine
+
+    parsed = parse_aggregate(query)
+    if parsed is None:
+        return None
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    replica = get_replica(path)
+    replica.refresh(conn, engine.data_version())
+    try:
+        return _Evaluator(replica, parsed).run()
+    except _Unsupported:
+        return None
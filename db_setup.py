@@ -1,41 +1,40 @@
 # fx_db_setup.py
+"""
+Creates fx_trades.db with the sample data, or a synthetic database of any
+size for benchmarks:
 
+    python db_setup.py
+    python db_setup.py --db bench.db --trades 1000000
+
+Existing data is kept: tables are only created when missing, sample rows
+that are already there are skipped and synthetic trades are appended.
+--reset deletes the database first. Daily USD fixings covering the trade
+dates are generated along with the trades, which are stored with their
+USD notional (fx_rates.py). The day-number columns, dim_date and holiday
+calendars (calendars.py) are installed after loading. The
+database is left in WAL mode, so the writer process (writer.py) can load
+trades while queries run.
+"""
+import argparse
+import os
 import sqlite3
 
-# Connect or create new DB
-conn = sqlite3.connect('fx_trades.db')
-cursor = conn.cursor()
-
-# Drop existing tables (if rerunning script)
-cursor.execute('DROP TABLE IF EXISTS trades')
-cursor.execute('DROP TABLE IF EXISTS counterparties')
-
-# Create counterparties table
-cursor.execute('''
-CREATE TABLE counterparties (
-    cp_id INTEGER PRIMARY KEY,
-    cp_name TEXT,
-    region TEXT
-)
-''')
-
-# Create trades table
-cursor.execute('''
-CREATE TABLE trades (
-    trade_id INTEGER PRIMARY KEY,
-    cp_id INTEGER,
-    px_type TEXT,      -- Product type: spot, fwd, swap, ndf
-    notl REAL,         -- Notional amount
-    ccy_pair TEXT,     -- Currency pair
-    near_dt TEXT,      -- Near date
-    far_dt TEXT,       -- Far date (used only for swaps)
-    rate REAL,         -- Executed FX rate
-    FOREIGN KEY (cp_id) REFERENCES counterparties(cp_id)
-)
-''')
-
-# Insert sample counterparties
-counterparties = [
+import aggregates
+import calendars
+import fx_rates
+import writer
+
+PX_TYPES = ["spot", "fwd", "swap", "ndf"]
+REGIONS = ["AMER", "EMEA", "APAC", "LATAM"]
+
+# Currency pairs used by the synthetic generator, with a typical rate
+CCY_PAIRS = {
+    "EUR/USD": 1.10, "USD/JPY": 149.3, "GBP/USD": 1.28, "USD/INR": 83.45, "USD/CHF": 0.89,
+    "USD/CAD": 1.33, "EUR/GBP": 0.86, "AUD/USD": 0.66, "USD/SGD": 1.35, "USD/KRW": 1342.2,
+    "USD/MXN": 16.8, "USD/BRL": 5.24, "EUR/JPY": 163.9, "USD/CNH": 7.28, "NZD/USD": 0.61,
+}
+
+COUNTERPARTIES = [
     (1, 'Goldman Sachs', 'AMER'),
     (2, 'HSBC', 'EMEA'),
     (3, 'Nomura', 'APAC'),
@@ -44,10 +43,8 @@ counterparties = [
     (6, 'Barclays', 'EMEA'),
     (7, 'Standard Chartered', 'APAC')
 ]
-cursor.executemany('INSERT INTO counterparties VALUES (?, ?, ?)', counterparties)
 
-# Insert sample FX trades
-trades = [
+SAMPLE_TRADES = [
     (101, 1, 'spot', 5_000_000, 'EUR/USD', '2025-08-28', None, 1.1012),
     (102, 2, 'fwd', 12_000_000, 'USD/JPY', '2025-09-10', None, 149.34),
     (103, 3, 'swap', 15_000_000, 'GBP/USD', '2025-09-01', '2026-03-01', 1.2801),
@@ -61,8 +58,221 @@ trades = [
     (111, 6, 'swap', 11_000_000, 'USD/MXN', '2025-09-05', '2026-05-05', 16.82),
     (112, 5, 'fwd', 7_000_000, 'USD/BRL', '2025-09-12', None, 5.24)
 ]
-cursor.executemany('INSERT INTO trades VALUES (?, ?, ?, ?, ?, ?, ?, ?)', trades)
 
-conn.commit()
-conn.close()
-print("✅ FX database created and filled with dummy data (fx_trades.db)")
+GENERATE_BATCH = 500_000
+GENERATE_START = "2023-01-01"
+GENERATE_DAYS = 3 * 365
+
+# Fixings generated for the sample trades
+SAMPLE_FIXINGS_START = "2025-08-01"
+SAMPLE_FIXINGS_DAYS = 92
+
+_INSERT_TRADES = """
+{insert} INTO trades (trade_id, cp_id, px_type, notl, ccy_pair, near_dt, far_dt, rate, notl_usd)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+
+def remove_database(path: str):
+    """Delete a database file together with its WAL and shared-memory files"""
+    for name in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def create_schema(conn, reset: bool = False):
+    """Create the counterparties and trades tables, dropping them first on reset"""
+    cursor = conn.cursor()
+
+    if reset:
+        cursor.execute('DROP TABLE IF EXISTS trades')
+        cursor.execute('DROP TABLE IF EXISTS counterparties')
+
+    # Create counterparties table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS counterparties (
+        cp_id INTEGER PRIMARY KEY,
+        cp_name TEXT,
+        region TEXT
+    )
+    ''')
+
+    # Create trades table
+    day_columns = ",\n        ".join(calendars.day_columns_ddl())
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS trades (
+        trade_id INTEGER PRIMARY KEY,
+        cp_id INTEGER,
+        px_type TEXT,      -- Product type: spot, fwd, swap, ndf
+        notl REAL,         -- Notional amount
+        ccy_pair TEXT,     -- Currency pair
+        near_dt TEXT,      -- Near date
+        far_dt TEXT,       -- Far date (used only for swaps)
+        rate REAL,         -- Executed FX rate
+        notl_usd REAL,     -- Notional in USD at the near date's fixing (fx_rates.py)
+        -- Day numbers of near_dt/far_dt (days since 1970-01-01, see calendars.py)
+        {day_columns},
+        FOREIGN KEY (cp_id) REFERENCES counterparties(cp_id)
+    )
+    ''')
+
+
+def populate_sample(conn):
+    """Insert the sample counterparties, fixings and FX trades that are not there yet"""
+    conn.executemany('INSERT OR IGNORE INTO counterparties VALUES (?, ?, ?)', COUNTERPARTIES)
+    converter = insert_fixings(conn, generate_fixings(SAMPLE_FIXINGS_START, SAMPLE_FIXINGS_DAYS))
+    conn.executemany(_INSERT_TRADES.format(insert="INSERT OR IGNORE"), priced(SAMPLE_TRADES, converter))
+
+
+def generate_fixings(start_date: str, days: int, seed: int = 0) -> list:
+    """
+    (ccy, day, usd_rate) business-day fixings of every currency quoted
+    against USD in CCY_PAIRS: a random walk around its typical rate. They
+    start a week early so trades on the first days have a fixing.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    start = calendars.day_number(start_date) - 7
+    weekdays = [day for day in range(start, start + days + 7) if calendars.from_day(day).weekday() < 5]
+    rows = []
+    for pair, typical in CCY_PAIRS.items():
+        base, quote = pair.split("/")
+        if "USD" not in (base, quote):
+            continue
+        walk = typical * np.exp(np.cumsum(rng.normal(0.0, 0.005, len(weekdays))))
+        usd_rates = walk if quote == "USD" else 1.0 / walk
+        ccy = base if quote == "USD" else quote
+        rows += [(ccy, day, float(rate)) for day, rate in zip(weekdays, usd_rates)]
+    return rows
+
+
+def insert_fixings(conn, fixings: list) -> "fx_rates.Converter":
+    """Add fixings that are not there yet; returns a converter over every fixing"""
+    conn.executemany(f"INSERT OR IGNORE INTO {fx_rates.RATES_TABLE} (ccy, day, usd_rate) VALUES (?, ?, ?)", fixings)
+    return fx_rates.Converter.load(conn)
+
+
+def priced(trades: list, converter: "fx_rates.Converter") -> list:
+    """Trade rows with their notl_usd appended"""
+    return [trade + (usd,) for trade, usd in zip(trades, converter.convert_trades(trades))]
+
+
+def generate_counterparties(n: int) -> list:
+    """The sample counterparties followed by numbered ones spread over the regions"""
+    rows = list(COUNTERPARTIES[:n])
+    for cp_id in range(len(rows) + 1, n + 1):
+        rows.append((cp_id, f"Counterparty {cp_id}", REGIONS[cp_id % len(REGIONS)]))
+    return rows
+
+
+def generate_trades(n: int, n_counterparties: int, start_id: int = 1, seed: int = 0,
+                    start_date: str = GENERATE_START, days: int = GENERATE_DAYS, batch_size: int = GENERATE_BATCH):
+    """
+    Yield lists of synthetic trade rows (batch_size at a time). Product
+    types, pairs and counterparties are uniform; notionals are log-normal
+    around 5M; swaps get a far date 1-12 months after the near date.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    pairs = np.array(list(CCY_PAIRS))
+    base_rates = np.array(list(CCY_PAIRS.values()))
+    px_types = np.array(PX_TYPES)
+    start = np.datetime64(start_date)
+
+    for offset in range(0, n, batch_size):
+        size = min(batch_size, n - offset)
+        pair_idx = rng.integers(0, len(pairs), size)
+        px = px_types[rng.integers(0, len(px_types), size)]
+        near = start + rng.integers(0, days, size).astype("timedelta64[D]")
+        far = near + rng.integers(30, 366, size).astype("timedelta64[D]")
+        far_dt = np.where(px == "swap", far.astype(str), None)
+        notl = np.round(rng.lognormal(np.log(5_000_000), 0.8, size), -3)
+        rate = np.round(base_rates[pair_idx] * rng.normal(1.0, 0.02, size), 4)
+        yield list(zip(
+            range(start_id + offset, start_id + offset + size),
+            rng.integers(1, n_counterparties + 1, size).tolist(),
+            px.tolist(),
+            notl.tolist(),
+            pairs[pair_idx].tolist(),
+            near.astype(str).tolist(),
+            far_dt.tolist(),
+            rate.tolist(),
+        ))
+
+
+def build_database(path: str, trades: int = None, counterparties: int = 200, seed: int = 0, rollups: bool = True,
+                   reset: bool = False):
+    """
+    Create or extend the database at path: the sample data when trades is
+    None, otherwise that many synthetic trades after the existing ones.
+    reset deletes the database first. Rollups are built after loading.
+    """
+    if reset:
+        remove_database(path)
+    conn = sqlite3.connect(path)
+    create_schema(conn)
+    # fx_rates, and notl_usd on databases created before it
+    fx_rates.install(conn)
+    if trades is None:
+        populate_sample(conn)
+    elif conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0] == 0:
+        # Summary tables left over from an earlier build would no longer match
+        aggregates.drop(conn)
+        # Bulk load without a rollback journal, rollups are built afterwards
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executemany('INSERT OR IGNORE INTO counterparties VALUES (?, ?, ?)',
+                         generate_counterparties(counterparties))
+        converter = insert_fixings(conn, generate_fixings(GENERATE_START, GENERATE_DAYS, seed))
+        for batch in generate_trades(trades, counterparties, seed=seed):
+            conn.executemany(_INSERT_TRADES.format(insert="INSERT"), priced(batch, converter))
+        conn.commit()
+        writer.enable_wal(conn)
+    else:
+        # Existing trades are journaled as usual; installed rollups follow via their triggers
+        start_id = conn.execute("SELECT MAX(trade_id) FROM trades").fetchone()[0] + 1
+        conn.executemany('INSERT OR IGNORE INTO counterparties VALUES (?, ?, ?)',
+                         generate_counterparties(counterparties))
+        converter = insert_fixings(conn, generate_fixings(GENERATE_START, GENERATE_DAYS, seed))
+        for batch in generate_trades(trades, counterparties, start_id=start_id, seed=seed):
+            conn.executemany(_INSERT_TRADES.format(insert="INSERT"), priced(batch, converter))
+        conn.commit()
+
+    # Trades loaded before notl_usd existed, e.g. the sample rows of an older database
+    if conn.execute(f"SELECT 1 FROM trades WHERE {fx_rates.USD_COLUMN} IS NULL LIMIT 1").fetchone():
+        for sql, params in fx_rates.reprice_statements(conn):
+            conn.execute(sql, params or ())
+
+    # Day-number indexes, dim_date and holiday calendars
+    calendars.install(conn)
+
+    # Materialized rollups (px_type, ccy_pair, region, month) and their triggers
+    if rollups and not aggregates.installed(conn):
+        aggregates.install(conn)
+
+    conn.commit()
+    writer.enable_wal(conn)
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create the FX trades database")
+    parser.add_argument("--db", default="fx_trades.db")
+    parser.add_argument("--trades", type=int, default=None, help="synthetic trade count (default: sample data)")
+    parser.add_argument("--counterparties", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-rollups", action="store_true")
+    parser.add_argument("--reset", action="store_true", help="delete the existing database first")
+    args = parser.parse_args()
+
+    build_database(args.db, args.trades, args.counterparties, args.seed, rollups=not args.no_rollups,
+                   reset=args.reset)
+    if args.trades is None:
+        print(f"✅ FX database ready with dummy data ({args.db})")
+    else:
+        print(f"✅ Added {args.trades:,} synthetic trades to {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,729 @@
+"""
+Headless NL -> SQL -> DataFrame pipeline shared by the Streamlit apps.
+
+Only the standard library is imported at module load; requests and pandas
+are pulled in on first use so batch jobs, services and tests can import
+this module without paying for the UI stack.
+"""
+import os
+import json
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+
+from tracing import span, traced
+
+# Llama 3 REST API endpoints configuration
+llama_3_70b_endpoint = os.environ.get(
+    "LLAMA_3_ENDPOINT",
+    "https://8i7715nbk7-vpce-0e881c3ec15437336.execute-api.eu-west-1.amazonaws.com/qwen3-30b-a3b"
+)
+llama_3_key = os.environ.get("LLAMA_3_KEY", "1AROkExTzj6uweMBgylwoaozPLWpQYxS61yvWqrj")
+LLM_MODEL = "Qwen/Qwen3-30B-A3B"
+
+DB_PATH = os.environ.get("FX_DB_PATH", "fx_trades.db")
+POOL_SIZE = int(os.environ.get("FX_POOL_SIZE", "8"))
+SQL_CACHE_SIZE = int(os.environ.get("FX_SQL_CACHE_SIZE", "512"))
+RESULT_CACHE_SIZE = int(os.environ.get("FX_RESULT_CACHE_SIZE", "128"))
+# Prepared statements kept per pooled connection; canonicalized SQL makes
+# one entry serve every literal variant of a query shape
+STATEMENT_CACHE_SIZE = int(os.environ.get("FX_STATEMENT_CACHE_SIZE", "256"))
+FASTPATH_ENABLED = os.environ.get("FX_FASTPATH", "1") == "1"
+FETCH_CHUNK_SIZE = 5_000
+# Rows a query may return before its result is cut (df.attrs["truncated"]);
+# callers can ask for more explicitly
+MAX_RESULT_ROWS = int(os.environ.get("FX_MAX_ROWS", "10000"))
+# Memory budget for one materialized result
+MAX_RESULT_BYTES = int(float(os.environ.get("FX_MAX_RESULT_MB", "256")) * 2**20)
+
+# Generated SQL must be a single statement starting with one of these
+READ_ONLY_STATEMENTS = {"SELECT", "WITH"}
+FORBIDDEN_KEYWORDS = {
+    "ALTER", "ATTACH", "CREATE", "DELETE", "DETACH", "DROP", "INSERT", "PRAGMA", "REINDEX", "REPLACE",
+    "UPDATE", "VACUUM",
+}
+
+SCHEMA_CONTEXT = """
+You are working with the following FX trading database:
+
+Table: trades
+ - trade_id (INTEGER)
+ - cp_id (INTEGER): links to counterparties.cp_id
+ - px_type (TEXT): FX product type - can be 'spot', 'fwd', 'swap', 'ndf'
+ - notl (REAL): Notional value
+ - ccy_pair (TEXT): Currency pair
+ - near_dt (TEXT): Near leg date (used in all products)
+ - far_dt (TEXT): Far leg date (used only in 'swap' trades)
+ - rate (REAL): Executed FX rate
+
+Table: counterparties
+ - cp_id (INTEGER)
+ - cp_name (TEXT): Name of the counterparty
+ - region (TEXT): Region of the counterparty
+"""
+
+# Appended to SCHEMA_CONTEXT when the database has the date dimension (calendars.py)
+DATE_CONTEXT = """
+Indexed day numbers on trades:
+ - near_day (INTEGER), far_day (INTEGER): near_dt / far_dt as day numbers, the join key of dim_date
+
+Table: dim_date (one row per calendar day)
+ - day (INTEGER): joins trades.near_day or trades.far_day
+ - date (TEXT): 'YYYY-MM-DD'
+ - year (INTEGER), quarter (TEXT): 'YYYY-Qn', month (TEXT): 'YYYY-MM', week (TEXT): ISO week 'YYYY-Www'
+ - weekday (INTEGER): 0 = Monday .. 6 = Sunday, weekday_name (TEXT): 'Mon' .. 'Sun'
+ - is_weekend, is_business_day (USD calendar), is_month_end (last business day of the month): 0 or 1
+
+Table: fx_holidays (settlement holidays per currency)
+ - ccy (TEXT): e.g. 'USD', 'EUR', 'GBP', 'JPY'
+ - day (INTEGER): joins dim_date.day and trades.near_day
+ - name (TEXT)
+
+Date guidance:
+ - Bucket by month or year with strftime('%Y-%m', near_dt) / strftime('%Y', near_dt) and no join: those
+   totals are served from precomputed summaries.
+ - Join dim_date d ON d.day = t.near_day only for what it adds: GROUP BY d.quarter / d.week / d.weekday_name,
+   or filters on is_business_day / is_month_end.
+ - Filter date ranges on near_dt (e.g. near_dt BETWEEN '2025-08-01' AND '2025-08-31'); when dim_date is
+   joined anyway, filter on d.date instead, which is indexed.
+ - A trade settles on a holiday of its pair when fx_holidays has (ccy, near_day) for substr(ccy_pair, 1, 3)
+   or substr(ccy_pair, 5, 3).
+"""
+
+# Appended to SCHEMA_CONTEXT when trades has USD notionals (fx_rates.py)
+USD_CONTEXT = """
+USD notionals:
+ - trades.notl_usd (REAL): notl converted to USD at the fixing of near_dt (NULL when no fixing is known)
+ - to_usd(notl, ccy_pair, date) (SQL function): notl converted to USD at the fixing of another date
+
+Table: fx_rates (daily fixings)
+ - ccy (TEXT), day (INTEGER): joins dim_date.day, usd_rate (REAL): USD per unit of ccy
+
+Currency guidance:
+ - notl is in the base currency of ccy_pair (the first three letters), so never SUM(notl) across pairs;
+   totals, averages and rankings of notional over several pairs use notl_usd.
+ - Use SUM(notl) only when the query is restricted to one ccy_pair or one base currency.
+"""
+
+
+class LRUCache:
+    """Small thread-safe LRU map with hit/miss counters"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+class ConnectionPool:
+    """Fixed-size pool of read-only SQLite connections shared across threads"""
+
+    def __init__(self, path: str, size: int, pragmas: dict = None):
+        self.path = path
+        self.size = size
+        # Applied to every new connection, e.g. {"cache_size": -262144, "mmap_size": 2**30}
+        self.pragmas = pragmas or {}
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        import fx_rates
+
+        # to_usd() for queries converting at another date than near_dt
+        fx_rates.register(conn, self.path)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._created < self.size
+                if grow:
+                    self._created += 1
+            if grow:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    @contextmanager
+    def snapshot(self):
+        """
+        A pooled connection inside a read transaction: every statement run
+        on it sees the database as of the first one, whatever the writer
+        commits meanwhile (WAL mode keeps both going)
+        """
+        with self.connection() as conn:
+            conn.execute("BEGIN")
+            conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+            yield conn
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+
+pool = ConnectionPool(DB_PATH, POOL_SIZE)
+sql_cache = LRUCache(SQL_CACHE_SIZE)
+result_cache = LRUCache(RESULT_CACHE_SIZE)
+
+_version_lock = threading.Lock()
+_version_conn = None
+_last_data_version = None
+
+
+def _version_connection():
+    """The connection reading DB_PATH's version counters; call with _version_lock held"""
+    global _version_conn
+    if _version_conn is None:
+        _version_conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, check_same_thread=False)
+    return _version_conn
+
+
+def data_version():
+    """
+    Returns SQLite's data_version for DB_PATH. The value changes whenever
+    another connection commits, which is what invalidates the result cache.
+    """
+    global _last_data_version
+    with _version_lock:
+        version = _version_connection().execute("PRAGMA data_version").fetchone()[0]
+        if _last_data_version is not None and version != _last_data_version:
+            result_cache.clear()
+        _last_data_version = version
+        return version
+
+
+def schema_version():
+    """
+    Returns SQLite's schema_version for DB_PATH. The value changes with
+    every schema change (e.g. trades.notl_usd being added), so it is part
+    of the NL -> SQL cache key.
+    """
+    with _version_lock:
+        return _version_connection().execute("PRAGMA schema_version").fetchone()[0]
+
+
+def set_database(path: str, pool_size: int = None, pragmas: dict = None):
+    """Point the engine at another database file (benchmarks, batch runs)"""
+    global DB_PATH, pool, _version_conn, _last_data_version
+    with _version_lock:
+        DB_PATH = path
+        pool.close()
+        pool = ConnectionPool(path, pool_size or POOL_SIZE, pragmas)
+        if _version_conn is not None:
+            _version_conn.close()
+        _version_conn = None
+        _last_data_version = None
+    result_cache.clear()
+
+
+def _summary_executor(query: str, conn):
+    import aggregates
+
+    return aggregates.execute_from_summary(query, conn)
+
+
+def _columnar_executor(query: str, conn):
+    import columnar
+
+    return columnar.execute_columnar(query, conn)
+
+
+def _parallel_executor(query: str, conn):
+    import parallel
+
+    return parallel.execute_parallel(query, conn)
+
+
+def _sharded_executor(query: str, conn):
+    import sharding
+
+    return sharding.execute_sharded(query, conn)
+
+
+# Alternative executors tried in order before SQLite runs the query as
+# written. Each takes (query, conn) and returns a DataFrame, or None to
+# decline.
+executors = [_summary_executor]
+if os.environ.get("FX_COLUMNAR") == "1":
+    executors.append(_columnar_executor)
+# Large aggregates the replica did not answer run as rowid ranges in parallel
+if os.environ.get("FX_PARALLEL", "1") == "1":
+    executors.append(_parallel_executor)
+# DB_PATH is a shard catalog (sharding.py); it answers every query
+if os.environ.get("FX_SHARDED") == "1":
+    executors.insert(0, _sharded_executor)
+
+
+@traced("sql.route")
+def route_query(query: str, conn):
+    """Give each registered executor a chance to answer the query"""
+    for executor in executors:
+        df = executor(query, conn)
+        if df is not None:
+            return df
+    return None
+
+
+@traced("nl2sql.fastpath")
+def _fastpath_sql(user_question: str):
+    import fastpath
+
+    try:
+        return fastpath.try_generate(user_question)
+    except sqlite3.Error:
+        return None
+
+
+def clear_caches():
+    """Drop cached SQL translations and query results"""
+    sql_cache.clear()
+    result_cache.clear()
+    _schema_contexts.clear()
+
+
+_schema_contexts = {}
+
+
+def schema_context() -> str:
+    """
+    SCHEMA_CONTEXT, with DATE_CONTEXT when DB_PATH has the date dimension
+    installed and USD_CONTEXT when it has USD notionals
+    """
+    path = DB_PATH
+    context = _schema_contexts.get(path)
+    if context is None:
+        import calendars
+        import fx_rates
+
+        try:
+            with pool.connection() as conn:
+                dated = calendars.installed(conn)
+                priced = fx_rates.installed(conn)
+        except sqlite3.Error:
+            dated = priced = False
+        context = _schema_contexts[path] = (SCHEMA_CONTEXT + (DATE_CONTEXT if dated else "")
+                                            + (USD_CONTEXT if priced else ""))
+    return context
+
+
+def normalize_question(user_question: str) -> str:
+    """Cache key for a question: case and whitespace insensitive"""
+    return " ".join(user_question.lower().split())
+
+
+@lru_cache(maxsize=None)
+def get_http_session():
+    """Build the pooled HTTP session for the LLM endpoint once per process"""
+    import requests
+
+    session = requests.Session()
+    session.headers.update({
+        "Content-Type": "application/json",
+        "x-api-key": llama_3_key
+    })
+    return session
+
+
+@traced("nl2sql.create_prompt")
+def create_prompt(user_question: str) -> str:
+    return f'''
+You are an expert SQL assistant. Your task is to convert natural language questions into accurate SQL queries using the schema below.
+
+### SCHEMA CONTEXT:
+{schema_context()}
+
+### RESPONSE FORMAT:
+Respond strictly in the following JSON format:
+{{
+  "sql": "SQL query here (or empty string if clarification is needed)",
+  "clarification": "Ask for clarification if needed, otherwise leave empty",
+  "explanation": "Brief explanation of the query or why clarification is needed"
+}}
+
+### GUIDELINES:
+- If the question is clear and answerable using the schema, generate the SQL query directly.
+- If the question is ambiguous or missing key details, ask for clarification.
+- Do not include any internal reasoning or commentary.
+- Do not explain your thought process — only return the structured JSON.
+- Prefer generating a reasonable SQL query over asking for clarification unless absolutely necessary.
+
+### EXAMPLES:
+
+Q: "Show total notional by product type."
+A:
+{{
+  "sql": "SELECT px_type, SUM(notl) AS total_notional FROM trades GROUP BY px_type;",
+  "clarification": "",
+  "explanation": "Aggregates total notional amount grouped by FX product type."
+}}
+
+Q: "Show me all the trades."
+A:
+{{
+  "sql": "SELECT * FROM trades;",
+  "clarification": "",
+  "explanation": "Returns all columns from the trades table."
+}}
+
+Q: "List trades with high notional."
+A:
+{{
+  "sql": "",
+  "clarification": "What threshold defines 'high notional'? Please specify a value.",
+  "explanation": "The term 'high notional' is subjective and needs clarification."
+}}
+
+### TASK:
+Generate the SQL query or ask for clarification based on the schema and the question below.
+
+Q: "{user_question}"
+'''
+
+
+@traced("nl2sql.parse_response")
+def parse_model_response(response_text: str) -> dict:
+    """
+    Parses the model's response and validates the expected JSON structure.
+    Returns a dictionary with 'sql', 'clarification', and 'explanation'.
+    If parsing fails, returns a default structure with an error message.
+    """
+    try:
+        parsed = json.loads(response_text)
+        assert "sql" in parsed and "clarification" in parsed and "explanation" in parsed
+        return parsed
+    except Exception as e:
+        return {
+            "sql": "",
+            "clarification": "The AI response was not in the expected format. Please rephrase your question.",
+            "explanation": f"Parsing error: {str(e)}"
+        }
+
+
+@traced("nl2sql.sanitize")
+def sanitize_sql(sql: str) -> str:
+    """
+    Checks that the SQL is a single read-only SELECT/WITH statement, on
+    tokens so identifiers and string literals cannot trip or hide keywords.
+    Raises ValueError if it is not. Row and size caps are applied when the
+    query runs (see execute_sql).
+    """
+    from sql_shape import tokenize
+
+    if not sql.strip():
+        return sql
+    try:
+        tokens = tokenize(sql)
+    except ValueError as e:
+        raise ValueError(f"Unable to parse SQL: {e}")
+    while tokens and tokens[-1].value == ";":
+        tokens.pop()
+    if not tokens or tokens[0].kind != "ident" or tokens[0].value.upper() not in READ_ONLY_STATEMENTS:
+        raise ValueError("Only SELECT queries are allowed.")
+    for i, token in enumerate(tokens):
+        if token.kind == "op" and token.value == ";":
+            raise ValueError("Only a single SQL statement is allowed.")
+        if token.kind == "ident" and token.value.upper() in FORBIDDEN_KEYWORDS:
+            # replace() is also a string function
+            if not (token.value.upper() == "REPLACE" and i + 1 < len(tokens) and tokens[i + 1].value == "("):
+                raise ValueError("Unsafe SQL command detected.")
+    return sql.strip()
+
+
+def limit_rows(query: str, max_rows: int) -> str:
+    """
+    Rewrite a query to return at most max_rows + 1 rows, the extra row
+    telling the caller the cap was hit. Without a top-level LIMIT one is
+    appended; a larger literal LIMIT is lowered in place (keeping its
+    OFFSET); anything else is wrapped in a subquery.
+    """
+    from sql_shape import number, tokenize
+
+    try:
+        tokens = tokenize(query)
+    except ValueError:
+        return query
+    while tokens and tokens[-1].value == ";":
+        tokens.pop()
+    if not tokens:
+        return query
+    body = query[:tokens[-1].end]
+    cap = max_rows + 1
+
+    depth = 0
+    limit_at = None
+    for i, token in enumerate(tokens):
+        if token.kind == "op" and token.value == "(":
+            depth += 1
+        elif token.kind == "op" and token.value == ")":
+            depth -= 1
+        elif depth == 0 and token.kind == "ident" and token.value.upper() == "LIMIT":
+            limit_at = i
+    if limit_at is None:
+        return f"{body} LIMIT {cap}"
+
+    # LIMIT count [OFFSET n] or LIMIT offset, count
+    rest = tokens[limit_at + 1:]
+    count = None
+    if rest and rest[0].kind == "num" and (len(rest) == 1 or rest[1].value.upper() == "OFFSET"):
+        count = rest[0]
+    elif len(rest) == 3 and rest[0].kind == "num" and rest[1].value == "," and rest[2].kind == "num":
+        count = rest[2]
+    if count is not None:
+        if number(count.value) <= cap:
+            return body
+        return f"{query[:count.start]}{cap}{body[count.end:]}"
+    return f"SELECT * FROM ({body}) LIMIT {cap}"
+
+
+def http_completion(messages: list):
+    """
+    Default LLM backend: POST the chat messages to the completions endpoint.
+    Returns (status_code, body, text); body is the parsed JSON on success.
+    """
+    response = get_http_session().post(
+        f"{llama_3_70b_endpoint}/v1/chat/completions",
+        json={
+            "messages": messages,
+            "model": LLM_MODEL,
+            "max_tokens": 10000
+        }
+    )
+    if response.status_code == 200:
+        return response.status_code, response.json(), response.text
+    return response.status_code, None, response.text
+
+
+# Backend generate_sql sends prompts to, same signature as http_completion.
+# Benchmarks and load tests swap in recorded or mock models here.
+llm_backend = http_completion
+
+
+@traced("nl2sql.generate")
+def generate_sql(user_question: str) -> dict:
+    """
+    Sends the user's question to the LLM, parses the response,
+    validates and sanitizes the SQL query, and returns a structured result.
+    Successful translations are served from the NL -> SQL cache, and common
+    question shapes are answered by the rule-based fast path without a model call.
+    The result's "source" says which of the three answered and "metrics"
+    holds timing, prompt size and token counts for telemetry.
+    """
+    started = time.perf_counter()
+    key = (normalize_question(user_question), schema_version())
+    cached = sql_cache.get(key)
+    if cached is not None:
+        parsed = dict(cached)
+        parsed["source"] = "cache"
+        parsed["metrics"] = {"seconds": time.perf_counter() - started}
+        return parsed
+
+    if FASTPATH_ENABLED:
+        parsed = _fastpath_sql(user_question)
+        if parsed is not None:
+            sql_cache.put(key, dict(parsed))
+            parsed["metrics"] = {"seconds": time.perf_counter() - started}
+            return parsed
+
+    prompt = create_prompt(user_question)
+    messages = [{"role": "user", "content": prompt}]
+
+    with span("llm.http", prompt_chars=len(prompt)) as llm_span:
+        status_code, body, text = llm_backend(messages)
+        llm_span.set_attribute("status_code", status_code)
+    metrics = {"seconds": time.perf_counter() - started, "prompt_chars": len(prompt)}
+
+    if status_code == 200:
+        raw_response = body["choices"][0]["message"]["content"]
+        parsed = parse_model_response(raw_response)
+
+        try:
+            parsed["sql"] = sanitize_sql(parsed["sql"])
+        except ValueError as ve:
+            parsed["sql"] = ""
+            parsed["clarification"] = str(ve)
+            parsed["explanation"] = "Query rejected due to unsafe SQL."
+
+        parsed["source"] = "llm"
+        if parsed["sql"] and not parsed["clarification"]:
+            sql_cache.put(key, dict(parsed))
+
+        usage = body.get("usage") or {}
+        metrics["prompt_tokens"] = usage.get("prompt_tokens")
+        metrics["completion_tokens"] = usage.get("completion_tokens")
+        parsed["metrics"] = metrics
+        return parsed
+    else:
+        return {
+            "sql": "",
+            "clarification": f"Failed to generate SQL. Status code: {status_code}",
+            "explanation": text,
+            "source": "llm",
+            "metrics": metrics
+        }
+
+
+def _cap_result(df, max_rows, max_bytes, size=None):
+    """Cut a result to the row and byte caps and record whether it was cut"""
+    truncated_by = None
+    if max_bytes is not None:
+        if size is None:
+            size = int(df.memory_usage(deep=True).sum())
+        if size > max_bytes and len(df):
+            df = df.iloc[:max(1, int(len(df) * max_bytes / size))]
+            truncated_by = "bytes"
+    if max_rows is not None and len(df) > max_rows:
+        df = df.iloc[:max_rows]
+        truncated_by = truncated_by or "rows"
+    df.attrs["truncated"] = truncated_by is not None
+    df.attrs["truncated_by"] = truncated_by
+    df.attrs["row_cap"] = max_rows
+    return df
+
+
+@traced("sql.execute")
+def execute_sql(query: str, on_progress=None, max_rows=MAX_RESULT_ROWS, max_bytes=MAX_RESULT_BYTES):
+    """
+    Execute SQL query on a pooled read-only connection and return results.
+    At most max_rows rows and about max_bytes of DataFrame memory are
+    materialized; a result that was cut has df.attrs["truncated"] set
+    (None disables a cap). The query is canonicalized (literals lifted into
+    parameters) so every variant of a shape reuses one prepared statement,
+    and results are cached per (fingerprint, params, caps) until the
+    database changes; callers must treat the returned DataFrame as
+    read-only. Rows are fetched in chunks and on_progress, when given, is
+    called with the running row count.
+    """
+    import pandas as pd
+
+    from canonical import canonicalize
+
+    try:
+        version = data_version()
+        capped = query if max_rows is None else limit_rows(query, max_rows)
+        canonical = canonicalize(capped.strip())
+        if canonical is not None:
+            statement, params = canonical.text, canonical.params
+            # Typed: 2 == 2.0 as parameters, but trade_id / 2 and trade_id / 2.0 differ
+            key = (canonical.fingerprint, params, tuple(type(p) for p in params), version, max_rows, max_bytes)
+        else:
+            statement, params = capped, None
+            key = (capped.strip(), version, max_rows, max_bytes)
+        df = result_cache.get(key)
+        if df is None:
+            # Statements on this connection read one snapshot. The parallel executor's workers open their
+            # own connections, one snapshot per rowid range, so its results are not snapshot-consistent
+            # under concurrent writes (parallel.py)
+            with pool.snapshot() as conn:
+                df = route_query(capped, conn)
+                if df is not None:
+                    df = _cap_result(df, max_rows, max_bytes)
+                    if on_progress is not None:
+                        on_progress(len(df))
+                else:
+                    chunks = []
+                    fetched = 0
+                    size = 0
+                    with span("sql.fetch"):
+                        for chunk in pd.read_sql_query(statement, conn, params=params, chunksize=FETCH_CHUNK_SIZE):
+                            chunks.append(chunk)
+                            fetched += len(chunk)
+                            if on_progress is not None:
+                                on_progress(fetched)
+                            if max_bytes is not None:
+                                size += int(chunk.memory_usage(deep=True).sum())
+                                if size > max_bytes:
+                                    # Stop stepping the statement, the rest would be cut anyway
+                                    break
+                    if len(chunks) == 1:
+                        df = chunks[0]
+                    else:
+                        with span("df.concat", chunks=len(chunks)):
+                            df = pd.concat(chunks, ignore_index=True)
+                    df = _cap_result(df, max_rows, max_bytes, size if max_bytes is not None else None)
+            result_cache.put(key, df)
+        elif on_progress is not None:
+            on_progress(len(df))
+        return df, None
+    except Exception as e:
+        return None, str(e)
+
+
+@traced("export.csv_full")
+def export_csv(query: str, path: str, on_progress=None):
+    """
+    Stream the complete result of a query to a CSV file, chunk by chunk,
+    without the row cap or materializing it. Returns (rows, error).
+    """
+    import pandas as pd
+
+    from canonical import canonicalize
+
+    canonical = canonicalize(query.strip())
+    statement, params = (canonical.text, canonical.params) if canonical is not None else (query, None)
+    rows = 0
+    try:
+        with pool.connection() as conn, open(path, "w", encoding="utf-8", newline="") as f:
+            for chunk in pd.read_sql_query(statement, conn, params=params, chunksize=FETCH_CHUNK_SIZE):
+                chunk.to_csv(f, index=False, header=rows == 0)
+                rows += len(chunk)
+                if on_progress is not None:
+                    on_progress(rows)
+        return rows, None
+    except Exception as e:
+        return rows, str(e)
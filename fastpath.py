@@ -0,0 +1,452 @@
+"""
+Rule-based NL -> SQL for the common question shapes.
+
+Questions like "total notional by product type", "top 5 currency pairs by
+volume" or "show trade 104" follow a handful of patterns. This module tags
+the words of a question using synonym tables built from the schema and the
+distinct values stored in the database, fills a few slots (aggregate,
+measure, grouping, filters, top-N) and emits SQL locally. Anything it does
+not fully understand returns None so the caller falls back to the LLM.
+
+Per-pattern hit counts are kept in PATTERN_HITS (see stats()).
+"""
+import re
+import threading
+import time
+from collections import Counter
+
+from sql_shape import quote_literal
+
+# Words that carry no meaning for the query shape
+STOPWORDS = {
+    "show", "me", "the", "a", "an", "of", "all", "what", "whats", "is", "are", "was", "were", "list",
+    "give", "get", "display", "find", "per", "each", "please", "trading", "traded", "in", "with", "for",
+    "on", "and", "to", "which", "our", "my", "across", "broken", "down", "overall", "data", "i", "want",
+    "see", "do", "we", "have", "current", "their", "there", "values", "value", "breakdown", "summary",
+    "executed", "booked", "can", "you", "tell", "us", "at", "from", "split", "grouped", "aggregated",
+}
+
+AGGREGATES = {
+    ("total",): "SUM", ("sum",): "SUM", ("sum", "of"): "SUM",
+    ("average",): "AVG", ("avg",): "AVG", ("mean",): "AVG",
+    ("maximum",): "MAX", ("max",): "MAX", ("highest",): "MAX",
+    ("minimum",): "MIN", ("min",): "MIN", ("lowest",): "MIN",
+    ("count",): "COUNT", ("number", "of"): "COUNT", ("how", "many"): "COUNT",
+}
+
+MEASURES = {
+    ("notional",): "notl", ("notionals",): "notl", ("notl",): "notl", ("volume",): "notl",
+    ("amount",): "notl", ("size",): "notl", ("exposure",): "notl",
+    ("rate",): "rate", ("fx", "rate"): "rate", ("price",): "rate", ("executed", "rate"): "rate",
+    ("activity",): "activity",
+}
+
+# Added when trades has USD notionals (fx_rates.py); the plain notional
+# words then mean notl_usd too, as notl is in each pair's base currency
+USD_MEASURES = {
+    ("usd", "notional"): "notl_usd", ("usd", "notionals"): "notl_usd", ("notional", "in", "usd"): "notl_usd",
+    ("usd", "volume"): "notl_usd", ("volume", "in", "usd"): "notl_usd", ("usd", "amount"): "notl_usd",
+    ("usd", "exposure"): "notl_usd", ("usd", "equivalent"): "notl_usd", ("notl_usd",): "notl_usd",
+}
+
+# name -> (SQL expression, output alias, needs counterparties join, label)
+DIMENSIONS = {
+    "px_type": ("px_type", "px_type", False, "product type"),
+    "ccy_pair": ("ccy_pair", "ccy_pair", False, "currency pair"),
+    "region": ("region", "region", True, "region"),
+    "cp_name": ("cp_name", "cp_name", True, "counterparty"),
+    "month": ("strftime('%Y-%m', near_dt)", "month", False, "month"),
+}
+
+DIMENSION_WORDS = {
+    ("product", "type"): "px_type", ("product",): "px_type", ("px", "type"): "px_type",
+    ("px_type",): "px_type", ("type",): "px_type", ("instrument",): "px_type",
+    ("currency", "pair"): "ccy_pair", ("ccy", "pair"): "ccy_pair", ("pair",): "ccy_pair",
+    ("ccy_pair",): "ccy_pair", ("currency",): "ccy_pair",
+    ("region",): "region", ("geography",): "region",
+    ("counterparty",): "cp_name", ("client",): "cp_name", ("bank",): "cp_name", ("cp",): "cp_name",
+    ("month",): "month",
+}
+
+PX_TYPE_SYNONYMS = {
+    "spot": [("spot",)],
+    "fwd": [("fwd",), ("forward",), ("outright",), ("outright", "forward")],
+    "swap": [("swap",), ("fx", "swap")],
+    "ndf": [("ndf",), ("non", "deliverable", "forward"), ("non-deliverable", "forward")],
+}
+
+PERIODS = {
+    ("this", "month"): ("date('now', 'start of month')", "date('now', 'start of month', '+1 month')"),
+    ("last", "month"): ("date('now', 'start of month', '-1 month')", "date('now', 'start of month')"),
+    ("this", "year"): ("date('now', 'start of year')", "date('now', 'start of year', '+1 year')"),
+    ("today",): ("date('now')", "date('now', '+1 day')"),
+}
+
+THRESHOLD_WORDS = {
+    ("over",): ">", ("above",): ">", ("greater", "than"): ">", ("more", "than"): ">", ("exceeding",): ">",
+    ("bigger", "than"): ">", ("larger", "than"): ">", (">",): ">",
+    ("under",): "<", ("below",): "<", ("less", "than"): "<", ("smaller", "than"): "<", ("<",): "<",
+}
+
+UNITS = {"k": 1e3, "thousand": 1e3, "m": 1e6, "mm": 1e6, "mn": 1e6, "mio": 1e6, "million": 1e6,
+         "b": 1e9, "bn": 1e9, "billion": 1e9}
+
+TOP_WORDS = {("top",): "top", ("largest",): "largest", ("biggest",): "largest", ("bottom",): "bottom",
+             ("smallest",): "smallest"}
+
+# phrase -> singular ("the largest trade" means one row)
+TRADE_WORDS = {("trade",): True, ("trades",): False, ("deal",): True, ("deals",): False,
+               ("transaction",): True, ("transactions",): False}
+
+DEFAULT_TOP_N = 10
+LEXICON_TTL_SECONDS = 60
+
+_NUMBER_RE = re.compile(r"^\$?(\d+(?:\.\d+)?)(k|m|mm|mn|bn|b)?$")
+
+PATTERN_HITS = Counter()
+_lexicon = None
+_lexicon_built_at = 0.0
+_lexicon_schema = None
+_lexicon_lock = threading.Lock()
+
+
+def _singular(word: str) -> str:
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+class Lexicon(dict):
+    """
+    Phrase (tuple of words) -> (tag, value). notional is the column that
+    notional words, activity, thresholds and trade rankings use.
+    """
+
+    def __init__(self, notional: str = "notl"):
+        super().__init__()
+        self.notional = notional
+
+
+def build_lexicon(conn) -> Lexicon:
+    """
+    The Lexicon of the static synonym tables plus the distinct px_type,
+    ccy_pair, region and cp_name values in the DB
+    """
+    import fx_rates
+
+    notional = "notl_usd" if fx_rates.installed(conn) else "notl"
+    lexicon = Lexicon(notional)
+    for phrase, value in AGGREGATES.items():
+        lexicon[phrase] = ("agg", value)
+    for phrase, value in MEASURES.items():
+        # "notl" names the column itself
+        lexicon[phrase] = ("measure", notional if value == "notl" and phrase != ("notl",) else value)
+    if notional == "notl_usd":
+        for phrase, value in USD_MEASURES.items():
+            lexicon[phrase] = ("measure", value)
+    for phrase, value in DIMENSION_WORDS.items():
+        lexicon[phrase] = ("dim", value)
+    for phrase, value in PERIODS.items():
+        lexicon[phrase] = ("period", value)
+    for phrase, value in THRESHOLD_WORDS.items():
+        lexicon[phrase] = ("threshold", value)
+    for phrase, value in TOP_WORDS.items():
+        lexicon[phrase] = ("top", value)
+    for phrase, singular in TRADE_WORDS.items():
+        lexicon[phrase] = ("trades", singular)
+    lexicon[("by",)] = ("by", None)
+    lexicon[("monthly",)] = ("monthly", None)
+    lexicon[("trade", "id")] = ("trade_id", None)
+    lexicon[("trade", "number")] = ("trade_id", None)
+    lexicon[("trade", "#")] = ("trade_id", None)
+
+    px_types = {row[0] for row in conn.execute("SELECT DISTINCT px_type FROM trades WHERE px_type IS NOT NULL")}
+    for px_type, phrases in PX_TYPE_SYNONYMS.items():
+        if px_type in px_types:
+            for phrase in phrases:
+                lexicon[phrase] = ("filter", ("px_type", px_type))
+    for px_type in px_types:
+        lexicon.setdefault((px_type.lower(),), ("filter", ("px_type", px_type)))
+
+    for (pair,) in conn.execute("SELECT DISTINCT ccy_pair FROM trades WHERE ccy_pair IS NOT NULL"):
+        lexicon[(pair.lower(),)] = ("filter", ("ccy_pair", pair))
+        lexicon[(pair.lower().replace("/", ""),)] = ("filter", ("ccy_pair", pair))
+    for (region,) in conn.execute("SELECT DISTINCT region FROM counterparties WHERE region IS NOT NULL"):
+        lexicon[(region.lower(),)] = ("filter", ("region", region))
+    for (name,) in conn.execute("SELECT DISTINCT cp_name FROM counterparties WHERE cp_name IS NOT NULL"):
+        lexicon[tuple(name.lower().split())] = ("filter", ("cp_name", name))
+    return lexicon
+
+
+def get_lexicon():
+    """
+    Lexicon for engine.DB_PATH, rebuilt at most once per LEXICON_TTL_SECONDS
+    and whenever the schema changes
+    """
+    import engine
+
+    global _lexicon, _lexicon_built_at, _lexicon_schema
+    schema = engine.schema_version()
+    with _lexicon_lock:
+        if _lexicon is None or time.time() - _lexicon_built_at > LEXICON_TTL_SECONDS or schema != _lexicon_schema:
+            with engine.pool.connection() as conn:
+                _lexicon = build_lexicon(conn)
+            _lexicon_built_at = time.time()
+            _lexicon_schema = schema
+        return _lexicon
+
+
+def tag(question: str, lexicon: dict):
+    """
+    Split the question into (tag, value) pairs, longest phrase first.
+    Returns None if any word is not understood.
+    """
+    words = re.findall(r"[a-z0-9$#/.<>_-]+", question.lower().replace(",", ""))
+    words = [w.rstrip(".") for w in words if w.rstrip(".")]
+    longest = max(len(p) for p in lexicon)
+    tags = []
+    i = 0
+    while i < len(words):
+        for size in range(min(longest, len(words) - i), 0, -1):
+            phrase = tuple(words[i:i + size])
+            entry = lexicon.get(phrase)
+            if entry is None:
+                entry = lexicon.get(phrase[:-1] + (_singular(phrase[-1]),))
+            if entry is not None:
+                tags.append(entry)
+                i += size
+                break
+        else:
+            word = words[i]
+            match = _NUMBER_RE.match(word)
+            if match:
+                value = float(match.group(1)) * UNITS.get(match.group(2), 1)
+                tags.append(("number", value))
+            elif word in UNITS and tags and tags[-1][0] == "number":
+                tags[-1] = ("number", tags[-1][1] * UNITS[word])
+            elif word.startswith("#") and word[1:].isdigit():
+                tags.append(("number", float(word[1:])))
+            elif word not in STOPWORDS and _singular(word) not in STOPWORDS:
+                return None
+            i += 1
+    return tags
+
+
+def _slots(tags: list):
+    """Collect the query slots from tagged words; None when the shape is unclear"""
+    slots = {"agg": None, "measure": None, "dims": [], "subject": None, "filters": [],
+             "thresholds": [], "period": None, "top": None, "n": None, "trade_id": None, "singular": False,
+             "notional": "notl"}
+    grouping = False
+    i = 0
+    while i < len(tags):
+        kind, value = tags[i]
+        if grouping and kind == "dim":
+            # "by region and product type"
+            slots["dims"].append(value)
+            i += 1
+            continue
+        grouping = kind == "by" and tags[i + 1][0] == "dim" if i + 1 < len(tags) else False
+        following = tags[i + 1] if i + 1 < len(tags) else (None, None)
+        if kind == "agg":
+            if slots["agg"] is not None:
+                return None
+            slots["agg"] = value
+        elif kind == "measure":
+            if slots["measure"] is not None:
+                return None
+            slots["measure"] = value
+        elif kind == "by":
+            if following[0] == "dim":
+                slots["dims"].append(following[1])
+            elif following[0] == "measure" and slots["measure"] is None:
+                slots["measure"] = following[1]
+            elif following[0] == "monthly":
+                slots["dims"].append("month")
+            else:
+                return None
+            i += 1
+        elif kind == "dim":
+            if slots["subject"] is not None:
+                return None
+            slots["subject"] = ("dim", value)
+        elif kind == "trades":
+            if following[0] == "number" and following[1].is_integer():
+                slots["trade_id"] = int(following[1])
+                i += 1
+            elif slots["subject"] is None:
+                slots["subject"] = ("trades", None)
+                slots["singular"] = value
+        elif kind == "trade_id":
+            if following[0] != "number" or not following[1].is_integer():
+                return None
+            slots["trade_id"] = int(following[1])
+            i += 1
+        elif kind == "monthly":
+            slots["dims"].append("month")
+        elif kind == "filter":
+            slots["filters"].append(value)
+        elif kind == "threshold":
+            if following[0] != "number":
+                return None
+            slots["thresholds"].append((value, following[1]))
+            i += 1
+        elif kind == "period":
+            if slots["period"] is not None:
+                return None
+            slots["period"] = value
+        elif kind == "top":
+            slots["top"] = value
+            if following[0] == "number" and following[1].is_integer():
+                slots["n"] = int(following[1])
+                i += 1
+        elif kind == "number":
+            return None
+        i += 1
+    return slots
+
+
+def _where(slots: dict) -> list:
+    conditions = []
+    by_column = {}
+    for column, value in slots["filters"]:
+        by_column.setdefault(column, []).append(value)
+    for column, values in by_column.items():
+        if len(values) == 1:
+            conditions.append(f"{column} = {quote_literal(values[0])}")
+        else:
+            conditions.append(f"{column} IN ({', '.join(quote_literal(v) for v in values)})")
+    notional = slots["notional"]
+    for op, amount in slots["thresholds"]:
+        conditions.append(f"{notional} {op} {amount:.0f}" if amount.is_integer() else f"{notional} {op} {amount}")
+    if slots["period"] is not None:
+        start, end = slots["period"]
+        conditions.append(f"near_dt >= {start} AND near_dt < {end}")
+    return conditions
+
+
+def _from(needs_join: bool) -> str:
+    if needs_join:
+        return "trades JOIN counterparties ON trades.cp_id = counterparties.cp_id"
+    return "trades"
+
+
+def _measure_items(agg: str, measure: str, notional: str = "notl") -> list:
+    """(SQL, alias, label) for the aggregated columns, notional being the default notional column"""
+    if measure == "activity":
+        return [("COUNT(*)", "trade_count", "trade count")] + _measure_items("SUM", notional)
+    if agg == "COUNT" or (agg is None and measure is None):
+        return [("COUNT(*)", "trade_count", "number of trades")]
+    measure = measure or notional
+    agg = agg or ("AVG" if measure == "rate" else "SUM")
+    word, label = {"notl": ("notional", "notional"), "rate": ("rate", "rate"),
+                   "notl_usd": ("usd_notional", "USD notional")}[measure]
+    prefix = {"SUM": "total", "AVG": "avg", "MAX": "max", "MIN": "min"}[agg]
+    return [(f"{agg}({measure})", f"{prefix}_{word}", f"{prefix} {label}")]
+
+
+def build_sql(slots: dict):
+    """Turn filled slots into (pattern name, SQL, explanation), or None"""
+    conditions = _where(slots)
+    filter_join = any(column in ("region", "cp_name") for column, _ in slots["filters"])
+
+    if slots["trade_id"] is not None:
+        if slots["dims"] or slots["agg"] or slots["top"] or conditions:
+            return None
+        return ("trade_lookup", f"SELECT * FROM trades WHERE trade_id = {slots['trade_id']};",
+                f"Returns trade {slots['trade_id']}.")
+
+    subject = slots["subject"]
+    # "top 5 currency pairs by volume": the grouped dimension is the subject
+    if subject is not None and subject[0] == "dim":
+        if slots["dims"]:
+            return None
+        if slots["agg"] is None and slots["measure"] is None:
+            # "list the counterparties in APAC" is a listing, not a grouping
+            return None
+        slots["dims"] = [subject[1]]
+        grouped_subject = True
+    else:
+        grouped_subject = False
+
+    if slots["dims"]:
+        if len(set(slots["dims"])) != len(slots["dims"]) or len(slots["dims"]) > 2:
+            return None
+        needs_join = filter_join or any(DIMENSIONS[d][2] for d in slots["dims"])
+        select = [f"{DIMENSIONS[d][0]} AS {d}" if DIMENSIONS[d][0] != d else d for d in slots["dims"]]
+        measures = _measure_items(slots["agg"], slots["measure"], slots["notional"])
+        select += [f"{expr} AS {alias}" for expr, alias, _ in measures]
+        sql = f"SELECT {', '.join(select)} FROM {_from(needs_join)}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " GROUP BY " + ", ".join(slots["dims"])
+        labels = " and ".join(DIMENSIONS[d][3] for d in slots["dims"])
+        if slots["top"] is not None:
+            if not grouped_subject:
+                return None
+            direction = "ASC" if slots["top"] in ("bottom", "smallest") else "DESC"
+            n = slots["n"] or DEFAULT_TOP_N
+            sql += f" ORDER BY {measures[-1][1]} {direction} LIMIT {n};"
+            return ("top_n_groups", sql, f"Top {n} by {measures[-1][2]}, grouped by {labels}.")
+        order = "month" if "month" in slots["dims"] else f"{measures[-1][1]} DESC"
+        sql += f" ORDER BY {order};"
+        pattern = "monthly_aggregate" if "month" in slots["dims"] else "group_aggregate"
+        return (pattern, sql, f"{', '.join(m[2].capitalize() for m in measures)} grouped by {labels}.")
+
+    if slots["top"] is not None or slots["agg"] in ("MAX", "MIN") and subject == ("trades", None):
+        # "largest trades this month", "top 10 trades by notional", "smallest 5 trades"
+        if slots["measure"] not in (None, "notl", "rate", "notl_usd") or slots["agg"] not in (None, "MAX", "MIN"):
+            return None
+        measure = slots["measure"] or slots["notional"]
+        descending = slots["top"] in ("top", "largest") or slots["agg"] == "MAX"
+        n = slots["n"] or (1 if slots["singular"] else DEFAULT_TOP_N)
+        sql = f"SELECT {'trades.*' if filter_join else '*'} FROM {_from(filter_join)}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {measure} {'DESC' if descending else 'ASC'} LIMIT {n};"
+        return ("top_n_trades", sql, f"{'Largest' if descending else 'Smallest'} {n} trades by {measure}.")
+
+    if slots["agg"] is None and slots["thresholds"] and subject == ("trades", None):
+        # "swap trades with notional over 10m": the measure only names the filter
+        slots["measure"] = None
+
+    if slots["agg"] is not None or slots["measure"] is not None:
+        measures = _measure_items(slots["agg"], slots["measure"], slots["notional"])
+        sql = f"SELECT {', '.join(f'{e} AS {a}' for e, a, _ in measures)} FROM {_from(filter_join)}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        return ("scalar_aggregate", sql + ";", f"{', '.join(m[2].capitalize() for m in measures)} of matching trades.")
+
+    if subject == ("trades", None):
+        if not conditions:
+            return ("all_trades", "SELECT * FROM trades;", "Returns all columns from the trades table.")
+        sql = f"SELECT {'trades.*' if filter_join else '*'} FROM {_from(filter_join)} WHERE " + " AND ".join(conditions)
+        return ("trade_filter", sql + ";", "Returns the trades matching the requested filters.")
+    return None
+
+
+def try_generate(user_question: str, lexicon: dict = None):
+    """
+    Resolve the question locally. Returns a generate_sql-style result dict
+    (with "source": "fastpath" and the matched "pattern") or None.
+    """
+    lexicon = lexicon if lexicon is not None else get_lexicon()
+    tags = tag(user_question, lexicon)
+    slots = _slots(tags) if tags else None
+    if slots:
+        slots["notional"] = getattr(lexicon, "notional", "notl")
+    built = build_sql(slots) if slots else None
+    if built is None:
+        PATTERN_HITS["miss"] += 1
+        return None
+
+    pattern, sql, explanation = built
+    PATTERN_HITS[pattern] += 1
+    return {"sql": sql, "clarification": "", "explanation": explanation, "source": "fastpath", "pattern": pattern}
+
+
+def stats() -> dict:
+    """Hits per pattern plus misses (questions handed to the LLM)"""
+    return dict(PATTERN_HITS)
@@ -0,0 +1,334 @@
+"""
+Daily FX fixings and USD-normalized trade notionals.
+
+notl is in each trade's base currency (the first of its pair), so summing
+it across pairs adds EUR, USD and GBP amounts together. This module keeps:
+
+  - fx_rates: daily fixings (ccy, day, usd_rate = USD per unit of ccy),
+    loaded from CSV or Parquet files;
+  - trades.notl_usd: notl at the latest fixing of the base currency on or
+    before near_dt. ingest.py, bulk_import.py and db_setup.py write it
+    with each trade, and loading fixings recomputes it for the trades they
+    change. It is a rollup measure (aggregates.py), so SUM(notl_usd) by
+    product type is as fast as SUM(notl);
+  - to_usd(notl, ccy_pair, date): the same conversion as a SQL function on
+    the engine's connections (e.g. at another date), with a per-date rate
+    cache.
+
+Converter converts whole batches: one searchsorted per currency over its
+sorted fixing days. Trades with no fixing on or before their date get a
+NULL notl_usd.
+
+    python fx_rates.py load --db fx_trades.db fixings.csv   # date,ccy,usd_rate or date,ccy_pair,rate
+    python fx_rates.py reprice --db fx_trades.db
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+import calendars
+
+# How often a Rates holder looks for new fixings
+RATES_CHECK_SECONDS = float(os.environ.get("FX_RATES_CHECK_SECONDS", "1"))
+
+USD_COLUMN = "notl_usd"
+RATES_TABLE = "fx_rates"
+TABLES = (RATES_TABLE,)
+RATES_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {RATES_TABLE} (
+    ccy TEXT NOT NULL,
+    day INTEGER NOT NULL,       -- days since 1970-01-01 (calendars.py)
+    usd_rate REAL NOT NULL,     -- USD per unit of ccy
+    PRIMARY KEY (ccy, day)
+) WITHOUT ROWID"""
+
+# notl_usd of the trades row being updated, in SQL, so fixings and the
+# notionals they change commit in one writer transaction
+_USD_EXPR = f"""notl * CASE WHEN substr(ccy_pair, 1, 3) = 'USD' THEN 1.0 ELSE (
+    SELECT r.usd_rate FROM {RATES_TABLE} r
+    WHERE r.ccy = substr(trades.ccy_pair, 1, 3) AND r.day <= {calendars.DAY_EXPR.format(column="trades.near_dt")}
+    ORDER BY r.day DESC LIMIT 1) END"""
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def day_numbers(dates):
+    """Day numbers of ISO date texts as floats, NaN where missing or invalid"""
+    import pandas as pd
+
+    parsed = pd.to_datetime(pd.Series(dates, dtype=object), format="%Y-%m-%d", errors="coerce")
+    days = (parsed.values.astype("datetime64[D]") - _EPOCH).astype("float64")
+    days[parsed.isna().values] = np.nan
+    return days
+
+
+class Converter:
+    """Fixings of every currency as sorted arrays, converting notionals to USD"""
+
+    def __init__(self, fixings=()):
+        by_ccy = {}
+        for ccy, day, rate in fixings:
+            by_ccy.setdefault(ccy, []).append((day, rate))
+        self.days = {}
+        self.rates = {}
+        for ccy, rows in by_ccy.items():
+            rows.sort()
+            self.days[ccy] = np.array([day for day, _ in rows], dtype="int64")
+            self.rates[ccy] = np.array([rate for _, rate in rows], dtype="float64")
+        self._cache = {}
+
+    @classmethod
+    def load(cls, conn) -> "Converter":
+        try:
+            return cls(conn.execute(f"SELECT ccy, day, usd_rate FROM {RATES_TABLE}").fetchall())
+        except sqlite3.OperationalError:
+            # No fixings table yet
+            return cls()
+
+    def rate(self, ccy: str, date):
+        """USD per unit of ccy at a day number or ISO date, None when there is no fixing"""
+        key = (ccy, date)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        rate = None
+        if ccy == "USD":
+            rate = 1.0
+        elif ccy in self.days:
+            try:
+                day = date if isinstance(date, int) else calendars.day_number(str(date)[:10])
+            except ValueError:
+                day = None
+            if day is not None:
+                pos = int(np.searchsorted(self.days[ccy], day, side="right")) - 1
+                rate = float(self.rates[ccy][pos]) if pos >= 0 else None
+        self._cache[key] = rate
+        return rate
+
+    def convert(self, notl, ccy_pairs, days):
+        """USD amounts of notionals in the pairs' base currencies at day numbers (NaN when unknown)"""
+        import pandas as pd
+
+        notl = np.asarray(notl, dtype="float64")
+        days = np.asarray(days, dtype="float64")
+        rates = np.full(len(notl), np.nan)
+        codes, bases = pd.factorize(pd.Series(ccy_pairs, dtype=object).str[:3])
+        known = ~np.isnan(days)
+        for i, ccy in enumerate(bases):
+            rows = (codes == i) & known
+            if ccy == "USD":
+                rates[rows] = 1.0
+            elif ccy in self.days and rows.any():
+                pos = np.searchsorted(self.days[ccy], days[rows], side="right") - 1
+                rates[rows] = np.where(pos >= 0, self.rates[ccy][np.maximum(pos, 0)], np.nan)
+        return notl * rates
+
+    def convert_trades(self, rows: list) -> list:
+        """notl_usd for trade rows in ingest.TRADE_COLUMNS order, None when unknown"""
+        if not rows:
+            return []
+        usd = self.convert([row[3] for row in rows], [row[4] for row in rows], day_numbers([row[5] for row in rows]))
+        return [None if np.isnan(value) else float(value) for value in usd]
+
+
+class Rates:
+    """Converter for a database file, reloaded when its fixings change"""
+
+    def __init__(self, path: str, check_seconds: float = RATES_CHECK_SECONDS):
+        self.path = path
+        self.check_seconds = check_seconds
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._converter = None
+        self._checked_at = 0.0
+        self._version = None
+        self._fingerprint = None
+
+    def get(self) -> Converter:
+        now = time.monotonic()
+        if self._converter is not None and now - self._checked_at < self.check_seconds:
+            return self._converter
+        with self._lock:
+            if self._converter is None or now - self._checked_at >= self.check_seconds:
+                self._checked_at = now
+                version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+                if self._converter is None or version != self._version:
+                    self._version = version
+                    try:
+                        fingerprint = self._conn.execute(
+                            f"SELECT count(*), TOTAL(usd_rate), MAX(day) FROM {RATES_TABLE}").fetchone()
+                    except sqlite3.OperationalError:
+                        fingerprint = None
+                    if self._converter is None or fingerprint != self._fingerprint:
+                        self._converter = Converter.load(self._conn)
+                        self._fingerprint = fingerprint
+            return self._converter
+
+
+_rates = {}
+_rates_lock = threading.Lock()
+
+
+def get_rates(path: str) -> Rates:
+    """Process-wide Rates for a database file"""
+    with _rates_lock:
+        if path not in _rates:
+            _rates[path] = Rates(path)
+        return _rates[path]
+
+
+def register(conn, path: str):
+    """Register to_usd(notl, ccy_pair, date or day) on conn, with the fixings of the database at path"""
+    rates = get_rates(path)
+
+    def to_usd(notl, ccy_pair, date):
+        if notl is None or not ccy_pair or date is None:
+            return None
+        rate = rates.get().rate(ccy_pair[:3], date)
+        return None if rate is None else notl * rate
+
+    conn.create_function("to_usd", 3, to_usd)
+
+
+# -- schema and loading -------------------------------------------------------
+def installed(conn) -> bool:
+    """True when trades has notl_usd"""
+    return USD_COLUMN in {row[1] for row in conn.execute("PRAGMA table_info(trades)")}
+
+
+def schema_statements(conn) -> list:
+    """Writer statements creating fx_rates and trades.notl_usd where missing"""
+    statements = [(RATES_SCHEMA, None)]
+    if not installed(conn):
+        statements.append((f"ALTER TABLE trades ADD COLUMN {USD_COLUMN} REAL", None))
+    return statements
+
+
+def install(conn):
+    """Create fx_rates and trades.notl_usd on a direct connection (idempotent)"""
+    for sql, _ in schema_statements(conn):
+        conn.execute(sql)
+
+
+def reprice_statements(conn, since: dict = None) -> list:
+    """
+    Writer statements recomputing notl_usd: for trades whose base
+    currency and near_dt are at or after a {ccy: first changed day} entry
+    of since, or for every trade. Only rows whose value changes are
+    written. Repricing everything defers the rollup triggers.
+    """
+    import aggregates
+
+    where = f"notl_usd IS NOT ({_USD_EXPR})"
+    params = ()
+    if since is not None:
+        if not since:
+            return []
+        where += " AND (" + " OR ".join("(substr(ccy_pair, 1, 3) = ? AND near_dt >= ?)" for _ in since) + ")"
+        params = tuple(value for ccy, day in sorted(since.items())
+                       for value in (ccy, calendars.from_day(day).isoformat()))
+    statement = (f"UPDATE trades SET notl_usd = {_USD_EXPR} WHERE {where}", params or None)
+    if since is None:
+        return aggregates.without_triggers(conn, [statement])
+    return [statement]
+
+
+def read_fixings(path: str):
+    """
+    (frame of ccy/day/usd_rate, rows rejected) from a CSV or Parquet file
+    with date,ccy,usd_rate columns, or date,ccy_pair,rate market quotes of
+    pairs against USD (USD/JPY 149.3 is a JPY rate of 1/149.3)
+    """
+    import pandas as pd
+
+    frame = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path, dtype=str)
+    frame.columns = [str(c).strip().lower() for c in frame.columns]
+    days = day_numbers(frame["date"].astype(str).str.strip())
+    if "usd_rate" in frame.columns:
+        ccy = frame["ccy"].astype(str).str.strip().str.upper()
+        rate = pd.to_numeric(frame["usd_rate"], errors="coerce").to_numpy(dtype="float64")
+    else:
+        pair = frame["ccy_pair"].astype(str).str.strip().str.upper()
+        quote = pd.to_numeric(frame["rate"], errors="coerce").to_numpy(dtype="float64")
+        usd_quoted = (pair.str[4:] == "USD").to_numpy()
+        ccy = pair.str[:3].where(usd_quoted, pair.str[4:])
+        with np.errstate(divide="ignore"):
+            rate = np.where(usd_quoted, quote, 1.0 / quote)
+        rate[~(usd_quoted | (pair.str[:3] == "USD").to_numpy())] = np.nan
+    valid = ccy.str.fullmatch(r"[A-Z]{3}").fillna(False).to_numpy() & ~np.isnan(days) & (rate > 0)
+    fixings = pd.DataFrame({"ccy": ccy[valid].to_numpy(dtype=object),
+                            "day": days[valid].astype("int64"),
+                            "usd_rate": rate[valid]})
+    # The last row of a (ccy, day) wins
+    fixings = fixings.drop_duplicates(["ccy", "day"], keep="last")
+    return fixings, int(len(frame) - valid.sum())
+
+
+def load_files(db: str, paths: list) -> dict:
+    """Load fixing files and reprice the trades they affect, in one writer transaction"""
+    import pandas as pd
+    import writer
+
+    frames, rejected = [], 0
+    for path in paths:
+        frame, dropped = read_fixings(path)
+        frames.append(frame)
+        rejected += dropped
+    fixings = pd.concat(frames, ignore_index=True).drop_duplicates(["ccy", "day"], keep="last")
+    since = {ccy: int(day) for ccy, day in fixings.groupby("ccy")["day"].min().items()}
+
+    conn = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+    try:
+        statements = schema_statements(conn)
+        statements.append((f"INSERT OR REPLACE INTO {RATES_TABLE} (ccy, day, usd_rate) VALUES (?, ?, ?)",
+                           list(zip(fixings["ccy"].tolist(), fixings["day"].tolist(), fixings["usd_rate"].tolist()))))
+        # On a database without notl_usd yet every trade needs it
+        statements += reprice_statements(conn, since if installed(conn) else None)
+    finally:
+        conn.close()
+    client = writer.connect(db)
+    try:
+        counts = client.transaction(statements)
+    finally:
+        client.close()
+    repriced = [count for (sql, _), count in zip(statements, counts) if sql.startswith("UPDATE trades")]
+    return {"fixings": len(fixings), "rejected": rejected, "repriced": sum(repriced)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load FX fixings and maintain USD notionals")
+    parser.add_argument("command", choices=["load", "reprice"])
+    parser.add_argument("files", nargs="*", help="fixing files (CSV or Parquet) for load")
+    parser.add_argument("--db", default=os.environ.get("FX_DB_PATH", "fx_trades.db"))
+    args = parser.parse_args()
+
+    if args.command == "load":
+        if not args.files:
+            parser.error("give at least one fixing file")
+        result = load_files(args.db, args.files)
+        print(f"✅ Loaded {result['fixings']:,} fixings ({result['rejected']:,} rejected), "
+              f"repriced {result['repriced']:,} trades")
+        return
+
+    import writer
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    try:
+        statements = schema_statements(conn) + reprice_statements(conn)
+    finally:
+        conn.close()
+    client = writer.connect(args.db)
+    try:
+        client.transaction(statements)
+    finally:
+        client.close()
+    print(f"✅ Repriced notl_usd in {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Import-time profile for the app entry points.
+
+Runs ``python -X importtime -c "import <module>"`` in a fresh interpreter for
+each module and summarizes the output: total import time plus the slowest
+packages by cumulative and self time.
+
+Usage:
+    python importtime_report.py                 # engine, main2, main3
+    python importtime_report.py main2 --top 15
+"""
+import argparse
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["engine", "main2", "main3"]
+
+
+def profile_imports(module: str) -> list:
+    """Import the module in a fresh interpreter and parse the -X importtime lines"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us)
+        })
+    return rows
+
+
+def summarize(module: str, rows: list, top: int) -> str:
+    """Format a short report for one profiled module"""
+    # The profiled module is the last top-level entry; everything listed
+    # between the previous top-level entry (interpreter startup) and it is
+    # the subtree it pulled in.
+    end = max(i for i, r in enumerate(rows) if r["module"] == module and r["depth"] == 0)
+    start = max((i for i, r in enumerate(rows[:end]) if r["depth"] == 0), default=-1) + 1
+    subtree = rows[start:end]
+    total = rows[end]["cumulative_us"]
+    lines = [f"== {module}: {total / 1000:.1f} ms total, {len(subtree)} modules imported =="]
+
+    lines.append("  Slowest direct imports (cumulative):")
+    direct = [r for r in subtree if r["depth"] == 1]
+    for r in sorted(direct, key=lambda r: r["cumulative_us"], reverse=True)[:top]:
+        lines.append(f"    {r['cumulative_us'] / 1000:9.1f} ms  {r['module']}")
+
+    lines.append("  Slowest modules (self):")
+    for r in sorted(subtree, key=lambda r: r["self_us"], reverse=True)[:top]:
+        lines.append(f"    {r['self_us'] / 1000:9.1f} ms  {r['module']}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize -X importtime for the app modules")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--top", type=int, default=10, help="Entries per section")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        try:
+            print(summarize(module, profile_imports(module), args.top))
+        except RuntimeError as e:
+            print(f"== {module}: {e}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
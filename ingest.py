@@ -0,0 +1,397 @@
+"""
+Streaming trade ingestion from a drop folder and a local TCP socket.
+
+    python ingest.py --db fx_trades.db --dir drop --port 6020
+
+Records are trades (trade_id, cp_id, px_type, notl, ccy_pair, near_dt,
+far_dt, rate, optionally cp_name/region) or counterparties (cp_id,
+cp_name, region without a trade_id):
+
+- Drop folder: *.csv files with a header row and *.jsonl files with one
+  JSON object per line. Write them under another name and rename them in
+  place when complete. Loaded files move to processed/; rejected records
+  are listed in rejected/<file>.errors.
+- Socket: one JSON object per line; each rejected line is answered with
+  "error <line>: <reason>". Once the client shuts down its side the
+  queued records are committed, and a failed commit is answered with
+  "error commit: <reason>" (the records stay queued for a retry).
+
+Records are validated and collected into batches of BATCH_SIZE (or
+whatever arrived within BATCH_SECONDS), and each batch is upserted in one
+transaction through the writer process (writer.py) together with the new
+high-water trade_id in ingest_watermark. A batch the writer fails is
+queued again and retried with the next one. Trades get their USD notional
+(notl_usd, fx_rates.py) converted per batch at the latest fixings.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import socketserver
+import sqlite3
+import threading
+import time
+from datetime import date
+from functools import lru_cache
+
+import fx_rates
+import writer
+from db_setup import PX_TYPES
+
+BATCH_SIZE = int(os.environ.get("FX_INGEST_BATCH", "20000"))
+BATCH_SECONDS = float(os.environ.get("FX_INGEST_BATCH_SECONDS", "0.5"))
+POLL_SECONDS = float(os.environ.get("FX_INGEST_POLL", "1.0"))
+FILE_SUFFIXES = (".csv", ".jsonl")
+
+WATERMARK_TABLE = "ingest_watermark"
+WATERMARK_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE} (
+    name TEXT PRIMARY KEY,
+    trade_id INTEGER,
+    rows INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT
+)"""
+
+TRADE_COLUMNS = ("trade_id", "cp_id", "px_type", "notl", "ccy_pair", "near_dt", "far_dt", "rate")
+
+
+def _upsert_trades(columns: tuple) -> str:
+    return f"""
+INSERT INTO trades ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})
+ON CONFLICT(trade_id) DO UPDATE SET
+    {", ".join(f"{c} = excluded.{c}" for c in columns[1:])}
+"""
+
+
+UPSERT_TRADES = _upsert_trades(TRADE_COLUMNS)
+UPSERT_PRICED_TRADES = _upsert_trades(TRADE_COLUMNS + (fx_rates.USD_COLUMN,))
+# Only real changes update a counterparty: each update rebuilds the region rollup
+UPSERT_COUNTERPARTIES = """
+INSERT INTO counterparties (cp_id, cp_name, region) VALUES (?, ?, ?)
+ON CONFLICT(cp_id) DO UPDATE SET cp_name = excluded.cp_name, region = excluded.region
+WHERE cp_name IS NOT excluded.cp_name OR region IS NOT excluded.region
+"""
+UPDATE_WATERMARK = f"""
+INSERT INTO {WATERMARK_TABLE} (name, trade_id, rows, updated_at)
+VALUES ('trades', (SELECT MAX(trade_id) FROM trades), ?, datetime('now'))
+ON CONFLICT(name) DO UPDATE SET
+    trade_id = excluded.trade_id, rows = rows + excluded.rows, updated_at = excluded.updated_at
+"""
+
+_CCY_PAIR = re.compile(r"^[A-Z]{3}/[A-Z]{3}$")
+
+
+def watermark(conn):
+    """Highest trade_id loaded by the ingest service, or None"""
+    try:
+        row = conn.execute(f"SELECT trade_id FROM {WATERMARK_TABLE} WHERE name = 'trades'").fetchone()
+    except Exception:
+        return None
+    return row[0] if row else None
+
+
+@lru_cache(maxsize=8192)
+def _date(value: str) -> str:
+    return date.fromisoformat(value).isoformat()
+
+
+def _number(value, kind):
+    if value is None or value == "":
+        raise ValueError("missing")
+    return kind(value)
+
+
+def validate(record: dict):
+    """
+    ("trade", row), ("counterparty", row) or (None, reason) for one
+    record, row being the table's column tuple
+    """
+    field = "cp_id"
+    try:
+        if record.get("trade_id") in (None, ""):
+            cp_id = _number(record.get("cp_id"), int)
+            if not record.get("cp_name"):
+                return None, "neither trade_id nor cp_name"
+            return "counterparty", (cp_id, str(record["cp_name"]), record.get("region") or None)
+
+        field = "trade_id"
+        trade_id = _number(record.get("trade_id"), int)
+        field = "cp_id"
+        cp_id = _number(record.get("cp_id"), int)
+        field = "notl"
+        notl = _number(record.get("notl"), float)
+        field = "rate"
+        rate = _number(record.get("rate"), float)
+        field = "near_dt"
+        near_dt = _date(str(record.get("near_dt")))
+        field = "far_dt"
+        far_dt = _date(str(record["far_dt"])) if record.get("far_dt") not in (None, "") else None
+    except (TypeError, ValueError) as e:
+        return None, f"invalid {field}: {e}"
+
+    px_type = str(record.get("px_type") or "").lower()
+    ccy_pair = str(record.get("ccy_pair") or "").upper()
+    if px_type not in PX_TYPES:
+        return None, f"unknown px_type {record.get('px_type')!r}"
+    if not _CCY_PAIR.match(ccy_pair):
+        return None, f"invalid ccy_pair {record.get('ccy_pair')!r}"
+    if not notl > 0 or not rate > 0:
+        return None, "notl and rate must be positive"
+    if far_dt is not None and far_dt < near_dt:
+        return None, "far_dt before near_dt"
+    return "trade", (trade_id, cp_id, px_type, notl, ccy_pair, near_dt, far_dt, rate)
+
+
+class Ingestor:
+    """
+    Collects validated records and upserts them in batches through the
+    writer, with notl_usd converted by rates (fx_rates.Rates) when given
+    """
+
+    def __init__(self, client: "writer.WriterClient", batch_size: int = BATCH_SIZE, rates: "fx_rates.Rates" = None):
+        self.client = client
+        self.batch_size = batch_size
+        self.rates = rates
+        self.trades = {}
+        self.counterparties = {}
+        self.loaded = 0
+        self.rejected = 0
+        self.batches = 0
+        self.failures = 0
+        self.last_error = None
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        client.execute(WATERMARK_SCHEMA)
+        if rates is not None:
+            conn = sqlite3.connect(f"file:{rates.path}?mode=ro", uri=True)
+            try:
+                client.transaction(fx_rates.schema_statements(conn))
+            finally:
+                conn.close()
+
+    def add(self, records) -> list:
+        """Queue records, returning (index, reason) for each rejected one"""
+        errors = []
+        with self._lock:
+            for i, record in enumerate(records):
+                kind, row = validate(record)
+                if kind == "trade":
+                    # Later versions of a trade in the same batch win
+                    self.trades[row[0]] = row
+                    if record.get("cp_name"):
+                        self.counterparties[row[1]] = (row[1], str(record["cp_name"]), record.get("region") or None)
+                elif kind == "counterparty":
+                    self.counterparties[row[0]] = row
+                else:
+                    errors.append((i, row))
+            self.rejected += len(errors)
+            full = len(self.trades) >= self.batch_size
+        if full:
+            try:
+                self.flush()
+            except Exception:
+                # Queued again for the next flush, which reports the failure to its caller
+                pass
+        return errors
+
+    def flush(self) -> int:
+        """
+        Upsert everything queued in one transaction; returns the trade
+        count. When the writer fails the batch it is queued again, behind
+        any newer version of its records, and the error is raised.
+        """
+        with self._flush_lock:
+            with self._lock:
+                trades, self.trades = list(self.trades.values()), {}
+                counterparties, self.counterparties = list(self.counterparties.values()), {}
+            if not trades and not counterparties:
+                return 0
+            try:
+                statements = []
+                if counterparties:
+                    statements.append((UPSERT_COUNTERPARTIES, counterparties))
+                if trades and self.rates is not None:
+                    usd = self.rates.get().convert_trades(trades)
+                    statements.append((UPSERT_PRICED_TRADES,
+                                       [trade + (value,) for trade, value in zip(trades, usd)]))
+                elif trades:
+                    statements.append((UPSERT_TRADES, trades))
+                if trades:
+                    statements.append((UPDATE_WATERMARK, (len(trades),)))
+                self.client.transaction(statements)
+            except Exception as e:
+                with self._lock:
+                    for row in trades:
+                        self.trades.setdefault(row[0], row)
+                    for row in counterparties:
+                        self.counterparties.setdefault(row[0], row)
+                    self.failures += 1
+                    self.last_error = str(e)
+                raise
+            self.loaded += len(trades)
+            self.batches += 1
+            self.last_error = None
+            return len(trades)
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        return {"loaded": self.loaded, "rejected": self.rejected, "batches": self.batches,
+                "failures": self.failures, "last_error": self.last_error, "queued": len(self.trades),
+                "rows_per_s": self.loaded / elapsed if elapsed else 0.0}
+
+
+# -- drop folder ----------------------------------------------------------
+
+def read_records(path: str, chunk: int = BATCH_SIZE):
+    """Yield lists of (line, record) from a CSV or JSON-lines file"""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            rows = ((i + 2, record) for i, record in enumerate(csv.DictReader(f)))
+        else:
+            rows = ((i + 1, line) for i, line in enumerate(f) if line.strip())
+        batch = []
+        for line, record in rows:
+            if isinstance(record, str):
+                try:
+                    record = json.loads(record)
+                except ValueError as e:
+                    record = {"_error": f"invalid JSON: {e}"}
+            batch.append((line, record))
+            if len(batch) >= chunk:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def ingest_file(ingestor: Ingestor, path: str) -> list:
+    """Load one file completely, returning (line, reason) for rejected records"""
+    errors = []
+    for batch in read_records(path):
+        lines = [line for line, _ in batch]
+        records = [record if "_error" not in record else {} for _, record in batch]
+        for i, reason in ingestor.add(records):
+            errors.append((lines[i], batch[i][1].get("_error", reason)))
+    ingestor.flush()
+    return errors
+
+
+def watch_folder(ingestor: Ingestor, folder: str, stop: threading.Event):
+    """Load files as they appear in folder, then move them to processed/"""
+    processed = os.path.join(folder, "processed")
+    rejected = os.path.join(folder, "rejected")
+    os.makedirs(processed, exist_ok=True)
+    os.makedirs(rejected, exist_ok=True)
+    while not stop.is_set():
+        names = sorted(n for n in os.listdir(folder) if n.endswith(FILE_SUFFIXES) and not n.startswith("."))
+        for name in names:
+            path = os.path.join(folder, name)
+            try:
+                errors = ingest_file(ingestor, path)
+            except Exception as e:
+                # The writer rejected a batch; leave the file for a retry
+                print(f"❌ {name}: {e}", flush=True)
+                continue
+            if errors:
+                with open(os.path.join(rejected, name + ".errors"), "w", encoding="utf-8") as f:
+                    f.writelines(f"line {line}: {reason}\n" for line, reason in errors)
+            os.replace(path, os.path.join(processed, name))
+        stop.wait(POLL_SECONDS)
+
+
+# -- socket ---------------------------------------------------------------
+
+class _LineHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        ingestor = self.server.ingestor
+        batch, numbers = [], []
+        for number, raw in enumerate(self.rfile, start=1):
+            try:
+                batch.append(json.loads(raw))
+                numbers.append(number)
+            except ValueError as e:
+                self.wfile.write(f"error {number}: invalid JSON: {e}\n".encode("utf-8"))
+                continue
+            if len(batch) >= 1000:
+                self._submit(ingestor, batch, numbers)
+                batch, numbers = [], []
+        self._submit(ingestor, batch, numbers)
+        try:
+            ingestor.flush()
+        except Exception as e:
+            self.wfile.write(f"error commit: {e}\n".encode("utf-8"))
+
+    def _submit(self, ingestor, batch, numbers):
+        for i, reason in ingestor.add(batch):
+            self.wfile.write(f"error {numbers[i]}: {reason}\n".encode("utf-8"))
+
+
+class IngestServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, ingestor: Ingestor):
+        super().__init__(address, _LineHandler)
+        self.ingestor = ingestor
+
+
+def flush_periodically(ingestor: Ingestor, stop: threading.Event):
+    """
+    Commit partial batches so socket records are visible within
+    BATCH_SECONDS; a failed batch stays queued and shows in stats()
+    """
+    while not stop.wait(BATCH_SECONDS):
+        try:
+            ingestor.flush()
+        except Exception:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream trades into the FX database")
+    parser.add_argument("--db", default=os.environ.get("FX_DB_PATH", "fx_trades.db"))
+    parser.add_argument("--dir", help="drop folder to watch")
+    parser.add_argument("--port", type=int, help="local TCP port for JSON lines")
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+    if not args.dir and args.port is None:
+        parser.error("give --dir, --port or both")
+
+    ingestor = Ingestor(writer.connect(args.db), rates=fx_rates.get_rates(args.db))
+    stop = threading.Event()
+    threads = [threading.Thread(target=flush_periodically, args=(ingestor, stop), daemon=True)]
+    if args.dir:
+        os.makedirs(args.dir, exist_ok=True)
+        threads.append(threading.Thread(target=watch_folder, args=(ingestor, args.dir, stop), daemon=True))
+    server = None
+    if args.port is not None:
+        server = IngestServer((args.host, args.port), ingestor)
+        threads.append(threading.Thread(target=server.serve_forever, daemon=True))
+    for thread in threads:
+        thread.start()
+
+    print(f"📥 Ingesting into {args.db}"
+          + (f" from {args.dir}" if args.dir else "")
+          + (f" and {args.host}:{args.port}" if args.port is not None else ""), flush=True)
+    try:
+        while True:
+            time.sleep(10)
+            stats = ingestor.stats()
+            print(f"{stats['loaded']:,} loaded, {stats['rejected']:,} rejected, "
+                  f"{stats['rows_per_s']:,.0f} rows/s", flush=True)
+            if stats["last_error"]:
+                print(f"❌ {stats['queued']:,} trades queued after {stats['failures']:,} failed batches, "
+                      f"last: {stats['last_error']}", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        if server is not None:
+            server.shutdown()
+        ingestor.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Background job manager for LLM and SQL work.
+
+The Streamlit script thread submits a job, keeps only the job id in
+session state and polls it on every rerun, so a slow query no longer
+freezes the session and a rerun does not restart it. Identical in-flight
+jobs (same question, same SQL) are shared between sessions.
+"""
+import itertools
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import engine
+
+JOB_WORKERS = 8
+JOB_TTL_SECONDS = 15 * 60
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    """State and progress of one background task"""
+
+    def __init__(self, job_id: str, kind: str, key):
+        self.id = job_id
+        self.kind = kind
+        self.key = key
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+        self.rows_fetched = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def done(self) -> bool:
+        return self.state in (DONE, FAILED)
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def set_progress(self, rows_fetched: int):
+        self.rows_fetched = rows_fetched
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "state": self.state,
+            "error": self.error,
+            "rows_fetched": self.rows_fetched,
+            "elapsed": self.elapsed,
+        }
+
+
+class JobManager:
+    """Runs jobs on a thread pool and deduplicates identical in-flight work"""
+
+    def __init__(self, max_workers: int = JOB_WORKERS, ttl: float = JOB_TTL_SECONDS):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fx-job")
+        self._jobs = {}
+        self._inflight = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, key, fn, *args) -> str:
+        """
+        Schedule fn(job, *args) and return the job id. If a job with the same
+        (kind, key) is still queued or running, its id is returned instead.
+        """
+        with self._lock:
+            self._prune()
+            existing = self._inflight.get((kind, key))
+            if existing is not None and not existing.done:
+                return existing.id
+
+            job = Job(f"{kind}-{next(self._ids)}", kind, key)
+            self._jobs[job.id] = job
+            self._inflight[(kind, key)] = job
+
+        self._executor.submit(self._run, job, fn, args)
+        return job.id
+
+    def get(self, job_id: str):
+        """Look up a job; returns None for unknown or expired ids"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def submit_generate(self, question: str) -> str:
+        return self.submit("generate_sql", engine.normalize_question(question), _generate, question)
+
+    def submit_execute(self, sql: str, max_rows: int = engine.MAX_RESULT_ROWS) -> str:
+        return self.submit("execute_sql", (sql.strip(), max_rows), _execute, sql, max_rows)
+
+    def submit_export(self, sql: str) -> str:
+        return self.submit("export_csv", sql.strip(), _export, sql)
+
+    def _run(self, job: Job, fn, args):
+        job.state = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = fn(job, *args)
+            job.state = DONE
+        except Exception as e:
+            job.error = str(e)
+            job.state = FAILED
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if self._inflight.get((job.kind, job.key)) is job:
+                    del self._inflight[(job.kind, job.key)]
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.done and job.finished_at < cutoff]
+        for job_id in expired:
+            job = self._jobs.pop(job_id)
+            if job.kind == "export_csv" and job.result and os.path.exists(job.result):
+                os.remove(job.result)
+
+
+def _generate(job: Job, question: str) -> dict:
+    return engine.generate_sql(question)
+
+
+def _execute(job: Job, sql: str, max_rows: int):
+    df, error = engine.execute_sql(sql, on_progress=job.set_progress, max_rows=max_rows)
+    if error:
+        raise RuntimeError(error)
+    return df
+
+
+def _export(job: Job, sql: str) -> str:
+    """Full, uncapped result as a CSV file; returns its path"""
+    fd, path = tempfile.mkstemp(prefix="fx_export_", suffix=".csv")
+    os.close(fd)
+    _, error = engine.export_csv(sql, path, on_progress=job.set_progress)
+    if error:
+        os.remove(path)
+        raise RuntimeError(error)
+    return path
+
+
+@lru_cache(maxsize=None)
+def get_job_manager() -> JobManager:
+    """Process-wide job manager shared by every session"""
+    return JobManager()
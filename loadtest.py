@@ -0,0 +1,300 @@
+"""
+Multi-session load test for the Streamlit app.
+
+Drives N concurrent headless sessions (streamlit.testing AppTest) through
+the real main2.py state machine: asking -> (clarifying) -> results, with
+exponential think times between steps. The LLM is mocked with a
+configurable latency, the database can be a synthetic one of any size.
+
+Each session runs in its own process: AppTest installs process-global
+runtime mocks, so sessions sharing a process interfere with each other.
+This means sessions do not share the engine caches and job manager the
+way sessions on one real server do; cache hit rates are a lower bound.
+
+    python loadtest.py --sessions 20 --duration 120 --trades 1m
+
+Reports throughput, end-to-end and per-stage latency percentiles (from the
+tracing spans), memory growth per process and error rates.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import resource
+import tempfile
+import threading
+import time
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main2.py")
+
+VAGUE_QUESTIONS = [
+    "List trades with high notional",
+    "Show me the important counterparties",
+    "Which trades look risky?",
+]
+CLARIFICATIONS = ["notional over 10 million", "by total notional", "swaps only"]
+FALLBACK_SQL = "SELECT px_type, SUM(notl) AS total_notional FROM trades GROUP BY px_type;"
+
+# Stages reported from tracing spans
+STAGES = ["nl2sql.generate", "llm.http", "sql.execute", "sql.fetch", "chart.build", "chart.render",
+          "ui.visualization", "ui.data_summary", "export.csv", "export.json"]
+
+
+def rss_mb() -> float:
+    """Current resident set size (Linux), falling back to the peak"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def mock_llm_backend(mean_latency: float, seed: int):
+    """
+    Stand-in for engine.http_completion: log-normal latency around
+    mean_latency, a clarification for vague questions, otherwise the fast
+    path's SQL for the question (or a fixed rollup query).
+    """
+    import fastpath
+
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    vague = {q.lower() for q in VAGUE_QUESTIONS}
+
+    def backend(messages):
+        prompt = messages[-1]["content"]
+        match = re.search(r'Q: "(.*)"\s*$', prompt, re.S)
+        question = match.group(1) if match else ""
+        with lock:
+            delay = rng.lognormvariate(0, 0.5) * mean_latency / 1.13
+        time.sleep(delay)
+
+        if question.lower() in vague:
+            answer = {"sql": "", "clarification": "Please specify a threshold or filter.", "explanation": "Ambiguous."}
+        else:
+            fast = fastpath.try_generate(question.split(". Clarification:")[0])
+            sql = fast["sql"] if fast else FALLBACK_SQL
+            answer = {"sql": sql, "clarification": "", "explanation": "Mock model answer."}
+        content = json.dumps(answer)
+        body = {
+            "choices": [{"message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4},
+        }
+        return 200, body, content
+    return backend
+
+
+def click(at, label: str):
+    [button for button in at.button if label in button.label][0].click()
+
+
+def run_interaction(at, question: str, rng: random.Random, think: float, record: dict):
+    """Ask one question and follow the app until results (or an error) are shown"""
+    at.text_input(key="user_input").input(question)
+    click(at, "Generate SQL")
+    started = time.perf_counter()
+    at.run()
+
+    state = at.session_state.conversation_state
+    if state == "clarifying":
+        record["clarified"] = True
+        record["to_clarification_s"] = time.perf_counter() - started
+        time.sleep(rng.expovariate(1 / think) if think else 0)
+        at.text_input[0].input(rng.choice(CLARIFICATIONS))
+        click(at, "Submit Clarification")
+        started = time.perf_counter()
+        at.run()
+        state = at.session_state.conversation_state
+
+    record["answer_s"] = time.perf_counter() - started
+    if at.exception:
+        record["status"] = "exception"
+        record["error"] = str(at.exception[0].value)[:300]
+    elif state == "results" and at.session_state.query_data is not None:
+        record["status"] = "ok"
+        record["rows"] = len(at.session_state.query_data)
+    elif state == "results" and at.session_state.query_error:
+        record["status"] = "sql_error"
+        record["error"] = at.session_state.query_error
+    else:
+        record["status"] = f"stuck_in_{state}"
+        record["error"] = "; ".join(str(e.value) for e in at.error)[:300]
+
+
+def run_session(session_id: str, questions: list, deadline: float, think: float, timeout: float,
+                seed: int, records: list):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    at = None
+    while time.time() < deadline:
+        time.sleep(rng.expovariate(1 / think) if think else 0)
+        record = {"session": session_id, "clarified": False}
+        try:
+            if at is None or at.session_state.conversation_state != "asking":
+                # New page load; also how a user recovers from a stuck session
+                at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+                at.run()
+            record["question"] = rng.choice(questions)
+            run_interaction(at, record["question"], rng, think, record)
+            if record["status"] == "ok":
+                click(at, "New Query")
+                at.run()
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = repr(e)[:300]
+            at = None
+        record["finished_at"] = time.time()
+        records.append(record)
+
+
+def worker(args: dict) -> dict:
+    """One session in its own process"""
+    import engine
+    import tracing
+
+    engine.set_database(args["db"])
+    engine.FASTPATH_ENABLED = args["fastpath"]
+    engine.llm_backend = mock_llm_backend(args["llm_latency"], args["seed"])
+    tracing.enable(True)
+
+    import warmup
+
+    questions = list(warmup.EXAMPLE_QUESTIONS) + VAGUE_QUESTIONS * args["vague_weight"] + args["extra_questions"]
+    rss_start = rss_mb()
+    peak = [rss_start]
+    records = []
+    stop = threading.Event()
+
+    def sample_memory():
+        while not stop.wait(1.0):
+            peak[0] = max(peak[0], rss_mb())
+
+    threading.Thread(target=sample_memory, daemon=True).start()
+    run_session(f"s{args['index']}", questions, args["deadline"], args["think"], args["timeout"],
+                args["seed"], records)
+    stop.set()
+
+    return {
+        "records": records,
+        "samples": tracing.samples(),
+        "rss_start_mb": rss_start,
+        "rss_end_mb": rss_mb(),
+        "rss_peak_mb": max(peak[0], rss_mb()),
+        "sql_cache": engine.sql_cache.stats(),
+        "result_cache": engine.result_cache.stats(),
+    }
+
+
+def report(results: list, wall: float):
+    from stats import format_latencies, summarize_latencies
+
+    records = [r for result in results for r in result["records"]]
+    ok = [r for r in records if r.get("status") == "ok"]
+    print(f"\nInteractions: {len(records)} in {wall:.1f}s  ->  {len(ok) / wall:.2f} answered/s")
+    statuses = {}
+    for record in records:
+        statuses[record.get("status")] = statuses.get(record.get("status"), 0) + 1
+    for status, count in sorted(statuses.items(), key=lambda kv: -kv[1]):
+        print(f"  {status:<20} {count:>6}  ({count / len(records):.1%})" if records else "")
+    errors = [r for r in records if r.get("status") != "ok"]
+    for record in errors[:5]:
+        print(f"    e.g. {record.get('status')}: {record.get('error', '')[:160]}")
+
+    print("\nEnd-to-end (click -> results rendered):")
+    print("  " + format_latencies("answer", [r["answer_s"] for r in ok if "answer_s" in r]))
+    clarified = [r["to_clarification_s"] for r in records if "to_clarification_s" in r]
+    if clarified:
+        print("  " + format_latencies("clarify", clarified))
+
+    print("\nPer stage (tracing spans):")
+    merged = {}
+    for result in results:
+        for name, values in result["samples"].items():
+            merged.setdefault(name, []).extend(values)
+    for name in STAGES + sorted(set(merged) - set(STAGES)):
+        if merged.get(name):
+            print("  " + format_latencies(name[:14], merged[name]))
+
+    print("\nSessions:")
+    for i, result in enumerate(results):
+        growth = result["rss_end_mb"] - result["rss_start_mb"]
+        print(f"  session {i}: rss {result['rss_start_mb']:.0f} -> {result['rss_end_mb']:.0f} MB "
+              f"(peak {result['rss_peak_mb']:.0f} MB, growth {growth:+.0f} MB)  "
+              f"sql_cache hits {result['sql_cache']['hits']}/{result['sql_cache']['hits'] + result['sql_cache']['misses']}  "
+              f"result_cache hits {result['result_cache']['hits']}/"
+              f"{result['result_cache']['hits'] + result['result_cache']['misses']}")
+    return {
+        "interactions": len(records),
+        "throughput_per_s": len(ok) / wall,
+        "statuses": statuses,
+        "answer_latency": summarize_latencies([r["answer_s"] for r in ok if "answer_s" in r]),
+        "stages": {name: summarize_latencies(values) for name, values in merged.items()},
+        "workers": [{k: v for k, v in result.items() if k not in ("records", "samples")} for result in results],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test main2.py with concurrent headless sessions")
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent sessions, one process each")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds to keep starting interactions")
+    parser.add_argument("--think", type=float, default=2.0, help="mean think time between actions (s)")
+    parser.add_argument("--llm-latency", type=float, default=1.5, help="mean mock LLM latency (s)")
+    parser.add_argument("--fastpath", action="store_true", help="let the rule-based fast path answer first")
+    parser.add_argument("--vague-weight", type=int, default=1, help="how often vague questions are drawn")
+    parser.add_argument("--questions", help="file with extra questions, one per line")
+    parser.add_argument("--db", help="database to query (default: build one with --trades)")
+    parser.add_argument("--trades", default="100k", help="synthetic database size when --db is not given")
+    parser.add_argument("--workdir", default="bench_dbs")
+    parser.add_argument("--timeout", type=float, default=300.0, help="per-run AppTest timeout (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the summary as JSON")
+    args = parser.parse_args()
+
+    db = args.db
+    if db is None:
+        from bench_sql import ensure_database, parse_scale
+
+        db = os.path.abspath(ensure_database(args.workdir, parse_scale(args.trades), args.seed))
+
+    extra = []
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            extra = [line.strip() for line in f if line.strip()]
+
+    # Keep the run's side effects out of the real telemetry store and caches
+    os.environ.setdefault("FX_TELEMETRY_DB", os.path.join(tempfile.mkdtemp(prefix="fx-loadtest-"), "telemetry.db"))
+    os.environ["FX_WARMUP"] = "0"
+
+    deadline = time.time() + args.duration
+    jobs = [{
+        "index": i,
+        "db": db,
+        "deadline": deadline,
+        "think": args.think,
+        "llm_latency": args.llm_latency,
+        "fastpath": args.fastpath,
+        "vague_weight": args.vague_weight,
+        "extra_questions": extra,
+        "timeout": args.timeout,
+        "seed": args.seed * 1000 + i,
+    } for i in range(args.sessions)]
+
+    print(f"{args.sessions} sessions for {args.duration:.0f}s against {db}", flush=True)
+    started = time.time()
+    with multiprocessing.get_context("spawn").Pool(args.sessions) as pool:
+        results = pool.map(worker, jobs)
+    summary = report(results, time.time() - started)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
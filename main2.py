@@ -1,43 +1,33 @@
+from __future__ import annotations
+
 import streamlit as st
-import sqlite3
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from openai import OpenAI
-import os
 from dotenv import load_dotenv
-import json
 from datetime import datetime
-import numpy as np
+import os
 import time
-import requests
+import uuid
+from typing import TYPE_CHECKING
 # Load API key from .env file
 load_dotenv()
-# Llama 3 REST API endpoints configuration
-llama_3_70b_endpoint = "https://8i7715nbk7-vpce-0e881c3ec15437336.execute-api.eu-west-1.amazonaws.com/qwen3-30b-a3b"
-llama_3_key = "1AROkExTzj6uweMBgylwoaozPLWpQYxS61yvWqrj"
-
-DB_PATH = "fx_trades.db"
-
-SCHEMA_CONTEXT = """
-You are working with the following FX trading database:
-
-Table: trades
- - trade_id (INTEGER)
- - cp_id (INTEGER): links to counterparties.cp_id
- - px_type (TEXT): FX product type - can be 'spot', 'fwd', 'swap', 'ndf'
- - notl (REAL): Notional value
- - ccy_pair (TEXT): Currency pair
- - near_dt (TEXT): Near leg date (used in all products)
- - far_dt (TEXT): Far leg date (used only in 'swap' trades)
- - rate (REAL): Executed FX rate
-
-Table: counterparties
- - cp_id (INTEGER)
- - cp_name (TEXT): Name of the counterparty
- - region (TEXT): Region of the counterparty
-"""
+# Chart libraries, pandas and the HTTP client are imported on first use so
+# the first page paint does not wait for them.
+# NL -> SQL -> DataFrame pipeline lives in the headless engine module
+from engine import llama_3_70b_endpoint, LLM_MODEL, MAX_RESULT_ROWS, get_http_session
+from jobs import get_job_manager
+from charts import CHART_TYPES, build_figure
+import telemetry
+import tracing
+import warmup
+from warmup import EXAMPLE_QUESTIONS
+
+if TYPE_CHECKING:
+    # Annotations only; pandas itself is imported on first use
+    import pandas as pd
+
+# How often a running background job is polled while the page waits on it
+JOB_POLL_SECONDS = 0.5
+# How often a live (standing) query view checks for a newer result
+LIVE_REFRESH_SECONDS = 2
 
 # Dark Theme CSS
 def load_dark_theme_css():
@@ -420,141 +410,6 @@ def load_dark_theme_css():
     </style>
     """, unsafe_allow_html=True)
 
-def create_prompt(user_question: str) -> str:
-    return f'''
-You are an expert SQL assistant. Your task is to convert natural language questions into accurate SQL queries using the schema below.
-
-### SCHEMA CONTEXT:
-{SCHEMA_CONTEXT}
-
-### RESPONSE FORMAT:
-Respond strictly in the following JSON format:
-{{
-  "sql": "SQL query here (or empty string if clarification is needed)",
-  "clarification": "Ask for clarification if needed, otherwise leave empty",
-  "explanation": "Brief explanation of the query or why clarification is needed"
-}}
-
-### GUIDELINES:
-- If the question is clear and answerable using the schema, generate the SQL query directly.
-- If the question is ambiguous or missing key details, ask for clarification.
-- Do not include any internal reasoning or commentary.
-- Do not explain your thought process — only return the structured JSON.
-- Prefer generating a reasonable SQL query over asking for clarification unless absolutely necessary.
-
-### EXAMPLES:
-
-Q: "Show total notional by product type."
-A:
-{{
-  "sql": "SELECT px_type, SUM(notl) AS total_notional FROM trades GROUP BY px_type;",
-  "clarification": "",
-  "explanation": "Aggregates total notional amount grouped by FX product type."
-}}
-
-Q: "Show me all the trades."
-A:
-{{
-  "sql": "SELECT * FROM trades;",
-  "clarification": "",
-  "explanation": "Returns all columns from the trades table."
-}}
-
-Q: "List trades with high notional."
-A:
-{{
-  "sql": "",
-  "clarification": "What threshold defines 'high notional'? Please specify a value.",
-  "explanation": "The term 'high notional' is subjective and needs clarification."
-}}
-
-### TASK:
-Generate the SQL query or ask for clarification based on the schema and the question below.
-
-Q: "{user_question}"
-'''
-
-
-def parse_model_response(response_text: str) -> dict:
-    """
-    Parses the model's response and validates the expected JSON structure.
-    Returns a dictionary with 'sql', 'clarification', and 'explanation'.
-    If parsing fails, returns a default structure with an error message.
-    """
-    try:
-        parsed = json.loads(response_text)
-        assert "sql" in parsed and "clarification" in parsed and "explanation" in parsed
-        return parsed
-    except Exception as e:
-        return {
-            "sql": "",
-            "clarification": "The AI response was not in the expected format. Please rephrase your question.",
-            "explanation": f"Parsing error: {str(e)}"
-        }
-
-
-def sanitize_sql(sql: str) -> str:
-    """
-    Checks for unsafe SQL commands and appends LIMIT if missing.
-    Raises ValueError if unsafe commands are detected.
-    """
-    forbidden = ["DROP", "DELETE", "ALTER"]
-    if any(cmd in sql.upper() for cmd in forbidden):
-        raise ValueError("Unsafe SQL command detected.")
-    return sql
-
-
-def generate_sql(user_question: str) -> dict:
-    """
-    Sends the user's question to the LLM, parses the response,
-    validates and sanitizes the SQL query, and returns a structured result.
-    """
-    prompt = create_prompt(user_question)
-    messages = [{"role": "user", "content": prompt}]
-
-    response = requests.post(
-        f"{llama_3_70b_endpoint}/v1/chat/completions",
-        json={
-            "messages": messages,
-            "model": "Qwen/Qwen3-30B-A3B",
-            "max_tokens": 10000
-        },
-        headers={
-            "Content-Type": "application/json",
-            "x-api-key": llama_3_key
-        }
-    )
-
-    if response.status_code == 200:
-        raw_response = response.json()["choices"][0]["message"]["content"]
-        parsed = parse_model_response(raw_response)
-
-        try:
-            parsed["sql"] = sanitize_sql(parsed["sql"])
-        except ValueError as ve:
-            parsed["sql"] = ""
-            parsed["clarification"] = str(ve)
-            parsed["explanation"] = "Query rejected due to unsafe SQL."
-
-        return parsed
-    else:
-        return {
-            "sql": "",
-            "clarification": f"Failed to generate SQL. Status code: {response.status_code}",
-            "explanation": response.text
-        }
-
-def execute_sql(query: str):
-    """Execute SQL query and return results"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df, None
-    except Exception as e:
-        return None, str(e)
-
-
 def build_validation_prompt(user_question: str, generated_sql: str, schema_context: dict) -> str:
     """
     Create a detailed validation prompt for the LLM to check if the SQL query is valid.
@@ -693,14 +548,13 @@ def clarify_user_query(user_question: str) -> str:
     ### Clarified Question:
     """
 
-    response = requests.post(
+    response = get_http_session().post(
         f"{llama_3_70b_endpoint}/v1/chat/completions",
         json={
             "messages": [{"role": "user", "content": clarification_prompt}],
-            "model": "Qwen/Qwen3-30B-A3B",
+            "model": LLM_MODEL,
             "max_tokens": 1000
-        },
-        headers={"Content-Type": "application/json", "x-api-key": llama_3_key}
+        }
     )
 
     if response.status_code == 200:
@@ -709,6 +563,7 @@ def clarify_user_query(user_question: str) -> str:
     return user_question  # Return the original query if something goes wrong
 
 
+@tracing.traced("ui.visualization")
 def create_interactive_visualization(df: pd.DataFrame, chart_key: str = "main"):
     """Create interactive visualization with real-time controls"""
     if df.empty:
@@ -716,9 +571,10 @@ def create_interactive_visualization(df: pd.DataFrame, chart_key: str = "main"):
         return
     
     # Get column information
-    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-    categorical_cols = df.select_dtypes(include=['object', 'string']).columns.tolist()
-    all_cols = df.columns.tolist()
+    with tracing.span("df.postprocess"):
+        numeric_cols = df.select_dtypes(include="number").columns.tolist()
+        categorical_cols = df.select_dtypes(include=['object', 'string']).columns.tolist()
+        all_cols = df.columns.tolist()
     
     if not numeric_cols and not categorical_cols:
         st.info("📊 No visualizable columns found")
@@ -733,7 +589,7 @@ def create_interactive_visualization(df: pd.DataFrame, chart_key: str = "main"):
     with control_col1:
         chart_type = st.selectbox(
             "📈 Chart Type",
-            ["Bar Chart", "Line Chart", "Scatter Plot", "Pie Chart", "Box Plot", "Heatmap", "Histogram"],
+            CHART_TYPES,
             key=f"chart_type_{chart_key}",
             help="Choose the type of visualization"
         )
@@ -795,141 +651,12 @@ def create_interactive_visualization(df: pd.DataFrame, chart_key: str = "main"):
     
     # Generate the chart based on selections
     try:
-        fig = None
-        
-        # Dark theme template for Plotly
-        dark_template = {
-            "layout": {
-                "paper_bgcolor": "rgba(26, 26, 46, 0.8)",
-                "plot_bgcolor": "rgba(15, 15, 35, 0.8)",
-                "font": {"color": "#e0e6ed"},
-                "colorway": ["#64ffda", "#1de9b6", "#00bcd4", "#26c6da", "#4dd0e1", "#80deea", "#b2ebf2", "#e0f7fa"]
-            }
-        }
-        
-        if chart_type == "Bar Chart" and x_column and y_column:
-            # Aggregate data if needed
-            if df[x_column].dtype == 'object':
-                agg_df = df.groupby(x_column)[y_column].sum().reset_index()
-                fig = px.bar(
-                    agg_df, 
-                    x=x_column, 
-                    y=y_column,
-                    title=f"{y_column} by {x_column}",
-                    color=x_column if not color_column else color_column,
-                    template="plotly_dark"
-                )
-            else:
-                fig = px.bar(
-                    df, 
-                    x=x_column, 
-                    y=y_column,
-                    color=color_column,
-                    title=f"{y_column} by {x_column}",
-                    template="plotly_dark"
-                )
-        
-        elif chart_type == "Line Chart" and y_column:
-            if x_column:
-                fig = px.line(
-                    df, 
-                    x=x_column, 
-                    y=y_column,
-                    color=color_column,
-                    title=f"{y_column} over {x_column}",
-                    markers=True,
-                    template="plotly_dark"
-                )
-            else:
-                fig = px.line(
-                    df.reset_index(), 
-                    x='index', 
-                    y=y_column,
-                    title=f"{y_column} Trend",
-                    markers=True,
-                    template="plotly_dark"
-                )
-        
-        elif chart_type == "Scatter Plot" and x_column and y_column:
-            fig = px.scatter(
-                df, 
-                x=x_column, 
-                y=y_column,
-                color=color_column,
-                size=size_column,
-                title=f"{y_column} vs {x_column}",
-                template="plotly_dark"
-            )
-        
-        elif chart_type == "Pie Chart" and x_column:
-            # Create pie chart from value counts
-            value_counts = df[x_column].value_counts()
-            fig = px.pie(
-                values=value_counts.values,
-                names=value_counts.index,
-                title=f"Distribution of {x_column}",
-                template="plotly_dark"
-            )
-        
-        elif chart_type == "Box Plot" and y_column:
-            if x_column:
-                fig = px.box(
-                    df, 
-                    x=x_column, 
-                    y=y_column,
-                    color=color_column,
-                    title=f"{y_column} Distribution by {x_column}",
-                    template="plotly_dark"
-                )
-            else:
-                fig = px.box(
-                    df, 
-                    y=y_column,
-                    title=f"{y_column} Distribution",
-                    template="plotly_dark"
-                )
-        
-        elif chart_type == "Histogram" and y_column:
-            fig = px.histogram(
-                df, 
-                x=y_column,
-                color=color_column,
-                title=f"Distribution of {y_column}",
-                nbins=30,
-                template="plotly_dark"
-            )
-        
-        elif chart_type == "Heatmap" and len(numeric_cols) >= 2:
-            # Create correlation heatmap
-            corr_matrix = df[numeric_cols].corr()
-            fig = px.imshow(
-                corr_matrix,
-                text_auto=True,
-                aspect="auto",
-                title="Correlation Heatmap",
-                template="plotly_dark",
-                color_continuous_scale="RdBu_r"
-            )
-        
+        fig = build_figure(df, chart_type, x_column, y_column, color_column, size_column, theme="hub")
+
         if fig:
-            # Customize the figure with dark theme
-            fig.update_layout(
-                height=500,
-                showlegend=True,
-                font=dict(size=12, color="#e0e6ed"),
-                title_font_size=16,
-                margin=dict(l=40, r=40, t=60, b=40),
-                paper_bgcolor="rgba(26, 26, 46, 0.8)",
-                plot_bgcolor="rgba(15, 15, 35, 0.8)",
-                colorway=["#64ffda", "#1de9b6", "#00bcd4", "#26c6da", "#4dd0e1", "#80deea", "#b2ebf2", "#e0f7fa"]
-            )
-            
-            # Update axes colors
-            fig.update_xaxes(gridcolor="rgba(255, 255, 255, 0.1)", color="#e0e6ed")
-            fig.update_yaxes(gridcolor="rgba(255, 255, 255, 0.1)", color="#e0e6ed")
-            
             # Display the chart
-            st.plotly_chart(fig, use_container_width=True, key=f"chart_{chart_key}")
+            with tracing.span("chart.render"):
+                st.plotly_chart(fig, use_container_width=True, key=f"chart_{chart_key}")
         else:
             st.warning("⚠️ Cannot create chart with selected parameters. Please try different columns.")
     
@@ -938,6 +665,7 @@ def create_interactive_visualization(df: pd.DataFrame, chart_key: str = "main"):
     
     st.markdown('</div>', unsafe_allow_html=True)
 
+@tracing.traced("ui.data_summary")
 def display_data_summary(df: pd.DataFrame):
     """Display data summary and statistics"""
     st.markdown('<div class="results-section slide-up">', unsafe_allow_html=True)
@@ -963,7 +691,7 @@ def display_data_summary(df: pd.DataFrame):
         """, unsafe_allow_html=True)
     
     with col3:
-        numeric_cols = len(df.select_dtypes(include=[np.number]).columns)
+        numeric_cols = len(df.select_dtypes(include="number").columns)
         st.markdown(f"""
         <div class="metric-card">
             <div class="metric-value">{numeric_cols}</div>
@@ -997,7 +725,8 @@ def display_data_summary(df: pd.DataFrame):
     col1, col2 = st.columns(2)
     
     with col1:
-        csv = df.to_csv(index=False).encode('utf-8')
+        with tracing.span("export.csv"):
+            csv = df.to_csv(index=False).encode('utf-8')
         st.download_button(
             "📥 Download CSV",
             data=csv,
@@ -1008,7 +737,8 @@ def display_data_summary(df: pd.DataFrame):
     
     with col2:
         # JSON export
-        json_data = df.to_json(orient='records', indent=2)
+        with tracing.span("export.json"):
+            json_data = df.to_json(orient='records', indent=2)
         st.download_button(
             "📄 Download JSON",
             data=json_data,
@@ -1019,6 +749,81 @@ def display_data_summary(df: pd.DataFrame):
     
     st.markdown('</div>', unsafe_allow_html=True)
 
+def display_truncation_notice(df: pd.DataFrame, sql: str):
+    """Tell the user a result was capped and offer more rows or a full export"""
+    if not df.attrs.get("truncated"):
+        return
+
+    if df.attrs.get("truncated_by") == "bytes":
+        reason = "the memory budget for a single result"
+    else:
+        reason = f"the {df.attrs.get('row_cap'):,} row limit"
+    st.warning(f"⚠️ Showing the first {len(df):,} rows: the result was cut at {reason}.")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        if df.attrs.get("truncated_by") == "rows" and st.button("➕ Fetch More Rows"):
+            st.session_state.row_cap = df.attrs["row_cap"] * 10
+            st.session_state.query_data = None
+            st.session_state.query_job_id = None
+            st.rerun()
+    with col2:
+        if st.session_state.export_path and os.path.exists(st.session_state.export_path):
+            with open(st.session_state.export_path, "rb") as f:
+                st.download_button(
+                    "📥 Download Full Result (CSV)",
+                    data=f,
+                    file_name=f"fx_query_results_full_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                    mime="text/csv",
+                    use_container_width=True
+                )
+        elif not st.session_state.export_job_id and st.button("📦 Export Full Result"):
+            st.session_state.export_job_id = get_job_manager().submit_export(sql)
+            st.rerun()
+
+    if st.session_state.export_job_id:
+        job = poll_job("export_job_id", "📦 Exporting the full result")
+        if job is not None and job.error:
+            st.error(f"❌ Export failed: {job.error}")
+        elif job is not None:
+            st.session_state.export_path = job.result
+            st.rerun()
+
+def display_live_view(sql: str):
+    """Offer to keep the query live and show its latest result while it is"""
+    from standing import get_standing_queries
+
+    if not st.session_state.standing_id:
+        if st.button("📡 Keep Live"):
+            st.session_state.standing_id = get_standing_queries().register(sql)
+            st.rerun()
+        return
+
+    live_result_panel(st.session_state.standing_id)
+    if st.button("⏹️ Stop Live View"):
+        # Other sessions may watch the same query; it expires once nobody does
+        st.session_state.standing_id = None
+        st.rerun()
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def live_result_panel(query_id: str):
+    """Latest result of a standing query, re-rendered on its own every few seconds"""
+    from standing import get_standing_queries
+
+    query = get_standing_queries().get(query_id)
+    if query is None:
+        st.info("⏸️ The live view expired.")
+    elif query.error:
+        st.error(f"❌ Live view failed: {query.error}")
+    elif query.result is None:
+        st.info("📡 Starting the live view...")
+    else:
+        mode = f"incremental, {query.rows_scanned:,} trades aggregated so far" if query.incremental else "full refresh"
+        updated = datetime.fromtimestamp(query.updated_at).strftime("%H:%M:%S")
+        st.markdown("### 📡 Live Result")
+        st.caption(f"Revision {query.revision} · updated {updated} · {mode}")
+        st.dataframe(query.result, use_container_width=True)
+
 def create_navigation():
     """Create top navigation bar"""
     st.markdown("""
@@ -1071,7 +876,7 @@ def create_sidebar():
         
         if st.button("🔄 Reset Query", use_container_width=True):
             for key in list(st.session_state.keys()):
-                if key.startswith(('conversation_state', 'user_question', 'query_data')):
+                if key.startswith(('conversation_state', 'user_question', 'query_data', 'query_error', 'query_job_id', 'llm_job_id', 'row_cap', 'export_job_id', 'export_path', 'standing_id')):
                     del st.session_state[key]
             st.session_state.show_landing = True
             st.rerun()
@@ -1085,23 +890,23 @@ def create_sidebar():
         
         # Example queries
         st.markdown("### 💡 Example Queries")
-        examples = [
-            "Show total notional by product type",
-            "Top 5 currency pairs by volume", 
-            "Trading activity by region",
-            "Average rates by currency pair",
-            "Monthly trading volumes",
-            "Largest trades this month"
-        ]
-        
-        for example in examples:
+        for example in EXAMPLE_QUESTIONS:
             if st.button(example, key=f"sidebar_ex_{hash(example)}", use_container_width=True):
                 st.session_state.user_question = example
                 st.session_state.show_landing = False
                 st.rerun()
         
         st.markdown("---")
-        
+
+        # Per-stage latency, only collected when FX_TRACING=1
+        if tracing.enabled():
+            with st.expander("⏱️ Stage Timings"):
+                st.dataframe([
+                    {"stage": name, "count": stage["count"], "p50 ms": round(stage["p50"] * 1000, 1),
+                     "p95 ms": round(stage["p95"] * 1000, 1), "p99 ms": round(stage["p99"] * 1000, 1)}
+                    for name, stage in tracing.summary().items()
+                ], use_container_width=True, hide_index=True)
+
         # Stats
         st.markdown("""
         <div style="text-align: center; padding: 1rem; background: rgba(100, 255, 218, 0.1); border-radius: 12px; border: 1px solid rgba(100, 255, 218, 0.2);">
@@ -1125,7 +930,57 @@ def create_typing_animation(text: str, key: str):
     
     placeholder.markdown(f"**{text}**")
 
-import streamlit as st
+def poll_job(state_key: str, message: str):
+    """
+    Return the background job whose id is stored in st.session_state[state_key]
+    once it has finished. While it is still running, show its real progress
+    and schedule a rerun. Returns None if the job is unknown (e.g. expired).
+    """
+    job = get_job_manager().get(st.session_state[state_key])
+    if job is None or job.done:
+        st.session_state[state_key] = None
+        return job
+
+    detail = f"{job.elapsed:.1f}s elapsed"
+    if job.rows_fetched:
+        detail += f" · {job.rows_fetched:,} rows fetched"
+    st.info(f"{message} ({detail})")
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
+
+def start_interaction(question: str):
+    """Begin a telemetry record for a new question (an unfinished one is logged as abandoned)"""
+    finish_interaction(status="abandoned")
+    st.session_state.interaction = {
+        "session_id": st.session_state.session_id,
+        "question": question,
+        "clarification_rounds": 0,
+    }
+
+def note_generation(result: dict):
+    """Add one generate_sql round to the current interaction"""
+    interaction = st.session_state.get("interaction")
+    if not interaction:
+        return
+    fields = telemetry.generation_fields(result)
+    for key in ("llm_seconds", "prompt_chars", "prompt_tokens", "completion_tokens"):
+        if fields[key] is not None:
+            fields[key] += interaction.get(key) or 0
+    interaction.update(fields)
+
+def finish_interaction(**fields):
+    """Queue the current interaction for the telemetry store"""
+    interaction = st.session_state.get("interaction")
+    if not interaction:
+        return
+    interaction.update(fields)
+    telemetry.record(**interaction)
+    st.session_state.interaction = None
+
+@st.cache_resource
+def start_cache_warmup():
+    """Warm the NL -> SQL and result caches once per server process"""
+    return warmup.start()
 
 # Assuming necessary functions like generate_sql, execute_sql, create_interactive_visualization, display_data_summary, etc. are defined elsewhere.
 
@@ -1138,6 +993,7 @@ def main():
     )
 
     load_dark_theme_css()
+    start_cache_warmup()
 
     # Initialize session state
     if "conversation_state" not in st.session_state:
@@ -1154,6 +1010,30 @@ def main():
         st.session_state.final_question = ""
     if "clarification_attempts" not in st.session_state:
         st.session_state.clarification_attempts = 0  # Track how many clarification attempts have been made
+    # Background job ids survive reruns, the jobs themselves live in the job manager
+    if "llm_job_id" not in st.session_state:
+        st.session_state.llm_job_id = None
+    if "query_job_id" not in st.session_state:
+        st.session_state.query_job_id = None
+    if "pending_question" not in st.session_state:
+        st.session_state.pending_question = ""
+    if "query_error" not in st.session_state:
+        st.session_state.query_error = None
+    # Row cap for the current result (None: engine default) and its full export
+    if "row_cap" not in st.session_state:
+        st.session_state.row_cap = None
+    if "export_job_id" not in st.session_state:
+        st.session_state.export_job_id = None
+    if "export_path" not in st.session_state:
+        st.session_state.export_path = None
+    # Standing query keeping the current result live (standing.py)
+    if "standing_id" not in st.session_state:
+        st.session_state.standing_id = None
+    # Telemetry for the question currently in flight
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    if "interaction" not in st.session_state:
+        st.session_state.interaction = None
 
     # Main application
     create_navigation()
@@ -1166,6 +1046,29 @@ def main():
         st.markdown("### 🔍 Ask Your Question")
         st.markdown("*Transform your thoughts into powerful SQL insights*")
 
+        if st.session_state.llm_job_id:
+            job = poll_job("llm_job_id", "🤖 AI is analyzing your question...")
+            if job is not None and job.error:
+                finish_interaction(status="llm_error", error=job.error)
+                st.error(f"❌ Failed to generate SQL: {job.error}")
+            elif job is not None:
+                result = job.result
+                note_generation(result)
+                if result.get("clarification"):
+                    st.session_state.clarification_question = result["clarification"]
+                    st.session_state.conversation_state = "clarifying"
+                else:
+                    st.session_state.sql_result = result
+                    st.session_state.final_question = st.session_state.user_question
+                    st.session_state.query_data = None
+                    st.session_state.query_error = None
+                    st.session_state.row_cap = None
+                    st.session_state.export_job_id = None
+                    st.session_state.export_path = None
+                    st.session_state.standing_id = None
+                    st.session_state.conversation_state = "results"
+                st.rerun()
+
         user_input = st.text_input(
             "",
             value=st.session_state.user_question,
@@ -1180,18 +1083,10 @@ def main():
             if st.button("🚀 Generate SQL", type="primary"):
                 if user_input.strip():
                     st.session_state.user_question = user_input
+                    start_interaction(user_input)
 
-                    # Show loading animation
-                    with st.spinner("🤖 AI is analyzing your question..."):
-                        result = generate_sql(user_input)
-
-                    if result.get("clarification"):
-                        st.session_state.clarification_question = result["clarification"]
-                        st.session_state.conversation_state = "clarifying"
-                    else:
-                        st.session_state.sql_result = result
-                        st.session_state.final_question = user_input
-                        st.session_state.conversation_state = "results"
+                    # Translate off the script thread, progress is shown on the next run
+                    st.session_state.llm_job_id = get_job_manager().submit_generate(user_input)
                     st.rerun()
                 else:
                     st.warning("⚠️ Please enter a question")
@@ -1202,6 +1097,7 @@ def main():
                 st.session_state.user_question = ""
                 st.session_state.query_data = None
                 st.session_state.sql_result = {}
+                st.session_state.llm_job_id = None
                 st.rerun()
 
         st.markdown('</div>', unsafe_allow_html=True)
@@ -1233,6 +1129,40 @@ def main():
         st.info(f"**Your question:** {st.session_state.user_question}")
         st.warning(f"**AI clarification:** {st.session_state.clarification_question}")
 
+        if st.session_state.llm_job_id:
+            job = poll_job("llm_job_id", "🔄 Processing your clarified question...")
+            if job is not None and job.error:
+                finish_interaction(status="llm_error", error=job.error)
+                st.error(f"❌ Failed to generate SQL: {job.error}")
+            elif job is not None:
+                result = job.result
+
+                # Increment the clarification attempt counter
+                st.session_state.clarification_attempts += 1
+                if st.session_state.interaction:
+                    st.session_state.interaction["clarification_rounds"] = st.session_state.clarification_attempts
+                note_generation(result)
+
+                # Check if we need to keep clarifying or move forward
+                if st.session_state.clarification_attempts >= 5:
+                    st.session_state.conversation_state = "asking"
+                    st.session_state.clarification_question = ""
+                    finish_interaction(status="abandoned")
+                    st.warning("⚠️ Too many ambiguous clarifications. Please restart your question with more details.")
+                    st.rerun()  # Restart the process if too many attempts
+                else:
+                    # Update session state and move to the results state
+                    st.session_state.sql_result = result
+                    st.session_state.final_question = st.session_state.pending_question
+                    st.session_state.query_data = None
+                    st.session_state.query_error = None
+                    st.session_state.row_cap = None
+                    st.session_state.export_job_id = None
+                    st.session_state.export_path = None
+                    st.session_state.standing_id = None
+                    st.session_state.conversation_state = "results"
+                    st.rerun()
+
         # Input field for user to provide more clarification
         clarification = st.text_input(
             "💬 Please provide more details:",
@@ -1250,25 +1180,10 @@ def main():
                     # Combine user question and clarification
                     full_question = f"{st.session_state.user_question}. Clarification: {clarification}"
 
-                    # Process the clarified question
-                    with st.spinner("🔄 Processing your clarified question..."):
-                        result = generate_sql(full_question)
-
-                    # Increment the clarification attempt counter
-                    st.session_state.clarification_attempts += 1
-
-                    # Check if we need to keep clarifying or move forward
-                    if st.session_state.clarification_attempts >= 5:
-                        st.session_state.conversation_state = "asking"
-                        st.session_state.clarification_question = ""
-                        st.warning("⚠️ Too many ambiguous clarifications. Please restart your question with more details.")
-                        st.rerun()  # Restart the process if too many attempts
-                    else:
-                        # Update session state and move to the results state
-                        st.session_state.sql_result = result
-                        st.session_state.final_question = full_question
-                        st.session_state.conversation_state = "results"
-                        st.rerun()
+                    # Process the clarified question in the background
+                    st.session_state.pending_question = full_question
+                    st.session_state.llm_job_id = get_job_manager().submit_generate(full_question)
+                    st.rerun()
                 else:
                     # If clarification is empty, prompt user to provide clarification
                     st.warning("⚠️ Please provide clarification")
@@ -1281,6 +1196,7 @@ def main():
                 st.session_state.user_question = ""
                 st.session_state.clarification_question = ""
                 st.session_state.clarification_attempts = 0  # Reset attempts
+                st.session_state.llm_job_id = None
                 st.rerun()  # Restart the process
 
         # Close the clarification section with the animation
@@ -1308,41 +1224,48 @@ def main():
             </div>
             """, unsafe_allow_html=True)
 
-            # Execute SQL if not already done
-            if st.session_state.query_data is None:
-                with st.spinner("⚡ Executing SQL query and preparing visualizations..."):
-                    progress_bar = st.progress(0)
-                    progress_bar.progress(25)
-                    print(result)
-                    df, error = execute_sql(result["sql"])
-                    progress_bar.progress(75)
-
-                    if error:
-                        st.error(f"❌ SQL Error: {error}")
-
-                        # Show SQL for debugging
-                        st.markdown('<div class="sql-display">', unsafe_allow_html=True)
-                        st.code(result["sql"], language="sql")
-                        st.markdown('</div>', unsafe_allow_html=True)
-
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            if st.button("🔄 Try Again"):
-                                st.session_state.conversation_state = "asking"
-                                st.rerun()
-                        with col2:
-                            if st.button("🔄 Reset"):
-                                st.session_state.conversation_state = "asking"
-                                st.session_state.user_question = ""
-                                st.session_state.query_data = None
-                                st.session_state.sql_result = {}
-                                st.rerun()
-                        return
-                    else:
-                        st.session_state.query_data = df
-
-                    progress_bar.progress(100)
-                    progress_bar.empty()
+            # Execute SQL in the background if not already done
+            if st.session_state.query_data is None and st.session_state.query_error is None:
+                if not st.session_state.query_job_id:
+                    st.session_state.query_job_id = get_job_manager().submit_execute(
+                        result["sql"], st.session_state.row_cap or MAX_RESULT_ROWS)
+                job = poll_job("query_job_id", "⚡ Executing SQL query and preparing visualizations...")
+                if job is None:
+                    # The job expired before this session saw it finish, run it again
+                    st.rerun()
+                if job.error:
+                    st.session_state.query_error = job.error
+                    finish_interaction(status="sql_error", error=job.error, exec_seconds=job.elapsed)
+                else:
+                    st.session_state.query_data = job.result
+                    if st.session_state.interaction:
+                        st.session_state.interaction.update(
+                            exec_seconds=job.elapsed,
+                            row_count=len(job.result),
+                            result_bytes=int(job.result.memory_usage(deep=True).sum()),
+                        )
+
+            if st.session_state.query_error is not None:
+                st.error(f"❌ SQL Error: {st.session_state.query_error}")
+
+                # Show SQL for debugging
+                st.markdown('<div class="sql-display">', unsafe_allow_html=True)
+                st.code(result["sql"], language="sql")
+                st.markdown('</div>', unsafe_allow_html=True)
+
+                col1, col2 = st.columns(2)
+                with col1:
+                    if st.button("🔄 Try Again"):
+                        st.session_state.conversation_state = "asking"
+                        st.rerun()
+                with col2:
+                    if st.button("🔄 Reset"):
+                        st.session_state.conversation_state = "asking"
+                        st.session_state.user_question = ""
+                        st.session_state.query_data = None
+                        st.session_state.sql_result = {}
+                        st.rerun()
+                return
 
             df = st.session_state.query_data
 
@@ -1355,12 +1278,21 @@ def main():
             # Success message
             st.success(f"🎉 Successfully retrieved {len(df)} rows with {len(df.columns)} columns!")
 
+            render_started = time.perf_counter()
+
             # Interactive visualization
             create_interactive_visualization(df, "main")
 
             # Data summary
             display_data_summary(df)
 
+            display_truncation_notice(df, result["sql"])
+
+            display_live_view(result["sql"])
+
+            # Logged once, on the first render of this result
+            finish_interaction(status="ok", render_seconds=time.perf_counter() - render_started)
+
             # Action buttons
             col1, col2, col3 = st.columns(3)
 
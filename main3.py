@@ -1,25 +1,33 @@
+from __future__ import annotations
+
 import streamlit as st
 import sqlite3
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from openai import OpenAI
 import os
 from dotenv import load_dotenv
 import json
 from datetime import datetime
-import numpy as np
+from typing import TYPE_CHECKING
+
+from charts import CHART_TYPES, build_figure
+
+if TYPE_CHECKING:
+    # Annotations only; pandas itself is imported on first use
+    import pandas as pd
 
 # Load API key from .env file
 load_dotenv()
 api_key = os.environ.get("OPENAI_API_KEY")
 
-# Initialize Groq/OpenAI client
-client = OpenAI(
-    base_url="https://api.groq.com/openai/v1",
-    api_key=api_key
-)
+
+@st.cache_resource
+def get_client():
+    """Initialize the Groq/OpenAI client on first use, once per process"""
+    from openai import OpenAI
+
+    return OpenAI(
+        base_url="https://api.groq.com/openai/v1",
+        api_key=api_key
+    )
 
 DB_PATH = "fx_trades.db"
 
@@ -224,7 +232,7 @@ A:
 def generate_sql(user_question: str) -> dict:
     """Generate SQL from natural language question"""
     prompt = create_prompt(user_question)
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model="llama-3.3-70b-versatile",
         messages=[{"role": "user", "content": prompt}],
         temperature=0,
@@ -243,6 +251,8 @@ def generate_sql(user_question: str) -> dict:
 
 def execute_sql(query: str):
     """Execute SQL query and return results"""
+    import pandas as pd
+
     try:
         conn = sqlite3.connect(DB_PATH)
         df = pd.read_sql_query(query, conn)
@@ -258,7 +268,7 @@ def create_interactive_visualization(df: pd.DataFrame, chart_key: str = "main"):
         return
     
     # Get column information
-    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+    numeric_cols = df.select_dtypes(include="number").columns.tolist()
     categorical_cols = df.select_dtypes(include=['object', 'string']).columns.tolist()
     all_cols = df.columns.tolist()
     
@@ -275,7 +285,7 @@ def create_interactive_visualization(df: pd.DataFrame, chart_key: str = "main"):
     with control_col1:
         chart_type = st.selectbox(
             "📈 Chart Type",
-            ["Bar Chart", "Line Chart", "Scatter Plot", "Pie Chart", "Box Plot", "Heatmap", "Histogram"],
+            CHART_TYPES,
             key=f"chart_type_{chart_key}",
             help="Choose the type of visualization"
         )
@@ -337,122 +347,9 @@ def create_interactive_visualization(df: pd.DataFrame, chart_key: str = "main"):
     
     # Generate the chart based on selections
     try:
-        fig = None
-        
-        if chart_type == "Bar Chart" and x_column and y_column:
-            # Aggregate data if needed
-            if df[x_column].dtype == 'object':
-                agg_df = df.groupby(x_column)[y_column].sum().reset_index()
-                fig = px.bar(
-                    agg_df, 
-                    x=x_column, 
-                    y=y_column,
-                    title=f"{y_column} by {x_column}",
-                    color=x_column if not color_column else color_column,
-                    template="plotly_dark"
-                )
-            else:
-                fig = px.bar(
-                    df, 
-                    x=x_column, 
-                    y=y_column,
-                    color=color_column,
-                    title=f"{y_column} by {x_column}",
-                    template="plotly_dark"
-                )
-        
-        elif chart_type == "Line Chart" and y_column:
-            if x_column:
-                fig = px.line(
-                    df, 
-                    x=x_column, 
-                    y=y_column,
-                    color=color_column,
-                    title=f"{y_column} over {x_column}",
-                    markers=True,
-                    template="plotly_dark"
-                )
-            else:
-                fig = px.line(
-                    df.reset_index(), 
-                    x='index', 
-                    y=y_column,
-                    title=f"{y_column} Trend",
-                    markers=True,
-                    template="plotly_dark"
-                )
-        
-        elif chart_type == "Scatter Plot" and x_column and y_column:
-            fig = px.scatter(
-                df, 
-                x=x_column, 
-                y=y_column,
-                color=color_column,
-                size=size_column,
-                title=f"{y_column} vs {x_column}",
-                template="plotly_dark"
-            )
-        
-        elif chart_type == "Pie Chart" and x_column:
-            # Create pie chart from value counts
-            value_counts = df[x_column].value_counts()
-            fig = px.pie(
-                values=value_counts.values,
-                names=value_counts.index,
-                title=f"Distribution of {x_column}",
-                template="plotly_dark"
-            )
-        
-        elif chart_type == "Box Plot" and y_column:
-            if x_column:
-                fig = px.box(
-                    df, 
-                    x=x_column, 
-                    y=y_column,
-                    color=color_column,
-                    title=f"{y_column} Distribution by {x_column}",
-                    template="plotly_dark"
-                )
-            else:
-                fig = px.box(
-                    df, 
-                    y=y_column,
-                    title=f"{y_column} Distribution",
-                    template="plotly_dark"
-                )
-        
-        elif chart_type == "Histogram" and y_column:
-            fig = px.histogram(
-                df, 
-                x=y_column,
-                color=color_column,
-                title=f"Distribution of {y_column}",
-                nbins=30,
-                template="plotly_dark"
-            )
-        
-        elif chart_type == "Heatmap" and len(numeric_cols) >= 2:
-            # Create correlation heatmap
-            corr_matrix = df[numeric_cols].corr()
-            fig = px.imshow(
-                corr_matrix,
-                text_auto=True,
-                aspect="auto",
-                title="Correlation Heatmap",
-                template="plotly_dark",
-                color_continuous_scale="RdBu_r"
-            )
-        
+        fig = build_figure(df, chart_type, x_column, y_column, color_column, size_column, theme="plain")
+
         if fig:
-            # Customize the figure
-            fig.update_layout(
-                height=500,
-                showlegend=True,
-                font=dict(size=12),
-                title_font_size=16,
-                margin=dict(l=40, r=40, t=60, b=40)
-            )
-            
             # Display the chart
             st.plotly_chart(fig, use_container_width=True, key=f"chart_{chart_key}")
         else:
@@ -488,7 +385,7 @@ def display_data_summary(df: pd.DataFrame):
         """, unsafe_allow_html=True)
     
     with col3:
-        numeric_cols = len(df.select_dtypes(include=[np.number]).columns)
+        numeric_cols = len(df.select_dtypes(include="number").columns)
         st.markdown(f"""
         <div class="metric-card">
             <h3>{numeric_cols}</h3>
@@ -1,43 +1,20 @@
+from __future__ import annotations
+
 import streamlit as st
-import sqlite3
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from openai import OpenAI
-import os
 from dotenv import load_dotenv
-import json
 from datetime import datetime
-import numpy as np
 import time
-import requests
+from typing import TYPE_CHECKING
 # Load API key from .env file
 load_dotenv()
-# Llama 3 REST API endpoints configuration
-llama_3_70b_endpoint = "https://8i7715nbk7-vpce-0e881c3ec15437336.execute-api.eu-west-1.amazonaws.com/qwen3-30b-a3b"
-llama_3_key = "1AROkExTzj6uweMBgylwoaozPLWpQYxS61yvWqrj"
-
-DB_PATH = "fx_trades.db"
-
-SCHEMA_CONTEXT = """
-You are working with the following FX trading database:
-
-Table: trades
- - trade_id (INTEGER)
- - cp_id (INTEGER): links to counterparties.cp_id
- - px_type (TEXT): FX product type - can be 'spot', 'fwd', 'swap', 'ndf'
- - notl (REAL): Notional value
- - ccy_pair (TEXT): Currency pair
- - near_dt (TEXT): Near leg date (used in all products)
- - far_dt (TEXT): Far leg date (used only in 'swap' trades)
- - rate (REAL): Executed FX rate
-
-Table: counterparties
- - cp_id (INTEGER)
- - cp_name (TEXT): Name of the counterparty
- - region (TEXT): Region of the counterparty
-"""
+# Chart libraries, pandas and the HTTP client are imported on first use so
+# the first page paint does not wait for them.
+# NL -> SQL -> DataFrame pipeline lives in the headless engine module
+from engine import llama_3_70b_endpoint, LLM_MODEL, get_http_session, generate_sql, execute_sql
+
+if TYPE_CHECKING:
+    # Annotations only; pandas itself is imported on first use
+    import pandas as pd
 
 # Dark Theme CSS
 def load_dark_theme_css():
@@ -420,141 +397,6 @@ def load_dark_theme_css():
     </style>
     """, unsafe_allow_html=True)
 
-def create_prompt(user_question: str) -> str:
-    return f'''
-You are an expert SQL assistant. Your task is to convert natural language questions into accurate SQL queries using the schema below.
-
-### SCHEMA CONTEXT:
-{SCHEMA_CONTEXT}
-
-### RESPONSE FORMAT:
-Respond strictly in the following JSON format:
-{{
-  "sql": "SQL query here (or empty string if clarification is needed)",
-  "clarification": "Ask for clarification if needed, otherwise leave empty",
-  "explanation": "Brief explanation of the query or why clarification is needed"
-}}
-
-### GUIDELINES:
-- If the question is clear and answerable using the schema, generate the SQL query directly.
-- If the question is ambiguous or missing key details, ask for clarification.
-- Do not include any internal reasoning or commentary.
-- Do not explain your thought process — only return the structured JSON.
-- Prefer generating a reasonable SQL query over asking for clarification unless absolutely necessary.
-
-### EXAMPLES:
-
-Q: "Show total notional by product type."
-A:
-{{
-  "sql": "SELECT px_type, SUM(notl) AS total_notional FROM trades GROUP BY px_type;",
-  "clarification": "",
-  "explanation": "Aggregates total notional amount grouped by FX product type."
-}}
-
-Q: "Show me all the trades."
-A:
-{{
-  "sql": "SELECT * FROM trades;",
-  "clarification": "",
-  "explanation": "Returns all columns from the trades table."
-}}
-
-Q: "List trades with high notional."
-A:
-{{
-  "sql": "",
-  "clarification": "What threshold defines 'high notional'? Please specify a value.",
-  "explanation": "The term 'high notional' is subjective and needs clarification."
-}}
-
-### TASK:
-Generate the SQL query or ask for clarification based on the schema and the question below.
-
-Q: "{user_question}"
-'''
-
-
-def parse_model_response(response_text: str) -> dict:
-    """
-    Parses the model's response and validates the expected JSON structure.
-    Returns a dictionary with 'sql', 'clarification', and 'explanation'.
-    If parsing fails, returns a default structure with an error message.
-    """
-    try:
-        parsed = json.loads(response_text)
-        assert "sql" in parsed and "clarification" in parsed and "explanation" in parsed
-        return parsed
-    except Exception as e:
-        return {
-            "sql": "",
-            "clarification": "The AI response was not in the expected format. Please rephrase your question.",
-            "explanation": f"Parsing error: {str(e)}"
-        }
-
-
-def sanitize_sql(sql: str) -> str:
-    """
-    Checks for unsafe SQL commands and appends LIMIT if missing.
-    Raises ValueError if unsafe commands are detected.
-    """
-    forbidden = ["DROP", "DELETE", "ALTER"]
-    if any(cmd in sql.upper() for cmd in forbidden):
-        raise ValueError("Unsafe SQL command detected.")
-    return sql
-
-
-def generate_sql(user_question: str) -> dict:
-    """
-    Sends the user's question to the LLM, parses the response,
-    validates and sanitizes the SQL query, and returns a structured result.
-    """
-    prompt = create_prompt(user_question)
-    messages = [{"role": "user", "content": prompt}]
-
-    response = requests.post(
-        f"{llama_3_70b_endpoint}/v1/chat/completions",
-        json={
-            "messages": messages,
-            "model": "Qwen/Qwen3-30B-A3B",
-            "max_tokens": 10000
-        },
-        headers={
-            "Content-Type": "application/json",
-            "x-api-key": llama_3_key
-        }
-    )
-
-    if response.status_code == 200:
-        raw_response = response.json()["choices"][0]["message"]["content"]
-        parsed = parse_model_response(raw_response)
-
-        try:
-            parsed["sql"] = sanitize_sql(parsed["sql"])
-        except ValueError as ve:
-            parsed["sql"] = ""
-            parsed["clarification"] = str(ve)
-            parsed["explanation"] = "Query rejected due to unsafe SQL."
-
-        return parsed
-    else:
-        return {
-            "sql": "",
-            "clarification": f"Failed to generate SQL. Status code: {response.status_code}",
-            "explanation": response.text
-        }
-
-def execute_sql(query: str):
-    """Execute SQL query and return results"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df, None
-    except Exception as e:
-        return None, str(e)
-
-
 def build_validation_prompt(user_question: str, generated_sql: str, schema_context: dict) -> str:
     """
     Create a detailed validation prompt for the LLM to check if the SQL query is valid.
@@ -693,14 +535,13 @@ def clarify_user_query(user_question: str) -> str:
     ### Clarified Question:
     """
 
-    response = requests.post(
+    response = get_http_session().post(
         f"{llama_3_70b_endpoint}/v1/chat/completions",
         json={
             "messages": [{"role": "user", "content": clarification_prompt}],
-            "model": "Qwen/Qwen3-30B-A3B",
+            "model": LLM_MODEL,
             "max_tokens": 1000
-        },
-        headers={"Content-Type": "application/json", "x-api-key": llama_3_key}
+        }
     )
 
     if response.status_code == 200:
@@ -716,7 +557,7 @@ def create_interactive_visualization(df: pd.DataFrame, chart_key: str = "main"):
         return
 
     # Get column information
-    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+    numeric_cols = df.select_dtypes(include="number").columns.tolist()
     categorical_cols = df.select_dtypes(include=['object', 'string']).columns.tolist()
     all_cols = df.columns.tolist()
 
@@ -795,6 +636,8 @@ def create_interactive_visualization(df: pd.DataFrame, chart_key: str = "main"):
 
     # Generate the chart based on selections
     try:
+        import plotly.express as px
+
         fig = None
 
         # Dark theme template for Plotly
@@ -963,7 +806,7 @@ def display_data_summary(df: pd.DataFrame):
         """, unsafe_allow_html=True)
 
     with col3:
-        numeric_cols = len(df.select_dtypes(include=[np.number]).columns)
+        numeric_cols = len(df.select_dtypes(include="number").columns)
         st.markdown(f"""
         <div class="metric-card">
             <div class="metric-value">{numeric_cols}</div>
@@ -1125,8 +968,6 @@ def create_typing_animation(text: str, key: str):
 
     placeholder.markdown(f"**{text}**")
 
-import streamlit as st
-
 # Assuming necessary functions like generate_sql, execute_sql, create_interactive_visualization, display_data_summary, etc. are defined elsewhere.
 
 def main():
@@ -0,0 +1,71 @@
+"""
+Intra-query parallelism for large aggregates over one SQLite file.
+
+An aggregate query partial_agg.plan() can decompose is split into rowid
+ranges of trades; each range runs as a partial aggregate on its own
+read-only connection in a worker process (partial_agg's pool) and the
+partials are merged. Tables smaller than PARALLEL_MIN_ROWS, or a pool of
+one worker, are left to SQLite on the calling thread.
+
+Each range reads its own snapshot. The ranges end at the highest rowid in
+the request's snapshot, so trades appended meanwhile are left out, but a
+trade the writer updates during the query may be seen by a range in its
+new state.
+
+Enabled by default; FX_PARALLEL=0 turns it off, FX_AGG_WORKERS sets the
+pool size.
+"""
+import os
+import sqlite3
+import threading
+
+import partial_agg
+
+# Below this many trades a query runs single-threaded
+PARALLEL_MIN_ROWS = int(os.environ.get("FX_PARALLEL_MIN_ROWS", "500000"))
+
+_worker_conns = {}
+_worker_lock = threading.Lock()
+
+
+def _connection(path: str):
+    """Read-only connection to the database, one per worker process"""
+    with _worker_lock:
+        conn = _worker_conns.get(path)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            _worker_conns[path] = conn
+        return conn
+
+
+def _run_range(args):
+    """Pool task: one rowid range's partial aggregates as (columns, rows)"""
+    path, sql = args
+    cursor = _connection(path).execute(sql)
+    return [d[0] for d in cursor.description], cursor.fetchall()
+
+
+def ranges(low: int, high: int, parts: int) -> list:
+    """Split the rowids low..high into at most parts contiguous (lo, hi) ranges"""
+    step = max(1, -(-(high - low + 1) // parts))
+    return [(lo, min(lo + step - 1, high)) for lo in range(low, high + 1, step)]
+
+
+def execute_parallel(query: str, conn):
+    """engine executor hook: answer a large aggregate query in parallel, or None"""
+    if partial_agg.WORKERS < 2:
+        return None
+    plan = partial_agg.plan(query)
+    if plan is None:
+        return None
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    if not path:
+        # In-memory or temporary database, not readable from other processes
+        return None
+    low, high = conn.execute("SELECT MIN(rowid), MAX(rowid) FROM trades").fetchone()
+    if low is None or high - low + 1 < PARALLEL_MIN_ROWS:
+        return None
+
+    tasks = [(path, partial_agg.partial_sql(plan, where=f"t.rowid BETWEEN {lo} AND {hi}"))
+             for lo, hi in ranges(low, high, partial_agg.WORKERS)]
+    return partial_agg.merge(plan, partial_agg.run_partials(_run_range, tasks))
@@ -0,0 +1,243 @@
+"""
+Partial aggregation: split an aggregate query into per-partition partials
+and merge them back into the query's result.
+
+Every query sql_shape.parse_aggregate() recognizes is decomposable unless
+it uses a DISTINCT aggregate: each partition runs partial_sql() (the
+query's filters, grouped by its dimensions, with AVG carried as a sum and
+a count) and merge() combines the partial rows and applies the query's
+ORDER BY, OFFSET and LIMIT. Used by sharding.py (one partition per shard
+file) and parallel.py (rowid ranges of one file).
+"""
+import multiprocessing
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from sql_shape import Agg, Dim, parse_aggregate, quote_identifier, quote_literal
+
+# query: the parsed AggregateQuery; dims: grouping expressions; aggs:
+# distinct aggregates needed by the select list and ORDER BY
+Plan = namedtuple("Plan", "query dims aggs")
+
+# Worker processes running partials (shards, rowid ranges) in parallel
+WORKERS = int(os.environ.get("FX_AGG_WORKERS", str(os.cpu_count() or 1)))
+
+_TABLE_ALIASES = {"trades": "t", "counterparties": "c"}
+_BUCKET_FORMATS = {"month": "%Y-%m", "year": "%Y"}
+
+
+def plan(sql: str):
+    """Plan for a query, or None when it is not decomposable"""
+    query = parse_aggregate(sql)
+    if query is None:
+        return None
+    aggs = []
+    for expr in [item.expr for item in query.items] + [key.expr for key in query.order_by]:
+        if isinstance(expr, Agg):
+            if expr.distinct:
+                return None
+            if expr not in aggs:
+                aggs.append(expr)
+        elif expr not in query.group_by:
+            # Ordering by an ungrouped column picks an arbitrary row's value
+            return None
+    return Plan(query, tuple(query.group_by), tuple(aggs))
+
+
+def _column(column) -> str:
+    return f"{_TABLE_ALIASES[column.table]}.{quote_identifier(column.name)}"
+
+
+def _dim(dim: Dim) -> str:
+    if dim.kind == "col":
+        return _column(dim.column)
+    return f"strftime('{_BUCKET_FORMATS[dim.kind]}', {_column(dim.column)})"
+
+
+def _partials(agg: Agg) -> list:
+    """SQL expressions computing an aggregate's partial state"""
+    if agg.column is None:
+        return ["count(*)"]
+    column = _column(agg.column)
+    if agg.func == "COUNT":
+        return [f"count({column})"]
+    if agg.func == "TOTAL":
+        return [f"total({column})"]
+    if agg.func in ("SUM", "AVG"):
+        return [f"total({column})" if agg.func == "AVG" else f"sum({column})", f"count({column})"]
+    return [f"{agg.func.lower()}({column})"]
+
+
+def partial_columns(p: Plan) -> list:
+    """Column names of partial_sql()'s result"""
+    columns = [f"g{i}" for i in range(len(p.dims))]
+    for i, agg in enumerate(p.aggs):
+        columns += [f"p{i}_{j}" for j in range(len(_partials(agg)))]
+    return columns
+
+
+def partial_sql(p: Plan, trades: str = "trades", counterparties: str = "counterparties", where: str = None) -> str:
+    """
+    SQL computing the partial aggregates over one partition. trades and
+    counterparties name the tables to read (e.g. "shard.trades"); where is
+    an extra condition on the partition (e.g. a rowid range).
+    """
+    query = p.query
+    expressions = [_dim(dim) for dim in p.dims] + [expr for agg in p.aggs for expr in _partials(agg)]
+    select = [f"{expr} AS {name}" for expr, name in zip(expressions, partial_columns(p))]
+
+    sql = f"SELECT {', '.join(select)} FROM {trades} t"
+    if query.join:
+        sql += f" JOIN {counterparties} c ON c.cp_id = t.cp_id"
+    conditions = []
+    for pred in query.predicates:
+        target = _dim(pred.target)
+        if pred.op in ("IN", "NOT IN"):
+            conditions.append(f"{target} {pred.op} ({', '.join(quote_literal(v) for v in pred.values)})")
+        else:
+            conditions.append(f"{target} {pred.op} {quote_literal(pred.values[0])}")
+    if where:
+        conditions.append(f"({where})")
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    if p.dims:
+        sql += " GROUP BY " + ", ".join(f"g{i}" for i in range(len(p.dims)))
+    return sql
+
+
+def sort_order(sort_keys: list, n: int):
+    """
+    Row order for ORDER BY keys given as (values, desc) pairs, with NULLs
+    first ascending and last descending as in SQLite
+    """
+    import pandas as pd
+
+    if not sort_keys or not n:
+        return np.arange(n)
+    lex = []
+    for column, desc in reversed(sort_keys):
+        codes, _ = pd.factorize(column, sort=True, use_na_sentinel=True)
+        lex.append(-codes if desc else codes)
+    return np.lexsort(lex)
+
+
+def combine(p: Plan, frames: list):
+    """
+    Partial results of several partitions folded into one partial frame
+    (one row per group), e.g. to keep a running state as partitions arrive
+    """
+    import pandas as pd
+
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        return pd.DataFrame(columns=partial_columns(p))
+    partial = pd.concat(frames, ignore_index=True) if len(frames) != 1 else frames[0]
+    group_columns = [f"g{i}" for i in range(len(p.dims))]
+    grouped = partial.groupby(group_columns, dropna=False, sort=False) if group_columns else None
+
+    columns = {}
+    for i, agg in enumerate(p.aggs):
+        how = agg.func.lower() if agg.func in ("MIN", "MAX") and agg.column is not None else "sum"
+        for j in range(len(_partials(agg))):
+            name = f"p{i}_{j}"
+            kwargs = {"min_count": 1} if how == "sum" else {}
+            if grouped is not None:
+                columns[name] = getattr(grouped[name], how)(**kwargs)
+            else:
+                columns[name] = pd.Series([getattr(partial[name], how)(**kwargs)])
+    if grouped is None:
+        return pd.DataFrame(columns)
+    return pd.DataFrame(columns).reset_index()[partial_columns(p)]
+
+
+def merge(p: Plan, frames: list):
+    """The query's result from the partial results of every partition (possibly none)"""
+    import pandas as pd
+
+    query = p.query
+    if not frames:
+        frames = [pd.DataFrame(columns=partial_columns(p))]
+    partial = pd.concat(frames, ignore_index=True) if len(frames) != 1 else frames[0]
+    group_columns = [f"g{i}" for i in range(len(p.dims))]
+
+    # Combine the partial state per group
+    combined = {}
+    if group_columns:
+        grouped = partial.groupby(group_columns, dropna=False, sort=False)
+        keys = grouped.size().index.to_frame(index=False)
+    else:
+        grouped = None
+        keys = pd.DataFrame(index=[0])
+
+    def fold(column: str, how: str):
+        if grouped is not None:
+            series = getattr(grouped[column], how)(**({"min_count": 1} if how == "sum" else {}))
+            return series.reset_index(drop=True)
+        values = partial[column]
+        result = values.sum(min_count=1) if how == "sum" else getattr(values, how)()
+        return pd.Series([result])
+
+    for i, agg in enumerate(p.aggs):
+        if agg.column is None or agg.func == "COUNT":
+            combined[agg] = fold(f"p{i}_0", "sum").fillna(0).astype("int64")
+        elif agg.func == "TOTAL":
+            # 0.0, not NULL, over no rows
+            combined[agg] = fold(f"p{i}_0", "sum").fillna(0.0).astype("float64")
+        elif agg.func in ("SUM", "AVG"):
+            sums = fold(f"p{i}_0", "sum")
+            counts = fold(f"p{i}_1", "sum").fillna(0)
+            final = sums if agg.func == "SUM" else sums / counts.where(counts > 0)
+            combined[agg] = final.where(counts > 0)
+        else:
+            combined[agg] = fold(f"p{i}_0", agg.func.lower())
+
+    def values(expr):
+        if isinstance(expr, Agg):
+            return combined[expr]
+        return keys[f"g{p.dims.index(expr)}"]
+
+    # ORDER BY, or group key order as SQLite emits groups when it sorts to group
+    sort_keys = [(values(key.expr if key.item is None else query.items[key.item].expr), key.desc)
+                 for key in query.order_by]
+    if not sort_keys and p.dims:
+        sort_keys = [(values(dim), False) for dim in p.dims]
+    order = sort_order(sort_keys, len(keys))
+    if query.offset:
+        order = order[query.offset:]
+    if query.limit is not None and query.limit >= 0:
+        order = order[:query.limit]
+
+    result = pd.DataFrame({i: values(item.expr).to_numpy()[order] for i, item in enumerate(query.items)})
+    result.columns = [item.name for item in query.items]
+    return result
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Process pool shared by every partitioned query (spawned, so safe under threads)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def run_partials(task, args: list) -> list:
+    """
+    Run task(arg) -> (columns, rows) for every partition, on the worker
+    pool when there is more than one, and return the partials as frames
+    """
+    import pandas as pd
+
+    if len(args) > 1 and WORKERS > 1:
+        results = list(get_pool().map(task, args))
+    else:
+        results = [task(arg) for arg in args]
+    return [pd.DataFrame.from_records(rows, columns=columns) for columns, rows in results]
@@ -0,0 +1,626 @@
+"""
+Date-partitioned sharding of trades across SQLite files.
+
+A sharded database is a catalog file (counterparties, the date dimension,
+FX fixings and the trade_shards table listing the shards) next to one
+trades file per near_dt period:
+
+    python sharding.py split --db fx_trades.db --out shards
+    python sharding.py list --catalog shards/catalog.db
+    python sharding.py archive --catalog shards/catalog.db --before 2024-01 --to archive
+
+Run the app against it with FX_DB_PATH=shards/catalog.db FX_SHARDED=1.
+Queries only touch the shards their near_dt predicates can match.
+Aggregate queries run as partial aggregates per shard in a process pool
+and are merged (partial_agg.py); any other query runs over a UNION ALL
+view of the matching shards attached to one connection, or over a temp
+table filled from them a batch at a time when there are more shards
+than SQLite can attach. Each period is
+its own file, so periods are written independently and old ones can be
+archived (dropped from every query) or restored by moving files.
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import threading
+from collections import namedtuple
+from contextlib import closing
+
+import calendars
+import fx_rates
+from sql_shape import SCHEMA_COLUMNS, tokenize
+
+CATALOG_TABLE = "trade_shards"
+# Length of the near_dt prefix naming a shard's period
+PERIODS = {"month": 7, "year": 4}
+# Shards one connection can attach
+with closing(sqlite3.connect(":memory:")) as _conn:
+    ATTACH_LIMIT = _conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+
+Shard = namedtuple("Shard", "period path min_date max_date rows")
+
+_CATALOG_SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS {CATALOG_TABLE} (
+        period TEXT PRIMARY KEY,
+        path TEXT NOT NULL,          -- relative to the catalog's directory
+        min_date TEXT,
+        max_date TEXT,
+        rows INTEGER NOT NULL DEFAULT 0,
+        archived INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+
+def _trades_ddl(conn) -> str:
+    return conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'trades'").fetchone()[0]
+
+
+def _insert_columns(conn) -> str:
+    """trades columns that take values (table_info leaves out generated ones such as near_day)"""
+    return ", ".join(row[1] for row in conn.execute("PRAGMA table_info(trades)"))
+
+
+def _shard_file(period: str) -> str:
+    return f"trades_{period.replace('-', '_') or 'undated'}.db"
+
+
+def _resolve(catalog: str, path: str) -> str:
+    return path if os.path.isabs(path) else os.path.join(os.path.dirname(os.path.abspath(catalog)), path)
+
+
+def _refresh_stats(catalog_conn, catalog: str, period: str):
+    path = _resolve(catalog, catalog_conn.execute(
+        f"SELECT path FROM {CATALOG_TABLE} WHERE period = ?", (period,)).fetchone()[0])
+    shard = sqlite3.connect(path)
+    try:
+        min_date, max_date, rows = shard.execute("SELECT MIN(near_dt), MAX(near_dt), COUNT(*) FROM trades").fetchone()
+    finally:
+        shard.close()
+    catalog_conn.execute(f"UPDATE {CATALOG_TABLE} SET min_date = ?, max_date = ?, rows = ? WHERE period = ?",
+                         (min_date, max_date, rows, period))
+
+
+def split(db: str, out_dir: str, period: str = "month") -> str:
+    """
+    Copy a database's trades into one shard file per near_dt period under
+    out_dir, with a catalog holding the counterparties, calendar and
+    fixing tables.
+    Returns the catalog path; the source database is left unchanged.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    catalog = os.path.join(out_dir, "catalog.db")
+    if os.path.exists(catalog):
+        raise FileExistsError(f"{catalog} already exists")
+    width = PERIODS[period]
+
+    source = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+    trades_ddl = _trades_ddl(source)
+    columns = _insert_columns(source)
+    cp_ddl = source.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'counterparties'").fetchone()[0]
+    periods = [row[0] or "" for row in source.execute(
+        f"SELECT DISTINCT substr(near_dt, 1, {width}) FROM trades ORDER BY 1")]
+    # Date dimension, holiday calendars (calendars.py) and fixings (fx_rates.py), tables before their indexes
+    catalog_tables = calendars.TABLES + fx_rates.TABLES
+    calendar_ddl = source.execute(
+        f"SELECT type, name, sql FROM sqlite_master WHERE tbl_name IN ({', '.join('?' * len(catalog_tables))}) "
+        "AND sql IS NOT NULL ORDER BY type = 'index'", catalog_tables).fetchall()
+    source.close()
+
+    conn = sqlite3.connect(catalog)
+    with conn:
+        conn.execute(cp_ddl)
+        conn.execute("ATTACH DATABASE ? AS src", (db,))
+        conn.execute("INSERT INTO counterparties SELECT * FROM src.counterparties")
+        for kind, name, sql in calendar_ddl:
+            conn.execute(sql)
+            if kind == "table":
+                conn.execute(f"INSERT INTO {name} SELECT * FROM src.{name}")
+        conn.execute(_CATALOG_SCHEMA)
+    for key in periods:
+        path = _shard_file(key)
+        shard = sqlite3.connect(os.path.join(out_dir, path))
+        with shard:
+            shard.execute(trades_ddl)
+            shard.execute("ATTACH DATABASE ? AS src", (db,))
+            if key:
+                shard.execute(f"INSERT INTO trades ({columns}) SELECT {columns} FROM src.trades "
+                              f"WHERE substr(near_dt, 1, {width}) = ?", (key,))
+            else:
+                shard.execute(f"INSERT INTO trades ({columns}) SELECT {columns} FROM src.trades "
+                              "WHERE near_dt IS NULL OR near_dt = ''")
+        shard.close()
+        with conn:
+            conn.execute(f"INSERT INTO {CATALOG_TABLE} (period, path) VALUES (?, ?)", (key, path))
+            _refresh_stats(conn, catalog, key)
+    conn.execute("DETACH DATABASE src")
+    conn.close()
+    return catalog
+
+
+def append_trades(catalog: str, rows: list, period: str = "month") -> int:
+    """
+    Insert (or replace) trade rows (ingest.TRADE_COLUMNS, optionally
+    followed by notl_usd) into the shards of their periods, creating shards
+    as needed. Rows without notl_usd are priced at the catalog's fixings.
+    Returns the number of rows written.
+    """
+    width = PERIODS[period]
+    by_period = {}
+    for row in rows:
+        by_period.setdefault((row[5] or "")[:width], []).append(row)
+
+    conn = sqlite3.connect(catalog, timeout=30)
+    try:
+        known = dict(conn.execute(f"SELECT period, path FROM {CATALOG_TABLE}"))
+        template = None
+        converter = None
+        for key, batch in by_period.items():
+            path = known.get(key)
+            if path is None:
+                if template is None:
+                    any_path = next(iter(known.values()), None)
+                    template = _trades_ddl(sqlite3.connect(_resolve(catalog, any_path))) if any_path else None
+                    if template is None:
+                        raise ValueError("catalog has no shard to copy the trades schema from")
+                path = _shard_file(key)
+                shard = sqlite3.connect(_resolve(catalog, path))
+                shard.execute(template)
+                shard.close()
+                with conn:
+                    conn.execute(f"INSERT INTO {CATALOG_TABLE} (period, path) VALUES (?, ?)", (key, path))
+                known[key] = path
+            shard = sqlite3.connect(_resolve(catalog, path), timeout=30)
+            columns = _insert_columns(shard).split(", ")
+            if fx_rates.USD_COLUMN in columns and len(batch[0]) < len(columns):
+                if converter is None:
+                    converter = fx_rates.Converter.load(conn)
+                batch = [tuple(row) + (usd,) for row, usd in zip(batch, converter.convert_trades(batch))]
+            with shard:
+                shard.executemany(f"INSERT OR REPLACE INTO trades ({', '.join(columns[:len(batch[0])])}) "
+                                  f"VALUES ({', '.join('?' * len(batch[0]))})", batch)
+            shard.close()
+            with conn:
+                # Also bumps the catalog's data_version, invalidating cached results
+                _refresh_stats(conn, catalog, key)
+    finally:
+        conn.close()
+    return sum(len(batch) for batch in by_period.values())
+
+
+def is_catalog(conn) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                        (CATALOG_TABLE,)).fetchone() is not None
+
+
+def shards(conn, catalog: str) -> list:
+    """Active (not archived) shards of a catalog, oldest first"""
+    return [Shard(period, _resolve(catalog, path), min_date, max_date, rows)
+            for period, path, min_date, max_date, rows in conn.execute(
+                f"SELECT period, path, min_date, max_date, rows FROM {CATALOG_TABLE} "
+                "WHERE archived = 0 ORDER BY period")]
+
+
+_DATE_FUNCTIONS = {"DATE", "DATETIME", "STRFTIME"}
+
+
+def _constant(sql: str, tokens: list, i: int):
+    """
+    Text value of the constant starting at tokens[i] (a string literal or a
+    date()/datetime()/strftime() call on literals) and the index after it,
+    or (None, i) when there is none.
+    """
+    if i < len(tokens) and tokens[i].kind == "str":
+        return tokens[i].value, i + 1
+    if i + 1 >= len(tokens) or tokens[i].kind != "ident" or tokens[i].value.upper() not in _DATE_FUNCTIONS \
+            or tokens[i + 1].value != "(":
+        return None, i
+    j = i + 2
+    while j < len(tokens) and tokens[j].value != ")":
+        if tokens[j].kind not in ("str", "num") and tokens[j].value not in (",", "+", "-"):
+            return None, i
+        j += 1
+    if j == len(tokens):
+        return None, i
+    with closing(sqlite3.connect(":memory:")) as conn:
+        value = conn.execute(f"SELECT {sql[tokens[i].start:tokens[j].end]}").fetchone()[0]
+    return (value, j + 1) if isinstance(value, str) else (None, i)
+
+
+def date_bounds(sql: str):
+    """
+    (low, high) near_dt bounds implied by the query's top-level WHERE, either
+    side None when unbounded. Only comparisons and BETWEEN on near_dt against
+    text constants count (literals or date('now', ...) style calls) between
+    the WHERE and the next GROUP BY, HAVING, ORDER BY or LIMIT; any OR or
+    NOT, a CASE in the WHERE or a compound query disables pruning.
+    """
+    try:
+        tokens = tokenize(sql)
+    except ValueError:
+        return None, None
+    if any(t.kind == "ident" and t.value.upper() in ("OR", "NOT") for t in tokens):
+        return None, None
+
+    # Extent of the depth-0 WHERE clause
+    start = end = None
+    depth = 0
+    for i, token in enumerate(tokens):
+        if token.kind == "op" and token.value in "()":
+            depth += 1 if token.value == "(" else -1
+            continue
+        keyword = token.value.upper() if token.kind == "ident" else None
+        if depth or keyword is None:
+            continue
+        if keyword in ("UNION", "INTERSECT", "EXCEPT"):
+            return None, None
+        if keyword == "WHERE" and start is None:
+            start = i + 1
+        elif keyword in ("GROUP", "HAVING", "ORDER", "LIMIT", "WINDOW") and start is not None and end is None:
+            end = i
+    if start is None:
+        return None, None
+    where = tokens[start:end]
+    if any(t.kind == "ident" and t.value.upper() == "CASE" for t in where):
+        return None, None
+
+    low = high = None
+    depth = 0
+    for i in range(start, len(tokens) if end is None else end):
+        token = tokens[i]
+        if token.kind == "op" and token.value in "()":
+            depth += 1 if token.value == "(" else -1
+            continue
+        if depth or token.kind not in ("ident", "quoted") or token.value.lower() != "near_dt":
+            continue
+        if i > 1 and tokens[i - 1].value == "." and tokens[i - 2].value.lower() not in ("t", "trades"):
+            continue
+        following = tokens[i + 1] if i + 1 < len(tokens) else None
+        if following is None:
+            continue
+        bounds = []
+        if following.kind == "ident" and following.value.upper() == "BETWEEN":
+            first, j = _constant(sql, tokens, i + 2)
+            if first is not None and j < len(tokens) and tokens[j].value.upper() == "AND":
+                second, _ = _constant(sql, tokens, j + 1)
+                if second is not None:
+                    bounds = [(">=", first), ("<=", second)]
+        elif following.kind == "op":
+            value, _ = _constant(sql, tokens, i + 2)
+            if value is not None:
+                bounds = [(following.value, value)]
+        for op, value in bounds:
+            if op in ("=", "==", ">", ">="):
+                low = value if low is None else max(low, value)
+            if op in ("=", "==", "<", "<="):
+                high = value if high is None else min(high, value)
+    return low, high
+
+
+# Words that can follow a table name where an alias would otherwise be
+_NOT_ALIASES = {"WHERE", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "CROSS", "NATURAL", "ON", "USING", "GROUP",
+                "HAVING", "ORDER", "LIMIT", "WINDOW", "UNION", "INTERSECT", "EXCEPT", "INDEXED", "NOT"}
+
+
+def _trades_references(tokens: list) -> list:
+    """(token index, depth) of every reference to the trades table"""
+    references = []
+    depth = 0
+    for i, token in enumerate(tokens):
+        if token.kind == "op" and token.value in "()":
+            depth += 1 if token.value == "(" else -1
+            continue
+        if token.kind not in ("ident", "quoted") or token.value.lower() != "trades" or not i:
+            continue
+        before = tokens[i - 1]
+        if before.value.upper() in ("FROM", "JOIN") or before.value == ",":
+            references.append((i, depth))
+    return references
+
+
+def outer_scope(sql: str):
+    """
+    How far the near_dt bounds of date_bounds() reach: "all" when the
+    statement reads trades once with no subquery or CTE, the index of the
+    token naming trades in the outer FROM when only that reference is
+    bounded, or None (no pruning)
+    """
+    try:
+        tokens = tokenize(sql)
+    except ValueError:
+        return None
+    references = _trades_references(tokens)
+    selects = sum(1 for t in tokens if t.kind == "ident" and t.value.upper() == "SELECT")
+    nested = selects > 1 or any(t.kind == "ident" and t.value.upper() == "WITH" for t in tokens)
+    if len(references) == 1 and not nested:
+        return "all"
+    outer = [i for i, depth in references if depth == 0]
+    return outer[0] if len(outer) == 1 else None
+
+
+def _rename_outer(sql: str, index: int, name: str) -> str:
+    """sql with the outer trades reference (token index) reading name instead, under the same alias"""
+    tokens = tokenize(sql)
+    token = tokens[index]
+    following = tokens[index + 1] if index + 1 < len(tokens) else None
+    aliased = following is not None and following.kind == "ident" and (
+        following.value.upper() == "AS" or following.value.upper() not in _NOT_ALIASES)
+    return sql[:token.start] + (name if aliased else f"{name} AS trades") + sql[token.end:]
+
+
+def prune(candidates: list, low, high) -> list:
+    """Shards whose near_dt range can overlap [low, high]"""
+    return [s for s in candidates
+            if s.min_date is None
+            or not ((low is not None and s.max_date < low) or (high is not None and s.min_date > high))]
+
+
+# -- execution ------------------------------------------------------------
+
+_worker_conns = {}
+_worker_lock = threading.Lock()
+
+
+def _shard_connection(path: str, catalog: str):
+    """Read-only connection to a shard with the catalog attached as cat"""
+    with _worker_lock:
+        conn = _worker_conns.get(path)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            conn.execute("ATTACH DATABASE ? AS cat", (f"file:{catalog}?mode=ro",))
+            _worker_conns[path] = conn
+        return conn
+
+
+def _run_partial(args):
+    """Pool task: one shard's partial aggregates as (columns, rows)"""
+    path, catalog, sql = args
+    conn = _shard_connection(path, catalog)
+    cursor = conn.execute(sql)
+    return [d[0] for d in cursor.description], cursor.fetchall()
+
+
+def _union_view(name: str, schemas: list) -> str:
+    selects = [f"SELECT * FROM {schema}.trades" for schema in schemas]
+    if not selects:
+        selects = ["SELECT " + ", ".join(f"NULL AS {c}" for c in SCHEMA_COLUMNS["trades"]) + " WHERE 0"]
+    return f"CREATE TEMP VIEW {name} AS {' UNION ALL '.join(selects)}"
+
+
+def _materialize(conn, name: str, targets: list):
+    """Copy the trades of the given shards into a temp table, attaching them a batch at a time"""
+    for start in range(0, len(targets), ATTACH_LIMIT):
+        batch = targets[start:start + ATTACH_LIMIT]
+        for i, shard in enumerate(batch):
+            conn.execute(f"ATTACH DATABASE ? AS s{i}", (f"file:{shard.path}?mode=ro",))
+        if not start:
+            conn.execute(f"CREATE TEMP TABLE {name} AS SELECT * FROM s0.trades WHERE 0")
+        for i in range(len(batch)):
+            conn.execute(f"INSERT INTO temp.{name} SELECT * FROM s{i}.trades")
+        conn.commit()
+        for i in range(len(batch)):
+            conn.execute(f"DETACH DATABASE s{i}")
+
+
+def _union_query(sql: str, catalog: str, targets: list, outer=None):
+    """
+    Run any query with trades reading the given shards: a UNION ALL view
+    when they can all be attached at once, otherwise a temp table filled
+    a batch of shards at a time. outer, as (token index, shards), points
+    the outer FROM's trades at only those shards while other references
+    read every target.
+    """
+    import pandas as pd
+
+    conn = sqlite3.connect(f"file:{catalog}?mode=ro", uri=True)
+    fx_rates.register(conn, catalog)
+    try:
+        tables = [("trades", targets)]
+        if outer is not None:
+            index, bounded = outer
+            tables.append(("trades_outer", bounded))
+            sql = _rename_outer(sql, index, "trades_outer")
+        if len(targets) <= ATTACH_LIMIT:
+            schemas = {}
+            for i, shard in enumerate(targets):
+                conn.execute(f"ATTACH DATABASE ? AS s{i}", (f"file:{shard.path}?mode=ro",))
+                schemas[shard.path] = f"s{i}"
+            for name, members in tables:
+                conn.execute(_union_view(name, [schemas[shard.path] for shard in members]))
+        else:
+            for name, members in tables:
+                _materialize(conn, name, members)
+        return pd.read_sql_query(sql, conn)
+    finally:
+        conn.close()
+
+
+def _row_local(sql: str):
+    """
+    For a query whose rows each come from one trade (no aggregates,
+    grouping, DISTINCT or compound parts), its ORDER BY keys as (output
+    column name or 1-based ordinal, desc) and its LIMIT. The query's result
+    over many shards is then the re-sorted, re-limited union of its results
+    over groups of shards. Returns None for any other query or when the
+    ORDER BY keys are not plain output columns.
+    """
+    from sql_shape import AGG_FUNCS, number
+
+    tokens = tokenize(sql)
+    while tokens and tokens[-1].value == ";":
+        tokens.pop()
+    if not tokens or tokens[0].value.upper() != "SELECT" or \
+            (len(tokens) > 1 and tokens[1].value.upper() in ("DISTINCT", "ALL")):
+        return None
+    for i, token in enumerate(tokens):
+        word = token.value.upper() if token.kind == "ident" else None
+        if word in ("GROUP", "HAVING", "UNION", "INTERSECT", "EXCEPT", "OVER", "WINDOW", "OFFSET"):
+            return None
+        if word in AGG_FUNCS and i + 1 < len(tokens) and tokens[i + 1].value == "(":
+            return None
+
+    depth = 0
+    order_at = limit_at = None
+    for i, token in enumerate(tokens):
+        if token.kind == "op" and token.value in "()":
+            depth += 1 if token.value == "(" else -1
+        elif depth == 0 and token.kind == "ident" and token.value.upper() == "ORDER":
+            order_at = i
+        elif depth == 0 and token.kind == "ident" and token.value.upper() == "LIMIT":
+            limit_at = i
+
+    limit = None
+    if limit_at is not None:
+        rest = tokens[limit_at + 1:]
+        if len(rest) != 1 or rest[0].kind != "num":
+            return None
+        limit = number(rest[0].value)
+
+    keys = []
+    if order_at is not None:
+        i = order_at + 2
+        end = limit_at if limit_at is not None else len(tokens)
+        while i < end:
+            if i + 2 < end and tokens[i + 1].value == ".":
+                # t.notl: the output column named after it
+                i += 2
+            token = tokens[i]
+            if token.kind not in ("ident", "quoted", "num"):
+                return None
+            key = number(token.value) if token.kind == "num" else token.value
+            i += 1
+            desc = False
+            if i < end and tokens[i].kind == "ident" and tokens[i].value.upper() in ("ASC", "DESC"):
+                desc = tokens[i].value.upper() == "DESC"
+                i += 1
+            keys.append((key, desc))
+            if i < end:
+                if tokens[i].value != ",":
+                    return None
+                i += 1
+    return keys, limit
+
+
+def _batched_query(sql: str, catalog: str, targets: list, batch: int):
+    """
+    A row-local query over more shards than one connection can attach, run
+    per batch of shards; None when the query is not row-local or orders by
+    something other than an output column
+    """
+    import pandas as pd
+
+    import partial_agg
+
+    shape = _row_local(sql)
+    if shape is None:
+        return None
+    keys, limit = shape
+    frames = [_union_query(sql, catalog, targets[i:i + batch]) for i in range(0, len(targets), batch)]
+    df = pd.concat(frames, ignore_index=True)
+    if keys:
+        columns = {name.lower(): name for name in df.columns}
+        sort_keys = []
+        for key, desc in keys:
+            if isinstance(key, int):
+                name = df.columns[key - 1] if 0 < key <= len(df.columns) else None
+            else:
+                name = columns.get(key.lower())
+            if name is None:
+                return None
+            sort_keys.append((df[name], desc))
+        df = df.iloc[partial_agg.sort_order(sort_keys, len(df))].reset_index(drop=True)
+    if limit is not None and limit >= 0:
+        df = df.iloc[:limit]
+    return df
+
+
+def execute(sql: str, catalog: str, conn=None):
+    """Answer a query over a sharded database as a DataFrame"""
+    import partial_agg
+
+    own = conn is None
+    if own:
+        conn = sqlite3.connect(f"file:{catalog}?mode=ro", uri=True)
+    try:
+        candidates = shards(conn, catalog)
+    finally:
+        if own:
+            conn.close()
+    # The outer WHERE bounds only the outer reference to trades; subqueries and CTEs read every shard
+    scope = outer_scope(sql)
+    bounded = prune(candidates, *date_bounds(sql)) if scope is not None else candidates
+    targets = bounded if scope == "all" else candidates
+
+    plan = partial_agg.plan(sql)
+    if plan is None:
+        outer = (scope, bounded) if isinstance(scope, int) and len(bounded) < len(candidates) else None
+        if len(targets) > ATTACH_LIMIT and scope == "all":
+            df = _batched_query(sql, catalog, targets, ATTACH_LIMIT)
+            if df is not None:
+                return df
+        return _union_query(sql, catalog, targets, outer)
+
+    partial = partial_agg.partial_sql(plan, counterparties="cat.counterparties")
+    tasks = [(shard.path, catalog, partial) for shard in targets]
+    return partial_agg.merge(plan, partial_agg.run_partials(_run_partial, tasks))
+
+
+def execute_sharded(query: str, conn):
+    """engine executor hook: answer the query when connected to a shard catalog"""
+    if not is_catalog(conn):
+        return None
+    catalog = conn.execute("PRAGMA database_list").fetchone()[2]
+    return execute(query, catalog, conn)
+
+
+def archive(catalog: str, before: str, dest: str) -> list:
+    """Move shards of periods before `before` to dest and leave them out of queries"""
+    os.makedirs(dest, exist_ok=True)
+    conn = sqlite3.connect(catalog)
+    moved = []
+    try:
+        rows = conn.execute(f"SELECT period, path FROM {CATALOG_TABLE} WHERE archived = 0 AND period < ? "
+                            "AND period != ''", (before,)).fetchall()
+        for period, path in rows:
+            target = os.path.abspath(os.path.join(dest, os.path.basename(path)))
+            shutil.move(_resolve(catalog, path), target)
+            with conn:
+                conn.execute(f"UPDATE {CATALOG_TABLE} SET archived = 1, path = ? WHERE period = ?", (target, period))
+            moved.append(period)
+    finally:
+        conn.close()
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage date-partitioned trade shards")
+    sub = parser.add_subparsers(dest="command", required=True)
+    split_cmd = sub.add_parser("split", help="shard an existing database")
+    split_cmd.add_argument("--db", default="fx_trades.db")
+    split_cmd.add_argument("--out", default="shards")
+    split_cmd.add_argument("--period", choices=list(PERIODS), default="month")
+    list_cmd = sub.add_parser("list", help="show the catalog")
+    list_cmd.add_argument("--catalog", default="shards/catalog.db")
+    archive_cmd = sub.add_parser("archive", help="archive shards before a period")
+    archive_cmd.add_argument("--catalog", default="shards/catalog.db")
+    archive_cmd.add_argument("--before", required=True, help="period, e.g. 2024-01")
+    archive_cmd.add_argument("--to", default="archive")
+    args = parser.parse_args()
+
+    if args.command == "split":
+        catalog = split(args.db, args.out, args.period)
+        print(f"✅ Sharded {args.db} into {catalog}")
+    elif args.command == "list":
+        conn = sqlite3.connect(args.catalog)
+        for period, path, min_date, max_date, rows, archived in conn.execute(
+                f"SELECT period, path, min_date, max_date, rows, archived FROM {CATALOG_TABLE} ORDER BY period"):
+            print(f"{period or '(undated)':<10} {rows:>10,} rows  {min_date} .. {max_date}  "
+                  f"{path}{'  [archived]' if archived else ''}")
+        conn.close()
+    else:
+        moved = archive(args.catalog, args.before, args.to)
+        print(f"✅ Archived {len(moved)} shard(s): {', '.join(moved) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,478 @@
+"""
+Tokenizer and shape parser for generated SQL.
+
+The LLM produces a small family of queries over trades/counterparties:
+filters on a few columns, GROUP BY one or two dimensions and SUM/AVG/COUNT/
+MIN/MAX of notional or rate. parse_aggregate() recognizes that family and
+returns a structured AggregateQuery, or None for anything else, so callers
+(summary-table router, columnar engine, ...) can decide whether they are
+able to answer a query or must hand it to SQLite unchanged.
+"""
+from collections import namedtuple
+
+Token = namedtuple("Token", "kind value start end")
+
+# Column reference resolved to its base table
+Column = namedtuple("Column", "table name")
+# Grouping/filter expression: a plain column or a date bucket of a column
+Dim = namedtuple("Dim", "kind column")
+# Aggregate function over a column (column is None for COUNT(*))
+Agg = namedtuple("Agg", "func column distinct")
+# One SELECT list entry; name is the output column name SQLite would use
+Item = namedtuple("Item", "expr name")
+# WHERE conjunct: target is a Dim, values a tuple of literals
+Pred = namedtuple("Pred", "target op values")
+# ORDER BY key: index into items when it refers to one, else the expression
+OrderKey = namedtuple("OrderKey", "item expr desc")
+AggregateQuery = namedtuple("AggregateQuery", "items tables join predicates group_by order_by limit offset")
+
+SCHEMA_COLUMNS = {
+    "trades": ("trade_id", "cp_id", "px_type", "notl", "ccy_pair", "near_dt", "far_dt", "rate",
+               # Generated day numbers (calendars.py)
+               "near_day", "far_day",
+               # USD notional (fx_rates.py)
+               "notl_usd"),
+    "counterparties": ("cp_id", "cp_name", "region"),
+}
+
+AGG_FUNCS = {"SUM", "AVG", "COUNT", "MIN", "MAX", "TOTAL"}
+COMPARISONS = {"=", "==", "!=", "<>", "<", "<=", ">", ">="}
+
+# Date bucket expressions the LLM uses, keyed by (function, pattern args)
+_STRFTIME_BUCKETS = {"%Y-%m": "month", "%Y": "year"}
+_SUBSTR_BUCKETS = {(1, 7): "month", (1, 4): "year"}
+
+_TWO_CHAR_OPS = {"<=", ">=", "<>", "!=", "==", "||"}
+_ONE_CHAR_OPS = set("(),.*=<>+-/;%")
+
+
+def tokenize(sql: str) -> list:
+    """
+    Split SQL into tokens of kind 'ident', 'quoted' (quoted identifier),
+    'str', 'num', 'op' or 'param'. Comments and whitespace are dropped.
+    Raises ValueError on characters it does not understand.
+    """
+    tokens = []
+    i, n = 0, len(sql)
+    while i < n:
+        c = sql[i]
+        if c.isspace():
+            i += 1
+        elif sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = n if end == -1 else end + 1
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+        elif c == "'":
+            j = i + 1
+            while True:
+                j = sql.find("'", j)
+                if j == -1:
+                    raise ValueError("Unterminated string literal")
+                if j + 1 < n and sql[j + 1] == "'":
+                    j += 2
+                    continue
+                break
+            tokens.append(Token("str", sql[i + 1:j].replace("''", "'"), i, j + 1))
+            i = j + 1
+        elif c in "\"`[":
+            close = "]" if c == "[" else c
+            j = sql.find(close, i + 1)
+            if j == -1:
+                raise ValueError("Unterminated quoted identifier")
+            tokens.append(Token("quoted", sql[i + 1:j], i, j + 1))
+            i = j + 1
+        elif c.isdigit() or (c == "." and i + 1 < n and sql[i + 1].isdigit()):
+            j = i
+            while j < n and (sql[j].isdigit() or sql[j] in "._"):
+                j += 1
+            if j < n and sql[j] in "eE":
+                k = j + 1
+                if k < n and sql[k] in "+-":
+                    k += 1
+                if k < n and sql[k].isdigit():
+                    j = k
+                    while j < n and sql[j].isdigit():
+                        j += 1
+            tokens.append(Token("num", sql[i:j], i, j))
+            i = j
+        elif c.isalpha() or c == "_":
+            j = i
+            while j < n and (sql[j].isalnum() or sql[j] in "_$"):
+                j += 1
+            tokens.append(Token("ident", sql[i:j], i, j))
+            i = j
+        elif c in "?:@$":
+            j = i + 1
+            while j < n and (sql[j].isalnum() or sql[j] == "_"):
+                j += 1
+            tokens.append(Token("param", sql[i:j], i, j))
+            i = j
+        elif sql[i:i + 2] in _TWO_CHAR_OPS:
+            tokens.append(Token("op", sql[i:i + 2], i, i + 2))
+            i += 2
+        elif c in _ONE_CHAR_OPS:
+            tokens.append(Token("op", c, i, i + 1))
+            i += 1
+        else:
+            raise ValueError(f"Unexpected character {c!r} in SQL")
+    return tokens
+
+
+def number(text: str):
+    """Convert a numeric literal token to int or float"""
+    text = text.replace("_", "")
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+class _Unsupported(Exception):
+    """Raised internally when a query falls outside the recognized family"""
+
+
+class _Parser:
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.tokens = tokenize(sql)
+        self.pos = 0
+        self.aliases = {}
+
+    # -- token helpers -------------------------------------------------
+    def peek(self, offset: int = 0):
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else None
+
+    def next(self):
+        tok = self.peek()
+        if tok is None:
+            raise _Unsupported("unexpected end of query")
+        self.pos += 1
+        return tok
+
+    def is_keyword(self, *words, offset: int = 0) -> bool:
+        tok = self.peek(offset)
+        return tok is not None and tok.kind == "ident" and tok.value.upper() in words
+
+    def accept_keyword(self, *words) -> bool:
+        if self.is_keyword(*words):
+            self.pos += 1
+            return True
+        return False
+
+    def expect_keyword(self, word: str):
+        if not self.accept_keyword(word):
+            raise _Unsupported(f"expected {word}")
+
+    def accept_op(self, op: str) -> bool:
+        tok = self.peek()
+        if tok is not None and tok.kind == "op" and tok.value == op:
+            self.pos += 1
+            return True
+        return False
+
+    def expect_op(self, op: str):
+        if not self.accept_op(op):
+            raise _Unsupported(f"expected {op}")
+
+    def name(self) -> str:
+        tok = self.next()
+        if tok.kind not in ("ident", "quoted"):
+            raise _Unsupported("expected a name")
+        return tok.value
+
+    # -- grammar -------------------------------------------------------
+    def query(self) -> AggregateQuery:
+        self.expect_keyword("SELECT")
+        if self.is_keyword("DISTINCT", "ALL"):
+            raise _Unsupported("SELECT DISTINCT")
+
+        # The select list may reference aliases defined later in FROM, so
+        # remember where it is and parse it after the FROM clause.
+        select_start = self.pos
+        depth = 0
+        while not (depth == 0 and self.is_keyword("FROM")):
+            tok = self.next()
+            if tok.kind == "op" and tok.value == "(":
+                depth += 1
+            elif tok.kind == "op" and tok.value == ")":
+                depth -= 1
+
+        self.expect_keyword("FROM")
+        tables, join = self.from_clause()
+        self.tables = tables
+        from_end = self.pos
+
+        self.pos = select_start
+        items = [self.select_item()]
+        while self.accept_op(","):
+            items.append(self.select_item())
+        if not self.is_keyword("FROM"):
+            raise _Unsupported("unsupported select expression")
+        self.pos = from_end
+
+        predicates = []
+        if self.accept_keyword("WHERE"):
+            predicates.extend(self.condition())
+            while self.accept_keyword("AND"):
+                predicates.extend(self.condition())
+
+        group_by = []
+        if self.accept_keyword("GROUP"):
+            self.expect_keyword("BY")
+            group_by.append(self.group_key(items))
+            while self.accept_op(","):
+                group_by.append(self.group_key(items))
+
+        order_by = []
+        if self.accept_keyword("ORDER"):
+            self.expect_keyword("BY")
+            order_by.append(self.order_key(items))
+            while self.accept_op(","):
+                order_by.append(self.order_key(items))
+
+        limit = offset = None
+        if self.accept_keyword("LIMIT"):
+            limit = self.integer()
+            if self.accept_keyword("OFFSET"):
+                offset = self.integer()
+            elif self.accept_op(","):
+                offset, limit = limit, self.integer()
+
+        self.accept_op(";")
+        if self.peek() is not None:
+            raise _Unsupported(f"unsupported clause near {self.peek().value!r}")
+
+        aggregates = [item for item in items if isinstance(item.expr, Agg)]
+        dims = [item.expr for item in items if isinstance(item.expr, Dim)]
+        if not aggregates:
+            raise _Unsupported("not an aggregate query")
+        if any(d not in group_by for d in dims):
+            raise _Unsupported("selected column is neither grouped nor aggregated")
+
+        return AggregateQuery(tuple(items), tables, join, tuple(predicates), tuple(group_by),
+                              tuple(order_by), limit, offset)
+
+    def from_clause(self):
+        tables = [self.table_ref()]
+        join = False
+        if self.is_keyword("JOIN", "INNER"):
+            self.accept_keyword("INNER")
+            self.expect_keyword("JOIN")
+            tables.append(self.table_ref())
+            if self.accept_keyword("USING"):
+                self.expect_op("(")
+                if self.name().lower() != "cp_id":
+                    raise _Unsupported("join on a column other than cp_id")
+                self.expect_op(")")
+            else:
+                self.expect_keyword("ON")
+                left, right = self.column_ref(tables), None
+                self.expect_op("=")
+                right = self.column_ref(tables)
+                if {left, right} != {Column("trades", "cp_id"), Column("counterparties", "cp_id")}:
+                    raise _Unsupported("join on a column other than cp_id")
+            join = True
+        if set(tables) not in ({"trades"}, {"trades", "counterparties"}) or len(tables) != len(set(tables)):
+            raise _Unsupported("unsupported tables")
+        return frozenset(tables), join
+
+    def table_ref(self) -> str:
+        table = self.name().lower()
+        if table not in SCHEMA_COLUMNS:
+            raise _Unsupported(f"unknown table {table}")
+        self.accept_keyword("AS")
+        tok = self.peek()
+        if tok is not None and tok.kind in ("ident", "quoted") and not self.is_keyword(
+                "JOIN", "INNER", "LEFT", "CROSS", "NATURAL", "ON", "USING", "WHERE", "GROUP", "ORDER", "LIMIT"):
+            self.aliases[self.name().lower()] = table
+        self.aliases[table] = table
+        return table
+
+    def column_ref(self, tables=None) -> Column:
+        tables = tables if tables is not None else self.tables
+        first = self.name()
+        if self.accept_op("."):
+            table = self.aliases.get(first.lower())
+            column = self.name().lower()
+            if table is None or column not in SCHEMA_COLUMNS[table]:
+                raise _Unsupported(f"unknown column {first}.{column}")
+            return Column(table, column)
+
+        column = first.lower()
+        owners = [t for t in tables if column in SCHEMA_COLUMNS[t]]
+        if len(owners) != 1:
+            raise _Unsupported(f"unknown or ambiguous column {column}")
+        return Column(owners[0], column)
+
+    def expression(self):
+        """A Dim or an Agg"""
+        tok = self.peek()
+        if tok is not None and tok.kind == "ident" and self.peek(1) is not None \
+                and self.peek(1).kind == "op" and self.peek(1).value == "(":
+            func = tok.value.upper()
+            self.pos += 2
+            if func in AGG_FUNCS:
+                distinct = self.accept_keyword("DISTINCT")
+                if self.accept_op("*"):
+                    if func != "COUNT" or distinct:
+                        raise _Unsupported(f"{func}(*)")
+                    column = None
+                else:
+                    column = self.column_ref()
+                self.expect_op(")")
+                return Agg(func, column, distinct)
+            if func == "STRFTIME":
+                fmt = self.next()
+                self.expect_op(",")
+                column = self.column_ref()
+                self.expect_op(")")
+                if fmt.kind != "str" or fmt.value not in _STRFTIME_BUCKETS:
+                    raise _Unsupported("unsupported strftime format")
+                return Dim(_STRFTIME_BUCKETS[fmt.value], column)
+            if func in ("SUBSTR", "SUBSTRING"):
+                column = self.column_ref()
+                self.expect_op(",")
+                start = self.integer()
+                self.expect_op(",")
+                length = self.integer()
+                self.expect_op(")")
+                if (start, length) not in _SUBSTR_BUCKETS:
+                    raise _Unsupported("unsupported substr bucket")
+                return Dim(_SUBSTR_BUCKETS[(start, length)], column)
+            raise _Unsupported(f"function {func}")
+        return Dim("col", self.column_ref())
+
+    def select_item(self) -> Item:
+        start = self.peek().start
+        expr = self.expression()
+        end = self.tokens[self.pos - 1].end
+        if self.accept_keyword("AS"):
+            name = self.name()
+        elif self.peek() is not None and self.peek().kind in ("ident", "quoted") and not self.is_keyword("FROM"):
+            name = self.name()
+        elif isinstance(expr, Dim) and expr.kind == "col":
+            name = expr.column.name
+        else:
+            name = self.sql[start:end]
+        return Item(expr, name)
+
+    def literal(self):
+        tok = self.next()
+        if tok.kind == "str":
+            return tok.value
+        if tok.kind == "num":
+            return number(tok.value)
+        if tok.kind == "op" and tok.value == "-" and self.peek() is not None and self.peek().kind == "num":
+            return -number(self.next().value)
+        raise _Unsupported("expected a literal")
+
+    def integer(self) -> int:
+        value = self.literal()
+        if not isinstance(value, int):
+            raise _Unsupported("expected an integer")
+        return value
+
+    def condition(self) -> list:
+        if self.accept_op("("):
+            conds = self.condition()
+            while self.accept_keyword("AND"):
+                conds.extend(self.condition())
+            self.expect_op(")")
+            return conds
+
+        target = self.expression()
+        if not isinstance(target, Dim):
+            raise _Unsupported("aggregate in WHERE")
+        negate = self.accept_keyword("NOT")
+        if self.accept_keyword("BETWEEN"):
+            if negate:
+                raise _Unsupported("NOT BETWEEN")
+            low = self.literal()
+            self.expect_keyword("AND")
+            high = self.literal()
+            return [Pred(target, ">=", (low,)), Pred(target, "<=", (high,))]
+        if self.accept_keyword("IN"):
+            self.expect_op("(")
+            values = [self.literal()]
+            while self.accept_op(","):
+                values.append(self.literal())
+            self.expect_op(")")
+            return [Pred(target, "NOT IN" if negate else "IN", tuple(values))]
+        if negate:
+            raise _Unsupported("NOT")
+        tok = self.next()
+        if tok.kind != "op" or tok.value not in COMPARISONS:
+            raise _Unsupported("unsupported predicate")
+        op = {"==": "=", "<>": "!="}.get(tok.value, tok.value)
+        return [Pred(target, op, (self.literal(),))]
+
+    def resolve(self, items, prefer_columns: bool):
+        """
+        An ORDER BY/GROUP BY reference: ordinal, output alias or expression.
+        SQLite resolves bare names in GROUP BY against table columns first
+        and in ORDER BY against output aliases first.
+        """
+        tok = self.peek()
+        if tok.kind == "num":
+            index = self.integer() - 1
+            if not 0 <= index < len(items):
+                raise _Unsupported("ordinal out of range")
+            return index, items[index].expr
+
+        follower = self.peek(1)
+        bare_name = tok.kind in ("ident", "quoted") and not (
+            follower is not None and follower.kind == "op" and follower.value in ("(", "."))
+        is_column = bare_name and any(tok.value.lower() in SCHEMA_COLUMNS[t] for t in self.tables)
+        if bare_name and not (prefer_columns and is_column):
+            for index, item in enumerate(items):
+                if item.name.lower() == tok.value.lower():
+                    self.pos += 1
+                    return index, item.expr
+
+        expr = self.expression()
+        for index, item in enumerate(items):
+            if item.expr == expr:
+                return index, expr
+        return None, expr
+
+    def group_key(self, items) -> Dim:
+        _, expr = self.resolve(items, prefer_columns=True)
+        if not isinstance(expr, Dim):
+            raise _Unsupported("aggregate in GROUP BY")
+        return expr
+
+    def order_key(self, items) -> OrderKey:
+        index, expr = self.resolve(items, prefer_columns=False)
+        desc = False
+        if self.accept_keyword("DESC"):
+            desc = True
+        else:
+            self.accept_keyword("ASC")
+        if self.is_keyword("NULLS"):
+            raise _Unsupported("NULLS FIRST/LAST")
+        return OrderKey(index, expr, desc)
+
+
+def parse_aggregate(sql: str):
+    """
+    Parse a single-statement aggregate query over trades (optionally joined
+    to counterparties on cp_id). Returns an AggregateQuery or None when the
+    query uses anything outside the supported family.
+    """
+    try:
+        return _Parser(sql).query()
+    except (_Unsupported, ValueError):
+        return None
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote_literal(value) -> str:
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return repr(value)
@@ -0,0 +1,215 @@
+"""
+Standing queries: generated SQL kept live as trades arrive.
+
+A session registers a query once; a background thread watches the
+database's data_version and re-evaluates registered queries after every
+commit, all of them inside one read snapshot. Decomposable aggregates
+(partial_agg.plan) are evaluated incrementally: only trades above the
+query's trade_id watermark are aggregated and folded into its running
+partial state, so a refresh costs work proportional to the new trades.
+A change below the watermark (updated or deleted trades, detected from
+the row count and notional totals as in columnar.py) or to counterparties
+the query joins restarts it from scratch. Other queries are re-run in
+full.
+
+Sessions read get(query_id) (main2.py polls it from a fragment) or
+subscribe a callback; queries nobody has read for STANDING_TTL seconds
+are dropped.
+"""
+import hashlib
+import os
+import threading
+import time
+
+import aggregates
+import partial_agg
+
+STANDING_INTERVAL = float(os.environ.get("FX_STANDING_INTERVAL", "2"))
+STANDING_TTL = float(os.environ.get("FX_STANDING_TTL", "300"))
+
+
+class StandingQuery:
+    """One registered query, its running partial state and latest result"""
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.id = hashlib.sha1(sql.encode("utf-8")).hexdigest()[:16]
+        self.plan = partial_agg.plan(sql)
+        self.incremental = self.plan is not None
+        self.partial = None
+        self.watermark = None
+        self.totals = None
+        self.cp_fingerprint = None
+        self.result = None
+        self.error = None
+        # Bumped whenever result changes
+        self.revision = 0
+        self.updated_at = None
+        # Trades aggregated so far, the cost of keeping an incremental query live
+        self.rows_scanned = 0
+        self.last_seen = time.monotonic()
+        self.subscribers = []
+
+    def _read_partial(self, conn, where: str = None):
+        import pandas as pd
+
+        return pd.read_sql_query(partial_agg.partial_sql(self.plan, where=where), conn)
+
+    def refresh(self, conn) -> bool:
+        """Bring the result up to date on conn's snapshot; True when it changed"""
+        import pandas as pd
+
+        try:
+            if not self.incremental:
+                result = pd.read_sql_query(self.sql, conn)
+            else:
+                result = self._refresh_incremental(conn)
+                if result is None:
+                    return False
+        except Exception as e:
+            self.error = str(e)
+            return False
+        self.error = None
+        if self.result is not None and result.equals(self.result):
+            return False
+        self.result = result
+        self.revision += 1
+        self.updated_at = time.time()
+        return True
+
+    def _refresh_incremental(self, conn):
+        high = conn.execute("SELECT MAX(trade_id) FROM trades").fetchone()[0]
+        totals = aggregates.trade_totals(conn)
+        fingerprint = None
+        if self.plan.query.join:
+            fingerprint = conn.execute(
+                "SELECT group_concat(cp_id || ':' || IFNULL(cp_name, '') || ':' || IFNULL(region, ''), '|') "
+                "FROM (SELECT * FROM counterparties ORDER BY cp_id)"
+            ).fetchone()[0]
+
+        # Commits that added no trades changed existing rows
+        restart = self.partial is None or fingerprint != self.cp_fingerprint or (high or 0) <= self.watermark
+        if not restart:
+            where = f"t.trade_id > {int(self.watermark)} AND t.trade_id <= {int(high)}"
+            added = aggregates.trade_totals(conn, where)
+            count = added[0]
+            expected = [before + new for before, new in zip(self.totals, added)]
+            if totals[0] != expected[0] or any(abs(total - value) > 1e-6 + 1e-9 * abs(total)
+                                               for total, value in zip(totals[1:], expected[1:])):
+                # Trades at or below the watermark changed (or were repriced)
+                restart = True
+            else:
+                self.partial = partial_agg.combine(self.plan, [self.partial, self._read_partial(conn, where)])
+                self.rows_scanned += count
+        if restart:
+            self.partial = partial_agg.combine(self.plan, [self._read_partial(conn)])
+            self.cp_fingerprint = fingerprint
+            self.rows_scanned += totals[0]
+
+        self.watermark = high or 0
+        self.totals = totals
+        return partial_agg.merge(self.plan, [self.partial])
+
+    def info(self) -> dict:
+        return {"id": self.id, "sql": self.sql, "incremental": self.incremental, "revision": self.revision,
+                "watermark": self.watermark, "updated_at": self.updated_at, "rows_scanned": self.rows_scanned,
+                "error": self.error}
+
+
+class StandingQueries:
+    """Registry of standing queries shared by every session of the process"""
+
+    def __init__(self, interval: float = STANDING_INTERVAL, ttl: float = STANDING_TTL):
+        self.interval = interval
+        self.ttl = ttl
+        self._queries = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._version = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def register(self, sql: str) -> str:
+        """Start keeping sql live (shared when already registered); returns its id"""
+        query = StandingQuery(sql.strip())
+        with self._lock:
+            query = self._queries.setdefault(query.id, query)
+            query.last_seen = time.monotonic()
+        self._wake.set()
+        return query.id
+
+    def unregister(self, query_id: str):
+        with self._lock:
+            self._queries.pop(query_id, None)
+
+    def get(self, query_id: str):
+        """The standing query, or None once it expired; marks it as still watched"""
+        with self._lock:
+            query = self._queries.get(query_id)
+            if query is not None:
+                query.last_seen = time.monotonic()
+            return query
+
+    def subscribe(self, query_id: str, callback):
+        """Call callback(query) after each change of the query's result"""
+        query = self.get(query_id)
+        if query is not None:
+            query.subscribers.append(callback)
+
+    def refresh(self, force: bool = False):
+        """Re-evaluate every query once the database changed (or when forced)"""
+        with self._refresh_lock:
+            self._refresh(force)
+
+    def _refresh(self, force: bool):
+        import engine
+
+        now = time.monotonic()
+        with self._lock:
+            for query_id in [k for k, q in self._queries.items() if now - q.last_seen > self.ttl]:
+                del self._queries[query_id]
+            queries = list(self._queries.values())
+        pending = [q for q in queries if q.result is None and q.error is None]
+        version = engine.data_version()
+        if not queries or (version == self._version and not pending and not force):
+            return
+        changed = []
+        with engine.pool.snapshot() as conn:
+            for query in queries if version != self._version or force else pending:
+                if query.refresh(conn):
+                    changed.append(query)
+        self._version = version
+        for query in changed:
+            for callback in list(query.subscribers):
+                try:
+                    callback(query)
+                except Exception:
+                    pass
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.refresh()
+            except Exception:
+                # Query errors are kept per query; this only skips a round the database was unreadable
+                pass
+
+    def stats(self) -> list:
+        with self._lock:
+            return [query.info() for query in self._queries.values()]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_standing_queries() -> StandingQueries:
+    """Process-wide registry (started on first use)"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = StandingQueries()
+        return _registry
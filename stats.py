@@ -0,0 +1,35 @@
+"""Latency summary helpers shared by the batch runner and benchmarks."""
+
+
+def percentile(values, pct: float) -> float:
+    """Linear-interpolated percentile of a list of numbers (pct in 0..100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize_latencies(values) -> dict:
+    """Count, mean, p50/p95/p99 and max of a list of latencies"""
+    values = list(values)
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0,
+    }
+
+
+def format_latencies(name: str, values, unit: str = "ms", scale: float = 1000.0) -> str:
+    """One-line latency summary, values given in seconds"""
+    s = summarize_latencies(values)
+    return (
+        f"{name:<14} n={s['count']:<5} mean={s['mean'] * scale:8.1f}{unit} "
+        f"p50={s['p50'] * scale:8.1f}{unit} p95={s['p95'] * scale:8.1f}{unit} "
+        f"p99={s['p99'] * scale:8.1f}{unit} max={s['max'] * scale:8.1f}{unit}"
+    )
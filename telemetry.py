@@ -0,0 +1,224 @@
+"""
+Persistent query log and telemetry store.
+
+Every interaction (question, clarification rounds, prompt size, LLM latency
+and tokens, generated SQL, execution time, row count, result bytes, render
+time) is appended to a local SQLite database. record() only enqueues the
+row; a background thread writes queued rows in batches, one transaction
+per batch, so the request path never waits on disk.
+
+    python telemetry.py report [--db telemetry.db] [--top 20]
+"""
+import argparse
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_DB = os.environ.get("FX_TELEMETRY_DB", "telemetry.db")
+TELEMETRY_ENABLED = os.environ.get("FX_TELEMETRY", "1") == "1"
+BATCH_SIZE = 200
+FLUSH_SECONDS = 1.0
+QUEUE_SIZE = 10_000
+
+FIELDS = (
+    ("ts", "REAL"),
+    ("session_id", "TEXT"),
+    ("question", "TEXT"),
+    ("normalized_question", "TEXT"),
+    ("clarification_rounds", "INTEGER"),
+    ("source", "TEXT"),
+    ("prompt_chars", "INTEGER"),
+    ("prompt_tokens", "INTEGER"),
+    ("completion_tokens", "INTEGER"),
+    ("llm_seconds", "REAL"),
+    ("sql", "TEXT"),
+    ("status", "TEXT"),
+    ("error", "TEXT"),
+    ("exec_seconds", "REAL"),
+    ("row_count", "INTEGER"),
+    ("result_bytes", "INTEGER"),
+    ("render_seconds", "REAL"),
+)
+FIELD_NAMES = tuple(name for name, _ in FIELDS)
+
+
+def create_schema(conn):
+    columns = ",\n    ".join(f"{name} {kind}" for name, kind in FIELDS)
+    conn.executescript(f"""
+CREATE TABLE IF NOT EXISTS interactions (
+    id INTEGER PRIMARY KEY,
+    {columns}
+);
+CREATE INDEX IF NOT EXISTS idx_interactions_ts ON interactions (ts);
+CREATE INDEX IF NOT EXISTS idx_interactions_question ON interactions (normalized_question);
+""")
+
+
+def connect(path: str = None):
+    conn = sqlite3.connect(path or TELEMETRY_DB, timeout=10, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    create_schema(conn)
+    return conn
+
+
+class TelemetryWriter:
+    """Queue-backed writer that flushes rows in batches on a daemon thread"""
+
+    def __init__(self, path: str = None, batch_size: int = BATCH_SIZE, flush_seconds: float = FLUSH_SECONDS):
+        self.path = path or TELEMETRY_DB
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="fx-telemetry", daemon=True)
+        self._thread.start()
+
+    def record(self, **fields):
+        """Enqueue one interaction; unknown keys are ignored, never blocks"""
+        row = tuple(fields.get(name) for name in FIELD_NAMES)
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5.0):
+        """Wait until everything queued so far has been written"""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def _run(self):
+        conn = connect(self.path)
+        insert = f"INSERT INTO interactions ({', '.join(FIELD_NAMES)}) VALUES ({', '.join('?' * len(FIELD_NAMES))})"
+        while True:
+            batch, waiters = [], []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_seconds
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+
+            if batch:
+                try:
+                    with conn:
+                        conn.executemany(insert, batch)
+                    self.written += len(batch)
+                except sqlite3.Error as e:
+                    self.dropped += len(batch)
+                    logger.warning("telemetry write failed: %s", e)
+            for waiter in waiters:
+                waiter.set()
+
+
+@lru_cache(maxsize=None)
+def get_writer() -> TelemetryWriter:
+    """Process-wide writer for TELEMETRY_DB"""
+    writer = TelemetryWriter()
+    atexit.register(writer.flush)
+    return writer
+
+
+def record(**fields):
+    """Log one interaction (see FIELDS) unless telemetry is disabled"""
+    if not TELEMETRY_ENABLED:
+        return
+    import engine
+
+    fields.setdefault("ts", time.time())
+    if fields.get("question"):
+        fields.setdefault("normalized_question", engine.normalize_question(fields["question"]))
+    get_writer().record(**fields)
+
+
+def generation_fields(result: dict) -> dict:
+    """Telemetry fields from a generate_sql result"""
+    metrics = result.get("metrics") or {}
+    return {
+        "source": result.get("source"),
+        "prompt_chars": metrics.get("prompt_chars"),
+        "prompt_tokens": metrics.get("prompt_tokens"),
+        "completion_tokens": metrics.get("completion_tokens"),
+        "llm_seconds": metrics.get("seconds"),
+        "sql": result.get("sql") or None,
+    }
+
+
+def top_questions(n: int, path: str = None, since: float = None) -> list:
+    """Most frequently asked questions, most frequent first"""
+    path = path or TELEMETRY_DB
+    if n <= 0 or not os.path.exists(path):
+        return []
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("""
+            SELECT MIN(question), COUNT(*) AS asked FROM interactions
+            WHERE normalized_question IS NOT NULL AND ts >= ?
+            GROUP BY normalized_question ORDER BY asked DESC LIMIT ?
+        """, (since or 0, n)).fetchall()
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        conn.close()
+    return [question for question, _ in rows]
+
+
+def report(path: str = None, top: int = 20):
+    """Print hot questions, slowest SQL and latency percentiles"""
+    from stats import format_latencies
+
+    conn = connect(path)
+    print(f"Interactions: {conn.execute('SELECT COUNT(*) FROM interactions').fetchone()[0]}")
+    for status, count in conn.execute("SELECT status, COUNT(*) FROM interactions GROUP BY status ORDER BY 2 DESC"):
+        print(f"  {status or '-':<14} {count}")
+    for source, count in conn.execute("SELECT source, COUNT(*) FROM interactions GROUP BY source ORDER BY 2 DESC"):
+        print(f"  source={source or '-':<8} {count}")
+
+    print("\nLatencies:")
+    for column in ("llm_seconds", "exec_seconds", "render_seconds"):
+        values = [v for (v,) in conn.execute(f"SELECT {column} FROM interactions WHERE {column} IS NOT NULL")]
+        print("  " + format_latencies(column.replace("_seconds", ""), values))
+
+    print(f"\nTop {top} questions:")
+    for question, asked in conn.execute("""
+        SELECT MIN(question), COUNT(*) FROM interactions WHERE normalized_question IS NOT NULL
+        GROUP BY normalized_question ORDER BY 2 DESC LIMIT ?
+    """, (top,)):
+        print(f"  {asked:>6}  {question}")
+
+    print(f"\nSlowest {top} queries (mean execution):")
+    for sql, runs, mean in conn.execute("""
+        SELECT sql, COUNT(*), AVG(exec_seconds) FROM interactions WHERE exec_seconds IS NOT NULL
+        GROUP BY sql ORDER BY 3 DESC LIMIT ?
+    """, (top,)):
+        print(f"  {mean * 1000:9.1f} ms  x{runs:<5} {' '.join(sql.split())[:120]}")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FX query telemetry")
+    parser.add_argument("command", choices=["report"])
+    parser.add_argument("--db", default=TELEMETRY_DB)
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+    report(args.db, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Summary-table and partial-aggregate rewrites against SQLite running the query as written"""
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import aggregates
+import db_setup
+import parallel
+import partial_agg
+
+QUERIES = [
+    "SELECT ccy_pair, SUM(notl) AS s, TOTAL(notl) AS t, COUNT(*) AS n, AVG(rate) AS a, "
+    "MIN(notl) AS lo, MAX(notl) AS hi FROM trades GROUP BY ccy_pair ORDER BY ccy_pair",
+    "SELECT px_type, TOTAL(notl) AS t, COUNT(notl) AS n FROM trades GROUP BY px_type ORDER BY t DESC",
+    "SELECT strftime('%Y-%m', near_dt) AS month, SUM(notl) AS s FROM trades GROUP BY month ORDER BY month",
+    "SELECT c.region, SUM(t.notl) AS s, COUNT(*) AS n FROM trades t JOIN counterparties c ON t.cp_id = c.cp_id "
+    "GROUP BY c.region ORDER BY c.region",
+    "SELECT ccy_pair, SUM(notl) AS s FROM trades WHERE px_type = 'spot' GROUP BY ccy_pair ORDER BY s DESC LIMIT 3",
+    "SELECT COUNT(*) AS n, SUM(notl) AS s, TOTAL(notl) AS t, AVG(notl) AS a FROM trades",
+]
+# No matching rows: SUM and AVG are NULL, TOTAL is 0.0 and COUNT 0
+EMPTY = "SELECT TOTAL(notl) AS t, SUM(notl) AS s, COUNT(*) AS n, AVG(notl) AS a FROM trades WHERE ccy_pair = 'XXX'"
+EMPTY_BY_PAIR = "SELECT TOTAL(notl) AS t, SUM(notl) AS s FROM trades WHERE ccy_pair = 'XXX'"
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("aggregates") / "trades.db")
+    db_setup.build_database(path, trades=3_000, counterparties=20)
+    conn = sqlite3.connect(path)
+    yield conn
+    conn.close()
+
+
+def _partials(sql, conn):
+    plan = partial_agg.plan(sql)
+    if plan is None:
+        return None
+    low, high = conn.execute("SELECT MIN(rowid), MAX(rowid) FROM trades").fetchone()
+    frames = [pd.read_sql_query(partial_agg.partial_sql(plan, where=f"t.rowid BETWEEN {lo} AND {hi}"), conn)
+              for lo, hi in parallel.ranges(low, high, 4)]
+    return partial_agg.merge(plan, frames)
+
+
+def _nulls_as_nan(frame):
+    # An all-NULL column comes back from SQLite as None, from the rewrites as NaN
+    return frame.astype({c: float for c in frame if frame[c].isna().all()}).reset_index(drop=True)
+
+
+def _assert_same(result, sql, conn):
+    expected = pd.read_sql_query(sql, conn)
+    pd.testing.assert_frame_equal(_nulls_as_nan(result), _nulls_as_nan(expected), check_dtype=False, rtol=1e-9)
+
+
+@pytest.mark.parametrize("sql", QUERIES + [EMPTY])
+def test_summary_matches_sqlite(db, sql):
+    result = aggregates.execute_from_summary(sql, db)
+    if result is not None:
+        _assert_same(result, sql, db)
+
+
+@pytest.mark.parametrize("sql", QUERIES + [EMPTY])
+def test_partial_aggregates_match_sqlite(db, sql):
+    result = _partials(sql, db)
+    assert result is not None
+    _assert_same(result, sql, db)
+
+
+def test_total_over_no_rows_is_zero(db):
+    for result in (aggregates.execute_from_summary(EMPTY_BY_PAIR, db), _partials(EMPTY_BY_PAIR, db),
+                   partial_agg.merge(partial_agg.plan(EMPTY_BY_PAIR), [])):
+        assert result is not None
+        assert result["t"].tolist() == [0.0]
+        assert result["s"].isna().all()
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+import bulk_import
+
+HEADER = "trade_id,cp_id,px_type,notl,ccy_pair,near_dt,far_dt,rate\n"
+
+
+def _write(tmp_path, lines, trailing_newline=True):
+    path = tmp_path / "trades.csv"
+    text = HEADER + "\n".join(lines) + ("\n" if trailing_newline else "")
+    path.write_bytes(text.encode("utf-8"))
+    return str(path)
+
+
+def _read_all(path, chunk_bytes):
+    frames = [bulk_import._read_csv_range(path, *part) for _, _, part in bulk_import.chunks(path, chunk_bytes)]
+    return pd.concat(frames, ignore_index=True)
+
+
+def _lines(count):
+    # Fixed-width rows, so a chunk size can equal the line length
+    return [f"{i:06d},7,spot,1000000,EUR/USD,2025-01-02,,1.1" for i in range(1, count + 1)]
+
+
+@pytest.mark.parametrize("trailing_newline", [True, False])
+def test_every_chunk_size_reads_each_line_once(tmp_path, trailing_newline):
+    lines = _lines(20)
+    path = _write(tmp_path, lines, trailing_newline)
+    length = len(lines[0]) + 1
+    for chunk_bytes in (2, 7, length - 1, length, length + 1, 2 * length - 1, 2 * length, 3 * length + 1):
+        frame = _read_all(path, chunk_bytes)
+        assert frame["trade_id"].astype(int).tolist() == list(range(1, 21)), chunk_bytes
+
+
+def test_chunk_size_equal_to_line_length(tmp_path):
+    lines = _lines(20)
+    path = _write(tmp_path, lines)
+    line_length = len(lines[0]) + 1
+    assert len(bulk_import.chunks(path, line_length)) == 20
+    frame = _read_all(path, line_length)
+    assert len(frame) == 20
+    assert frame["trade_id"].is_unique
+
+
+def test_ranges_are_parsed_as_strings(tmp_path):
+    path = _write(tmp_path, _lines(3))
+    frame = _read_all(path, 1 << 20)
+    assert list(frame.columns) == HEADER.strip().split(",")
+    assert frame["trade_id"].tolist() == ["000001", "000002", "000003"]
+    assert frame["far_dt"].tolist() == ["", "", ""]
@@ -0,0 +1,74 @@
+import pytest
+
+import canonical
+import db_setup
+import engine
+
+
+def _same_shape(a, b):
+    return canonical.canonicalize(a).fingerprint == canonical.canonicalize(b).fingerprint
+
+
+@pytest.mark.parametrize("a, b", [
+    # Spacing, keyword and identifier case
+    ("SELECT * FROM trades WHERE notl > 5000000", "select *  from TRADES where NOTL>10000000"),
+    ("SELECT * FROM trades t JOIN counterparties c ON t.cp_id = c.cp_id WHERE c.region = 'EMEA'",
+     "SELECT * FROM trades t join counterparties c on t.cp_id=c.cp_id where c.region='APAC';"),
+    # Literals lifted from WHERE, HAVING, LIMIT and OFFSET
+    ("SELECT * FROM trades WHERE ccy_pair = 'EUR/USD' AND near_dt >= '2025-01-01'",
+     "SELECT * FROM trades WHERE ccy_pair = 'GBP/USD' AND near_dt >= '2024-06-30'"),
+    ("SELECT ccy_pair FROM trades GROUP BY ccy_pair HAVING COUNT(*) > 10 LIMIT 5 OFFSET 10",
+     "SELECT ccy_pair FROM trades GROUP BY ccy_pair HAVING COUNT(*) > 99 LIMIT 50 OFFSET 0"),
+    ("SELECT * FROM trades WHERE ccy_pair = 'it''s'", "SELECT * FROM trades WHERE ccy_pair = 'x'"),
+])
+def test_same_shape_shares_a_fingerprint(a, b):
+    assert _same_shape(a, b)
+    assert canonical.canonicalize(a).text == canonical.canonicalize(b).text
+
+
+@pytest.mark.parametrize("a, b", [
+    # Select lists are verbatim: literals and case name the result columns
+    ("SELECT ccy_pair, 1 FROM trades", "SELECT ccy_pair, 2 FROM trades"),
+    ("SELECT ccy_pair FROM trades", "SELECT CCY_PAIR FROM trades"),
+    ("SELECT (SELECT MAX(notl) FROM trades WHERE notl < 5) AS m",
+     "SELECT (SELECT MAX(notl) FROM trades WHERE notl < 6) AS m"),
+    # ORDER BY 2 is a column ordinal, GROUP BY literals are kept too
+    ("SELECT * FROM trades ORDER BY 1", "SELECT * FROM trades ORDER BY 2"),
+    ("SELECT ccy_pair, px_type FROM trades GROUP BY 1", "SELECT ccy_pair, px_type FROM trades GROUP BY 2"),
+    # Operators, string literals vs quoted identifiers, list lengths and signs
+    ("SELECT * FROM trades WHERE notl > 5", "SELECT * FROM trades WHERE notl >= 5"),
+    ("SELECT * FROM trades WHERE ccy_pair = 'x'", 'SELECT * FROM trades WHERE ccy_pair = "x"'),
+    ("SELECT * FROM trades WHERE notl IN (1, 2)", "SELECT * FROM trades WHERE notl IN (1, 2, 3)"),
+    ("SELECT * FROM trades WHERE notl > 5", "SELECT * FROM trades WHERE notl > -5"),
+    ("SELECT * FROM trades WHERE ccy_pair = 'x'", "SELECT * FROM counterparties WHERE cp_name = 'x'"),
+])
+def test_different_shapes_do_not_collide(a, b):
+    assert not _same_shape(a, b)
+
+
+def test_params_keep_their_type():
+    integer = canonical.canonicalize("SELECT COUNT(*) FROM trades WHERE trade_id / 2 = 1")
+    real = canonical.canonicalize("SELECT COUNT(*) FROM trades WHERE trade_id / 2.0 = 1")
+    text = canonical.canonicalize("SELECT COUNT(*) FROM trades WHERE trade_id / '2' = 1")
+    assert integer.fingerprint == real.fingerprint == text.fingerprint
+    assert [type(p) for p in integer.params] == [int, int]
+    assert [type(p) for p in real.params] == [float, int]
+    assert [type(p) for p in text.params] == [str, int]
+
+
+@pytest.mark.parametrize("sql", ["SELECT * FROM trades WHERE notl > ?", "SELECT 'unterminated"])
+def test_runs_as_written(sql):
+    assert canonical.canonicalize(sql) is None
+
+
+def test_result_cache_tells_int_and_real_params_apart(tmp_path):
+    previous = engine.DB_PATH
+    path = str(tmp_path / "trades.db")
+    db_setup.build_database(path, trades=200, counterparties=5, rollups=False)
+    engine.set_database(path)
+    try:
+        integer, _ = engine.execute_sql("SELECT COUNT(*) AS n FROM trades WHERE trade_id / 2 = 1")
+        real, _ = engine.execute_sql("SELECT COUNT(*) AS n FROM trades WHERE trade_id / 2.0 = 1")
+    finally:
+        engine.set_database(previous)
+    assert (integer["n"][0], real["n"][0]) == (2, 1)
@@ -0,0 +1,61 @@
+"""The columnar engine against SQLite running the query as written"""
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import columnar
+import db_setup
+import engine
+
+QUERIES = [
+    "SELECT ccy_pair, SUM(notl) AS s, TOTAL(notl) AS t, COUNT(*) AS n, AVG(rate) AS a, "
+    "MIN(notl) AS lo, MAX(notl) AS hi FROM trades GROUP BY ccy_pair ORDER BY ccy_pair",
+    "SELECT px_type, TOTAL(notl) AS t, COUNT(notl) AS n FROM trades GROUP BY px_type ORDER BY t DESC",
+    "SELECT strftime('%Y-%m', near_dt) AS month, SUM(notl) AS s FROM trades GROUP BY month ORDER BY month",
+    "SELECT c.region, SUM(t.notl) AS s, COUNT(*) AS n FROM trades t JOIN counterparties c ON t.cp_id = c.cp_id "
+    "GROUP BY c.region ORDER BY c.region",
+    "SELECT ccy_pair, SUM(notl) AS s FROM trades WHERE px_type = 'spot' GROUP BY ccy_pair ORDER BY s DESC LIMIT 3",
+    "SELECT px_type, COUNT(*) AS n FROM trades WHERE near_dt BETWEEN '2024-01-01' AND '2024-06-30' "
+    "AND notl > 1000000 GROUP BY px_type ORDER BY px_type",
+    "SELECT COUNT(*) AS n, SUM(notl) AS s, TOTAL(notl) AS t, AVG(notl) AS a FROM trades",
+    # No matching rows: SUM and AVG are NULL, TOTAL is 0.0 and COUNT 0
+    "SELECT TOTAL(notl) AS t, SUM(notl) AS s, COUNT(*) AS n, AVG(notl) AS a FROM trades WHERE ccy_pair = 'XXX'",
+]
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("columnar") / "trades.db")
+    db_setup.build_database(path, trades=3_000, counterparties=20, rollups=False)
+    conn = sqlite3.connect(path)
+    yield conn
+    conn.close()
+
+
+def _nulls_as_nan(frame):
+    # An all-NULL column comes back from SQLite as None, from numpy as NaN
+    return frame.astype({c: float for c in frame if frame[c].isna().all()}).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("sql", QUERIES)
+def test_columnar_matches_sqlite(db, sql, monkeypatch):
+    # No data version: the replica reloads for every query
+    monkeypatch.setattr(engine, "data_version", lambda: None)
+    result = columnar.execute_columnar(sql, db)
+    assert result is not None
+    expected = pd.read_sql_query(sql, db)
+    pd.testing.assert_frame_equal(_nulls_as_nan(result), _nulls_as_nan(expected), check_dtype=False, rtol=1e-9)
+
+
+def test_total_over_no_rows_is_zero(db, monkeypatch):
+    monkeypatch.setattr(engine, "data_version", lambda: None)
+    result = columnar.execute_columnar(QUERIES[-1], db)
+    assert result["t"].tolist() == [0.0]
+    assert result["n"].tolist() == [0]
+
+
+def test_unsupported_query_is_declined(db, monkeypatch):
+    monkeypatch.setattr(engine, "data_version", lambda: None)
+    assert columnar.execute_columnar("SELECT COUNT(DISTINCT cp_id) FROM trades", db) is None
+    assert columnar.execute_columnar("SELECT * FROM trades LIMIT 5", db) is None
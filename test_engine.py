@@ -0,0 +1,48 @@
+import pytest
+
+import engine
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM trades",
+    "select ccy_pair, SUM(notl) FROM trades GROUP BY ccy_pair;",
+    "WITH t AS (SELECT * FROM trades) SELECT COUNT(*) FROM t",
+    # Keywords inside literals, quoted identifiers, aliases and comments
+    "SELECT 'drop table trades; --' AS x",
+    "SELECT * FROM trades WHERE px_type = 'DROP'",
+    'SELECT "update" FROM trades',
+    "SELECT ccy_pair AS deleted FROM trades",
+    "SELECT * FROM trades -- delete everything",
+    "SELECT * FROM trades /* ; */",
+    # replace() the string function, not REPLACE INTO
+    "SELECT replace(ccy_pair, '/', '') FROM trades",
+])
+def test_sanitize_sql_accepts(sql):
+    assert engine.sanitize_sql(sql) == sql.strip()
+
+
+@pytest.mark.parametrize("sql, message", [
+    ("DELETE FROM trades", "Only SELECT"),
+    ("INSERT INTO trades SELECT * FROM trades", "Only SELECT"),
+    ("REPLACE INTO trades VALUES (1)", "Only SELECT"),
+    ("PRAGMA table_info(trades)", "Only SELECT"),
+    ("EXPLAIN SELECT 1", "Only SELECT"),
+    ("SELECT 1; DROP TABLE trades", "single SQL statement"),
+    ("SELECT * FROM trades WHERE 1; ATTACH 'other.db' AS other", "single SQL statement"),
+    ("WITH gone AS (DELETE FROM trades RETURNING *) SELECT * FROM gone", "Unsafe"),
+    ("SELECT 'unterminated", "Unable to parse"),
+])
+def test_sanitize_sql_rejects(sql, message):
+    with pytest.raises(ValueError, match=message):
+        engine.sanitize_sql(sql)
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT * FROM trades", "SELECT * FROM trades LIMIT 101"),
+    ("SELECT * FROM trades;", "SELECT * FROM trades LIMIT 101"),
+    ("SELECT * FROM trades LIMIT 5", "SELECT * FROM trades LIMIT 5"),
+    ("SELECT * FROM trades LIMIT 50000 OFFSET 3", "SELECT * FROM trades LIMIT 101 OFFSET 3"),
+    ("SELECT * FROM (SELECT * FROM trades LIMIT 3)", "SELECT * FROM (SELECT * FROM trades LIMIT 3) LIMIT 101"),
+])
+def test_limit_rows(sql, expected):
+    assert engine.limit_rows(sql, 100) == expected
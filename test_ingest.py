@@ -0,0 +1,51 @@
+import pytest
+
+import ingest
+
+TRADE = {"trade_id": 1, "cp_id": 2, "px_type": "spot", "notl": 5, "ccy_pair": "EUR/USD",
+         "near_dt": "2025-01-02", "rate": 1.1}
+
+
+class FlakyWriter:
+    """Stands in for writer.WriterClient, failing transactions while failing is set"""
+
+    def __init__(self):
+        self.failing = True
+        self.committed = []
+
+    def execute(self, sql, rows=None):
+        return 0
+
+    def transaction(self, statements):
+        if self.failing:
+            raise RuntimeError("database is locked")
+        self.committed.append(statements)
+        return []
+
+
+def test_failed_batch_is_queued_again():
+    client = FlakyWriter()
+    ingestor = ingest.Ingestor(client)
+    ingestor.add([TRADE, {"cp_id": 2, "cp_name": "Acme", "region": "EMEA"}])
+    with pytest.raises(RuntimeError):
+        ingestor.flush()
+    assert ingestor.stats()["failures"] == 1
+    assert ingestor.stats()["queued"] == 1
+
+    client.failing = False
+    assert ingestor.flush() == 1
+    assert ingestor.stats()["last_error"] is None
+    assert [sql for sql, _ in client.committed[0]] == [ingest.UPSERT_COUNTERPARTIES, ingest.UPSERT_TRADES,
+                                                        ingest.UPDATE_WATERMARK]
+
+
+def test_newer_version_wins_over_requeued_batch():
+    client = FlakyWriter()
+    ingestor = ingest.Ingestor(client)
+    ingestor.add([TRADE])
+    with pytest.raises(RuntimeError):
+        ingestor.flush()
+    ingestor.add([dict(TRADE, notl=7)])
+    client.failing = False
+    ingestor.flush()
+    assert client.committed[0][0][1][0][3] == 7.0
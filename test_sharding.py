@@ -0,0 +1,89 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import db_setup
+import sharding
+
+CASE_QUERY = ("SELECT CASE WHEN near_dt >= '2025-06-01' THEN 'recent' ELSE 'old' END AS bucket, "
+              "COUNT(*) AS trades FROM trades GROUP BY bucket ORDER BY bucket")
+
+
+@pytest.fixture(scope="module")
+def split_db(tmp_path_factory):
+    root = tmp_path_factory.mktemp("shards")
+    db = str(root / "source.db")
+    db_setup.build_database(db, trades=5_000, counterparties=20, rollups=False)
+    return db, sharding.split(db, str(root / "out"), period="year")
+
+
+def test_date_bounds_ignores_case_in_select_list():
+    assert sharding.date_bounds(CASE_QUERY) == (None, None)
+
+
+def test_date_bounds_reads_only_the_where_clause():
+    sql = ("SELECT CASE WHEN near_dt >= '2025-06-01' THEN 1 END AS recent FROM trades "
+           "WHERE near_dt BETWEEN '2024-01-01' AND '2024-03-31' ORDER BY near_dt")
+    assert sharding.date_bounds(sql) == ("2024-01-01", "2024-03-31")
+
+
+def test_date_bounds_stops_on_case_in_where():
+    sql = "SELECT * FROM trades WHERE CASE WHEN near_dt >= '2025-06-01' THEN 1 ELSE 0 END = 1"
+    assert sharding.date_bounds(sql) == (None, None)
+
+
+def test_case_bucket_matches_unsharded(split_db):
+    db, catalog = split_db
+    expected = pd.read_sql_query(CASE_QUERY, sqlite3.connect(db))
+    result = sharding.execute(CASE_QUERY, catalog)
+    assert result.to_dict("records") == expected.to_dict("records")
+    assert set(result["bucket"]) == {"old", "recent"}
+
+
+SUBQUERY = ("SELECT COUNT(*) AS n FROM trades WHERE near_dt >= '2025-06-01' "
+            "AND notl > (SELECT AVG(notl) FROM trades)")
+
+
+def test_outer_scope():
+    assert sharding.outer_scope("SELECT COUNT(*) FROM trades WHERE near_dt >= '2025-06-01'") == "all"
+    assert isinstance(sharding.outer_scope(SUBQUERY), int)
+    assert sharding.outer_scope("WITH t AS (SELECT * FROM trades) SELECT COUNT(*) FROM t") is None
+
+
+@pytest.mark.parametrize("sql", [
+    SUBQUERY,
+    "SELECT COUNT(*) AS n FROM trades t WHERE near_dt >= '2025-06-01' AND notl > (SELECT AVG(notl) FROM trades)",
+    "SELECT COUNT(*) AS n FROM trades WHERE near_dt >= '2025-06-01' "
+    "AND cp_id IN (SELECT cp_id FROM trades WHERE near_dt < '2025-01-01')",
+])
+def test_subquery_reads_every_shard(split_db, sql):
+    db, catalog = split_db
+    expected = pd.read_sql_query(sql, sqlite3.connect(db))
+    assert sharding.execute(sql, catalog).to_dict("records") == expected.to_dict("records")
+
+
+@pytest.fixture(scope="module")
+def monthly_db(tmp_path_factory):
+    root = tmp_path_factory.mktemp("monthly")
+    db = str(root / "source.db")
+    db_setup.build_database(db, trades=5_000, counterparties=20, rollups=False)
+    catalog = sharding.split(db, str(root / "out"), period="month")
+    conn = sqlite3.connect(catalog)
+    assert len(sharding.shards(conn, catalog)) > sharding.ATTACH_LIMIT
+    conn.close()
+    return db, catalog
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT cp_id, COUNT(*) AS n FROM trades GROUP BY cp_id HAVING COUNT(*) > 200 ORDER BY cp_id",
+    "SELECT ccy_pair, COUNT(DISTINCT cp_id) AS cps FROM trades GROUP BY ccy_pair ORDER BY ccy_pair",
+    "SELECT COUNT(*) AS n FROM trades WHERE notl > (SELECT AVG(notl) FROM trades)",
+    SUBQUERY,
+    "WITH big AS (SELECT * FROM trades WHERE notl > 1000000) SELECT COUNT(*) AS n, MAX(near_dt) AS last FROM big",
+    "SELECT trade_id FROM trades ORDER BY notl DESC, trade_id LIMIT 5",
+])
+def test_query_beyond_attach_limit_matches_unsharded(monthly_db, sql):
+    db, catalog = monthly_db
+    expected = pd.read_sql_query(sql, sqlite3.connect(db))
+    assert sharding.execute(sql, catalog).to_dict("records") == expected.to_dict("records")
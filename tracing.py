@@ -0,0 +1,215 @@
+"""
+Lightweight stage timing spans for the NL -> SQL -> chart pipeline.
+
+    with tracing.span("sql.execute", rows=10):
+        ...
+
+    @tracing.traced("nl2sql.parse_response")
+    def parse_model_response(...): ...
+
+Tracing is off unless FX_TRACING=1 (or enable() is called). When off,
+span() returns a shared no-op object and traced functions pay a single
+flag check. When on, finished spans keep a bounded sample of durations
+per stage (for p50/p95/p99) and a bounded buffer of recent spans, which
+can be exported as Prometheus text or OpenTelemetry-style JSON.
+"""
+import functools
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from stats import summarize_latencies
+
+SERVICE_NAME = "fx-analytics"
+# Durations kept per stage for percentiles
+SAMPLE_SIZE = 2048
+# Finished spans kept for the JSON export
+SPAN_BUFFER = 5000
+
+_enabled = os.environ.get("FX_TRACING") == "1"
+_current = ContextVar("fx_current_span", default=None)
+_lock = threading.Lock()
+_samples = {}
+_counts = {}
+_sums = {}
+_finished = deque(maxlen=SPAN_BUFFER)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """One timed stage; nests under the span active in the current context"""
+
+    __slots__ = ("name", "attributes", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "status", "_started", "_token")
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.status = "ok"
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        parent = _current.get()
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.span_id = secrets.token_hex(8)
+        self._token = _current.set(self)
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._started
+        self.end_ns = self.start_ns + int(seconds * 1e9)
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.status = "error"
+            self.attributes["error"] = repr(exc)
+        observe(self.name, seconds)
+        _finished.append(self)
+        return False
+
+
+def enable(flag: bool = True):
+    global _enabled
+    _enabled = flag
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def span(name: str, **attributes):
+    """Context manager timing one stage (a no-op while tracing is disabled)"""
+    if not _enabled:
+        return _NOOP
+    return Span(name, attributes)
+
+
+def traced(name: str = None):
+    """Decorator wrapping every call of the function in a span"""
+    def decorate(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(span_name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def observe(name: str, seconds: float):
+    """Record a duration measured by hand for a stage"""
+    if not _enabled:
+        return
+    with _lock:
+        samples = _samples.get(name)
+        if samples is None:
+            samples = _samples[name] = deque(maxlen=SAMPLE_SIZE)
+            _counts[name] = 0
+            _sums[name] = 0.0
+        samples.append(seconds)
+        _counts[name] += 1
+        _sums[name] += seconds
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+        _counts.clear()
+        _sums.clear()
+        _finished.clear()
+
+
+def samples() -> dict:
+    """Recent raw durations per stage, for merging across processes"""
+    with _lock:
+        return {name: list(values) for name, values in _samples.items()}
+
+
+def summary() -> dict:
+    """Per-stage count, total and p50/p95/p99 (over the recent sample) in seconds"""
+    with _lock:
+        snapshot = {name: (list(samples), _counts[name], _sums[name]) for name, samples in _samples.items()}
+    result = {}
+    for name, (samples, count, total) in sorted(snapshot.items()):
+        stage = summarize_latencies(samples)
+        stage["count"] = count
+        stage["sum"] = total
+        result[name] = stage
+    return result
+
+
+def prometheus_text(metric: str = "fx_stage_duration_seconds") -> str:
+    """Per-stage latency as a Prometheus summary in text exposition format"""
+    lines = [
+        f"# HELP {metric} Latency of FX pipeline stages in seconds.",
+        f"# TYPE {metric} summary",
+    ]
+    for name, stage in summary().items():
+        label = name.replace("\\", "\\\\").replace('"', '\\"')
+        for quantile, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")):
+            lines.append(f'{metric}{{stage="{label}",quantile="{quantile}"}} {stage[key]:.6f}')
+        lines.append(f'{metric}_sum{{stage="{label}"}} {stage["sum"]:.6f}')
+        lines.append(f'{metric}_count{{stage="{label}"}} {stage["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+def _otel_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otel_json(clear: bool = False) -> dict:
+    """Recent finished spans in the OTLP/JSON trace layout"""
+    with _lock:
+        spans = list(_finished)
+        if clear:
+            _finished.clear()
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{
+                "scope": {"name": "fx.tracing"},
+                "spans": [{
+                    "traceId": s.trace_id,
+                    "spanId": s.span_id,
+                    "parentSpanId": s.parent_id or "",
+                    "name": s.name,
+                    "kind": 1,
+                    "startTimeUnixNano": str(s.start_ns),
+                    "endTimeUnixNano": str(s.end_ns),
+                    "attributes": [{"key": k, "value": _otel_value(v)} for k, v in s.attributes.items()],
+                    "status": {"code": 2 if s.status == "error" else 1},
+                } for s in spans],
+            }],
+        }]
+    }
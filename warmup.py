@@ -0,0 +1,144 @@
+"""
+Background cache warm-up.
+
+At process start (and again whenever the database changes) the example
+questions from the sidebar, an optional configured list and the most
+frequent questions from the telemetry log are resolved through
+engine.generate_sql and their SQL is pre-executed, so the NL -> SQL cache
+and the result cache are hot before the first user clicks.
+
+    python warmup.py [--db fx_trades.db] [--top 20]
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import engine
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+EXAMPLE_QUESTIONS = [
+    "Show total notional by product type",
+    "Top 5 currency pairs by volume",
+    "Trading activity by region",
+    "Average rates by currency pair",
+    "Monthly trading volumes",
+    "Largest trades this month",
+]
+
+WARMUP_ENABLED = os.environ.get("FX_WARMUP", "1") == "1"
+# Optional text file with one extra question per line
+WARMUP_FILE = os.environ.get("FX_WARMUP_FILE", "")
+WARMUP_TOP_N = int(os.environ.get("FX_WARMUP_TOP_N", "20"))
+WARMUP_WORKERS = 4
+# How often the background thread checks for a data refresh
+WARMUP_POLL_SECONDS = 30
+
+_started = False
+_start_lock = threading.Lock()
+
+
+def warmup_questions(top_n: int = None) -> list:
+    """Examples + configured list + top-N from the telemetry log, deduplicated"""
+    questions = list(EXAMPLE_QUESTIONS)
+    if WARMUP_FILE and os.path.exists(WARMUP_FILE):
+        with open(WARMUP_FILE, encoding="utf-8") as f:
+            questions += [line.strip() for line in f if line.strip()]
+    questions += telemetry.top_questions(WARMUP_TOP_N if top_n is None else top_n)
+
+    seen = set()
+    unique = []
+    for question in questions:
+        key = engine.normalize_question(question)
+        if key not in seen:
+            seen.add(key)
+            unique.append(question)
+    return unique
+
+
+def warm_question(question: str) -> dict:
+    """Resolve one question and pre-execute its SQL; returns timing info"""
+    started = time.perf_counter()
+    result = engine.generate_sql(question)
+    translated = time.perf_counter()
+
+    status = "no_sql"
+    if result.get("clarification"):
+        status = "clarification"
+    elif result.get("sql"):
+        _, error = engine.execute_sql(result["sql"])
+        status = "sql_error" if error else "ok"
+
+    return {
+        "question": question,
+        "status": status,
+        "generate_seconds": translated - started,
+        "execute_seconds": time.perf_counter() - translated,
+    }
+
+
+def warm(questions: list = None, workers: int = WARMUP_WORKERS) -> list:
+    """Warm the caches for the given (or default) questions"""
+    questions = warmup_questions() if questions is None else questions
+
+    def run(question):
+        try:
+            return warm_question(question)
+        except Exception as e:
+            logger.warning("warm-up failed for %r: %s", question, e)
+            return {"question": question, "status": "error", "generate_seconds": 0.0, "execute_seconds": 0.0}
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fx-warmup") as executor:
+        return list(executor.map(run, questions))
+
+
+def _warm_loop(poll_seconds: float):
+    version = None
+    while True:
+        try:
+            # data_version() clears the result cache itself when it changes
+            current = engine.data_version()
+            if current != version:
+                version = current
+                results = warm()
+                logger.info("warmed %d questions (data version %s)", len(results), version)
+        except Exception as e:
+            logger.warning("warm-up pass failed: %s", e)
+        time.sleep(poll_seconds)
+
+
+def start(poll_seconds: float = WARMUP_POLL_SECONDS) -> bool:
+    """
+    Start the background warm-up thread once per process. It warms the
+    caches immediately and again after every data refresh.
+    """
+    global _started
+    if not WARMUP_ENABLED:
+        return False
+    with _start_lock:
+        if not _started:
+            threading.Thread(target=_warm_loop, args=(poll_seconds,), name="fx-warmup", daemon=True).start()
+            _started = True
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm the NL -> SQL and result caches")
+    parser.add_argument("--db", default=None, help="SQLite database (default: engine.DB_PATH)")
+    parser.add_argument("--top", type=int, default=WARMUP_TOP_N, help="frequent questions from the telemetry log")
+    args = parser.parse_args()
+
+    if args.db:
+        engine.set_database(args.db)
+
+    for result in warm(warmup_questions(args.top)):
+        print(f"{result['status']:<14} {result['generate_seconds'] * 1000:8.1f} ms  "
+              f"{result['execute_seconds'] * 1000:8.1f} ms  {result['question']}")
+
+
+if __name__ == "__main__":
+    main()
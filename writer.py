@@ -0,0 +1,310 @@
+"""
+Single writer process for the trades database in WAL mode.
+
+In WAL mode readers never block the writer and the writer never blocks
+readers, but SQLite still allows one writer at a time. Every write goes
+through one process that owns the only read-write connection:
+
+    python writer.py --db fx_trades.db
+
+Clients authenticate with FX_WRITER_KEY when it is set; otherwise the
+writer generates a random key into <db>.writer-key, readable by its owner
+only, which clients of that database read. connect() also checks that
+the writer it reaches serves the database it asked for.
+
+Clients (ingest, bulk loads) call connect() and send transactions: lists
+of (sql, rows) statements applied atomically, rows being one parameter
+tuple, a list of them (executemany) or None. A transaction can attach
+other database files for its duration, e.g. to merge a staged import.
+
+Automatic checkpoints are off on the writer connection; a background
+thread runs a PASSIVE checkpoint every CHECKPOINT_INTERVAL seconds, which
+copies what it can without waiting on readers, and a TRUNCATE checkpoint
+once the WAL passes WAL_MAX_MB while no writes are arriving. A long
+analyst query then delays resetting the WAL, never an insert.
+"""
+import argparse
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+WRITER_ADDRESS = os.environ.get("FX_WRITER_ADDRESS", "127.0.0.1:6010")
+WRITER_KEY = os.environ.get("FX_WRITER_KEY")
+KEY_SUFFIX = ".writer-key"
+CHECKPOINT_INTERVAL = float(os.environ.get("FX_CHECKPOINT_INTERVAL", "5"))
+WAL_MAX_MB = float(os.environ.get("FX_WAL_MAX_MB", "64"))
+# How long a TRUNCATE checkpoint waits for readers before giving up until the next round
+TRUNCATE_WAIT_MS = 1000
+
+WRITER_PRAGMAS = {
+    "journal_mode": "WAL",
+    # Durable at checkpoints; a power loss can only drop the last commits
+    "synchronous": "NORMAL",
+    "wal_autocheckpoint": 0,
+    "journal_size_limit": int(WAL_MAX_MB * 2**20),
+    # INSERT OR REPLACE must fire delete triggers (aggregates.install)
+    "recursive_triggers": "ON",
+    "busy_timeout": 30000,
+}
+
+
+def _address(address: str = None):
+    host, _, port = (address or WRITER_ADDRESS).rpartition(":")
+    return host, int(port)
+
+
+def key_path(path: str) -> str:
+    return os.path.abspath(path) + KEY_SUFFIX
+
+
+def _authkey(path: str = None, create: bool = False) -> bytes:
+    """
+    The listener's authkey: FX_WRITER_KEY, else the key file of path. With
+    create, a key file missing or readable by others is replaced by a new
+    random key, mode 0600.
+    """
+    if WRITER_KEY:
+        return WRITER_KEY.encode("utf-8")
+    if path is None:
+        raise ValueError("Set FX_WRITER_KEY or give the database path to read its writer key file")
+    target = key_path(path)
+    if create:
+        try:
+            private = not os.stat(target).st_mode & 0o077
+        except FileNotFoundError:
+            private = False
+        if not private:
+            staged = f"{target}.{os.getpid()}"
+            if os.path.exists(staged):
+                os.remove(staged)
+            fd = os.open(staged, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32))
+            os.replace(staged, target)
+    with open(target) as f:
+        return f.read().strip().encode("utf-8")
+
+
+def enable_wal(conn):
+    """Switch a database to WAL mode (persistent in the file)"""
+    return conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+
+
+class Writer:
+    """The read-write connection and checkpoint schedule of one database"""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        for name, value in WRITER_PRAGMAS.items():
+            self.conn.execute(f"PRAGMA {name} = {value}")
+        self.transactions = 0
+        self.last_write = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._checkpointer = threading.Thread(target=self._checkpoint_loop, daemon=True)
+        self._checkpointer.start()
+
+    def apply(self, statements: list, attach: dict = None) -> list:
+        """
+        Run (sql, rows) statements in one transaction, returning their row
+        counts. attach maps schema names to files attached meanwhile.
+        """
+        counts = []
+        with self._lock:
+            attached = []
+            try:
+                for name, path in (attach or {}).items():
+                    self.conn.execute(f"ATTACH DATABASE ? AS {name}", (path,))
+                    attached.append(name)
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for sql, rows in statements:
+                        if rows is None:
+                            cursor = self.conn.execute(sql)
+                        elif isinstance(rows, list):
+                            cursor = self.conn.executemany(sql, rows)
+                        else:
+                            cursor = self.conn.execute(sql, rows)
+                        counts.append(cursor.rowcount)
+                    self.conn.execute("COMMIT")
+                except BaseException:
+                    self.conn.execute("ROLLBACK")
+                    raise
+            finally:
+                for name in attached:
+                    self.conn.execute(f"DETACH DATABASE {name}")
+            self.transactions += 1
+            self.last_write = time.monotonic()
+        return counts
+
+    def wal_size(self) -> int:
+        try:
+            return os.path.getsize(self.path + "-wal")
+        except OSError:
+            return 0
+
+    def checkpoint(self, mode: str = "PASSIVE"):
+        """(busy, wal frames, frames checkpointed) of one checkpoint"""
+        with self._lock:
+            if mode != "TRUNCATE":
+                return self.conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+            self.conn.execute(f"PRAGMA busy_timeout = {TRUNCATE_WAIT_MS}")
+            try:
+                return self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            finally:
+                self.conn.execute(f"PRAGMA busy_timeout = {WRITER_PRAGMAS['busy_timeout']}")
+
+    def _checkpoint_loop(self):
+        while not self._stop.wait(CHECKPOINT_INTERVAL):
+            try:
+                idle = time.monotonic() - self.last_write >= CHECKPOINT_INTERVAL
+                if idle and self.wal_size() > WAL_MAX_MB * 2**20:
+                    self.checkpoint("TRUNCATE")
+                else:
+                    self.checkpoint("PASSIVE")
+            except sqlite3.Error:
+                pass
+
+    def stats(self) -> dict:
+        return {"path": self.path, "transactions": self.transactions, "wal_bytes": self.wal_size()}
+
+    def close(self):
+        self._stop.set()
+        self._checkpointer.join()
+        with self._lock:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.close()
+
+
+def _serve_client(writer: Writer, client):
+    with client:
+        while True:
+            try:
+                message = client.recv()
+            except (EOFError, OSError):
+                return
+            command = message[0]
+            try:
+                if command == "tx":
+                    reply = ("ok", writer.apply(*message[1:]))
+                elif command == "checkpoint":
+                    reply = ("ok", writer.checkpoint(message[1]))
+                elif command == "stats":
+                    reply = ("ok", writer.stats())
+                else:
+                    reply = ("error", f"unknown command {command!r}")
+            except Exception as e:
+                reply = ("error", str(e))
+            client.send(reply)
+
+
+def serve(path: str, address: str = None):
+    """Run the writer for path until interrupted, one thread per client"""
+    listener = Listener(_address(address), authkey=_authkey(path, create=True))
+    writer = Writer(path)
+    try:
+        while True:
+            try:
+                client = listener.accept()
+            except (AuthenticationError, OSError):
+                # A client without the key, or gone mid-handshake
+                continue
+            threading.Thread(target=_serve_client, args=(writer, client), daemon=True).start()
+    finally:
+        listener.close()
+        writer.close()
+
+
+class WriterClient:
+    """Connection to the writer process, safe to share between threads"""
+
+    def __init__(self, address: str = None, path: str = None):
+        self._conn = Client(_address(address), authkey=_authkey(path))
+        self._lock = threading.Lock()
+
+    def _call(self, *message):
+        with self._lock:
+            self._conn.send(message)
+            status, value = self._conn.recv()
+        if status != "ok":
+            raise RuntimeError(value)
+        return value
+
+    def transaction(self, statements: list, attach: dict = None) -> list:
+        """Apply (sql, rows) statements atomically, returning their row counts"""
+        return self._call("tx", statements, attach)
+
+    def execute(self, sql: str, rows=None) -> int:
+        return self.transaction([(sql, rows)])[0]
+
+    def checkpoint(self, mode: str = "PASSIVE"):
+        return self._call("checkpoint", mode)
+
+    def stats(self) -> dict:
+        return self._call("stats")
+
+    def close(self):
+        self._conn.close()
+
+
+def _run(path: str, address: str):
+    try:
+        serve(path, address)
+    except OSError:
+        # Another process started the writer first
+        pass
+
+
+def _checked(client: WriterClient, path: str, address: str) -> WriterClient:
+    if path is not None:
+        served = client.stats()["path"]
+        if served != os.path.abspath(path):
+            client.close()
+            raise RuntimeError(f"The writer at {address or WRITER_ADDRESS} serves {served}, not {path}")
+    return client
+
+
+def connect(path: str = None, address: str = None, timeout: float = 10.0) -> WriterClient:
+    """
+    Client for the writer of path at address. When nothing is listening
+    and path is given, a writer process for path is started first.
+    """
+    try:
+        return _checked(WriterClient(address, path), path, address)
+    except (ConnectionRefusedError, FileNotFoundError):
+        if path is None:
+            raise
+    import multiprocessing
+
+    multiprocessing.get_context("spawn").Process(target=_run, args=(path, address), daemon=False).start()
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return _checked(WriterClient(address, path), path, address)
+        except (ConnectionRefusedError, FileNotFoundError):
+            # The key file is written just before the writer listens
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the single writer for an FX trades database")
+    parser.add_argument("--db", default=os.environ.get("FX_DB_PATH", "fx_trades.db"))
+    parser.add_argument("--address", default=WRITER_ADDRESS, help="host:port to listen on")
+    args = parser.parse_args()
+
+    print(f"Writer for {args.db} listening on {args.address}", flush=True)
+    try:
+        serve(args.db, args.address)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()